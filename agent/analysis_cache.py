@@ -0,0 +1,124 @@
+"""
+Memoized PaperAnalysis results across triage runs.
+
+Keyed by pdf content hash + model string + hash of the classification
+prompt, so editing SYSTEM_MSG or switching backends just stops old rows
+from matching — nothing to invalidate by hand. Those dead rows age out:
+eviction is LRU by last hit, bounded by ANALYSIS_CACHE_MAX entries. Same
+sqlite setup as the extraction cache, safe to share between uvicorn workers.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+
+from agent.schemas import PaperAnalysis
+
+DEFAULT_PATH = os.path.expanduser("~/.cache/paper-triage/analysis.sqlite")
+# ANALYSIS_CACHE=off disables it
+CACHE_PATH = os.environ.get("ANALYSIS_CACHE", DEFAULT_PATH)
+CACHE_MAX = int(os.environ.get("ANALYSIS_CACHE_MAX", "100000"))
+
+_FIELDS = set(PaperAnalysis.model_fields)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key       TEXT PRIMARY KEY,
+    data      TEXT NOT NULL,
+    created   REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS analyses_lru ON analyses(last_used)"
+
+
+def analysis_key(digest, model, prompt):
+    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()[:16]
+    return f"{digest}:{model}:{prompt_hash}"
+
+
+class AnalysisCache:
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = int(max_entries)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        db = self._connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            if "last_used" not in {r[1] for r in db.execute("PRAGMA table_info(analyses)")}:
+                # cache file from before eviction existed
+                try:
+                    db.execute("ALTER TABLE analyses ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+                    db.execute("UPDATE analyses SET last_used = created")
+                except sqlite3.OperationalError:
+                    pass  # another worker just did it
+            db.execute(_INDEX)
+        finally:
+            db.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def get_many(self, keys):
+        """-> {key: PaperAnalysis} for the keys we have, bumping their LRU stamp"""
+        keys = list(keys)
+        found = {}
+        db = self._connect()
+        try:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                qs = ",".join("?" * len(part))
+                for k, data in db.execute(f"SELECT key, data FROM analyses WHERE key IN ({qs})", part):
+                    found[k] = PaperAnalysis.model_validate_json(data)
+            if found:
+                now = time.time()
+                db.execute("BEGIN IMMEDIATE")
+                db.executemany("UPDATE analyses SET last_used=? WHERE key=?", [(now, k) for k in found])
+                db.execute("COMMIT")
+        finally:
+            db.close()
+        return found
+
+    def put_many(self, items):
+        """store {key: PaperAnalysis} and evict least-recently-used rows past
+        the entry cap"""
+        if not items:
+            return
+        now = time.time()
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT OR REPLACE INTO analyses(key, data, created, last_used) VALUES (?,?,?,?)",
+                # just the model's analysis, not what the report adds to it (duplicate_of)
+                [(k, a.model_dump_json(include=_FIELDS), now, now) for k, a in items.items()],
+            )
+            self._evict(db)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        over = db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0] - self.max_entries
+        if over > 0:
+            db.execute("DELETE FROM analyses WHERE key IN "
+                       "(SELECT key FROM analyses ORDER BY last_used LIMIT ?)", (over,))
+
+
+_cache = None
+_disabled = not CACHE_PATH or CACHE_PATH.lower() == "off"
+
+
+def get_cache():
+    """process-wide cache, or None if disabled / the path isn't writable"""
+    global _cache, _disabled
+    if _cache is None and not _disabled:
+        try:
+            _cache = AnalysisCache(CACHE_PATH, CACHE_MAX)
+        except (OSError, sqlite3.Error):
+            _disabled = True
+    return _cache
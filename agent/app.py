@@ -1,29 +1,62 @@
+import asyncio
+import json
 import os
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from pydantic_core import to_jsonable_python
 
-from agent.triage import run_triage, materialize_results
+from agent import metrics, result_store, scheduler, triage
+from agent import jobs
+from agent.jobs import QueueFull, job_queue, triage_dir
 from agent.schemas import TriageResult
 
-app = FastAPI(title="paper-triage", version="0.1.0")
-
 PAPERS_DIR = os.environ.get("PAPERS_DIR", "/papers")
+# build the model client in the background once we're up, so the first
+# /triage doesn't pay for it. 0 = wait for the first request
+TRIAGE_PREWARM = os.environ.get("TRIAGE_PREWARM", "1") not in ("", "0", "false", "off")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if TRIAGE_PREWARM:
+        asyncio.get_running_loop().run_in_executor(None, triage.prewarm)
+    yield
+
+
+app = FastAPI(title="paper-triage", version="0.1.0", lifespan=lifespan)
 
 class TriageRequest(BaseModel):
     papers_dir: str | None = None
+    # true -> return a job id right away, poll GET /triage/{job_id}
+    background: bool = False
+    # who to bill the shared model budget to, defaults to the papers dir
+    tenant: str | None = None
 
 class TriageResponse(BaseModel):
     status: str
     result: TriageResult
     n_papers: int
 
-@app.get("/health")
-def health_check():
-    return {"ok": True}
+class StageProgress(BaseModel):
+    done: int
+    total: int
 
-@app.post("/triage", response_model=TriageResponse)
-async def do_triage(req: TriageRequest = TriageRequest()):
-    target = req.papers_dir or PAPERS_DIR
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    papers_dir: str
+    tenant: str
+    stage: str | None = None
+    progress: dict[str, StageProgress] = {}
+    result: TriageResponse | None = None
+    error: str | None = None
+
+
+def _check_inbox(target):
     inbox = os.path.join(target, "inbox")
 
     if not os.path.isdir(inbox):
@@ -33,7 +66,131 @@ async def do_triage(req: TriageRequest = TriageRequest()):
     if len(pdfs) == 0:
         raise HTTPException(400, "inbox is empty")
 
-    result = await run_triage(inbox)
-    materialize_results(result, target)
+
+def _job_status(job):
+    result = None
+    if job.result is not None:
+        result = TriageResponse(status="done", result=job.result, n_papers=len(job.result.papers))
+    return JobStatus(
+        job_id=job.id, status=job.status, papers_dir=job.papers_dir, tenant=job.tenant, stage=job.stage,
+        progress=job.progress, result=result, error=job.error,
+    )
+
+
+@app.get("/health")
+def health_check():
+    return {"ok": True}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(jobs.gauges(job_queue)), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/queue")
+def queue_depth():
+    """what's waiting and running, per tenant"""
+    return {"jobs_queued": job_queue.queued(), "jobs_running": job_queue.running(),
+            "llm_budget": scheduler.llm.budget, "llm_waiting": scheduler.llm.waiting(),
+            "llm_in_use": dict(scheduler.llm.in_use)}
+
+@app.post("/triage", response_model=TriageResponse | JobStatus)
+async def do_triage(response: Response, req: TriageRequest = TriageRequest()):
+    target = req.papers_dir or PAPERS_DIR
+    _check_inbox(target)
+
+    if req.background:
+        try:
+            job = job_queue.submit(target, tenant=req.tenant)
+        except QueueFull as exc:
+            raise HTTPException(429, str(exc), headers={"Retry-After": "30"})
+        response.status_code = 202
+        return _job_status(job)
+
+    result = await triage_dir(target, tenant=req.tenant)
 
     return TriageResponse(status="done", result=result, n_papers=len(result.papers))
+
+# stream runs keep going if the client disconnects; hold refs so they aren't gc'd
+_stream_runs: set[asyncio.Task] = set()
+
+def _sse(kind, data):
+    return f"event: {kind}\ndata: {json.dumps(to_jsonable_python(data))}\n\n"
+
+@app.get("/triage/stream")
+async def stream_triage(papers_dir: str | None = None, tenant: str | None = None):
+    """same run as POST /triage, but as server-sent events, in order:
+      extracted     {filename, done, total} per pdf
+      deduplicated  {clusters: {representative: [duplicates]}}, only if there are near-copies
+      prefiltered   {skipped, calls_saved, tokens_saved}, only with PREFILTER_LABELS
+      analysis      {paper, cached, done, total} per paper
+      ranked        {reading_order}
+      materializing {} while the pdfs are moved and the outputs written
+    then done (the TriageResponse) or error {detail}"""
+    target = papers_dir or PAPERS_DIR
+    _check_inbox(target)
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_event(kind, data):
+        # extraction events come from a worker thread
+        loop.call_soon_threadsafe(events.put_nowait, (kind, data))
+
+    async def run():
+        try:
+            result = await triage_dir(target, on_event=on_event, tenant=tenant)
+            on_event("done", TriageResponse(status="done", result=result, n_papers=len(result.papers)))
+        except Exception as exc:
+            on_event("error", {"detail": f"{type(exc).__name__}: {exc}"})
+
+    task = asyncio.create_task(run())
+    _stream_runs.add(task)
+    task.add_done_callback(_stream_runs.discard)
+
+    async def gen():
+        while True:
+            kind, data = await events.get()
+            yield _sse(kind, data)
+            if kind in ("done", "error"):
+                break
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _store():
+    store = result_store.get_store()
+    if store is None:
+        raise HTTPException(503, "result store is off (RESULT_STORE)")
+    return store
+
+@app.get("/results/papers/{filename}")
+def latest_result(filename: str):
+    """latest analysis of one paper, from the result store"""
+    row = _store().latest(filename)
+    if row is None:
+        raise HTTPException(404, f"never triaged: {filename}")
+    return row
+
+@app.get("/results/papers/{filename}/history")
+def result_history(filename: str, limit: int = 50):
+    """every analysis of one paper, newest first"""
+    return _store().history(filename, limit)
+
+@app.get("/results/hash/{digest}")
+def results_by_hash(digest: str, limit: int = 50):
+    """analyses of one pdf by sha256, under whatever filename it had"""
+    return _store().by_digest(digest, limit)
+
+@app.get("/results")
+def search_results(classification: str = "must-read", days: float = 30, papers_dir: str | None = None,
+                   limit: int = 1000):
+    """papers classified `classification` in the last `days` days, latest per filename"""
+    since = time.time() - days * 86400
+    return _store().search(classification, since, papers_dir, limit)
+
+@app.get("/triage/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"no such job: {job_id}")
+    return _job_status(job)
@@ -0,0 +1,142 @@
+"""
+Near-duplicate papers in one inbox: arxiv v1 next to v2, the same pdf
+downloaded twice under different names.
+
+Each extracted text is cut into word 5-gram shingles, and a 128-value
+MinHash signature is built from them. It's the one-permutation kind:
+every shingle is hashed once and lands in one of 128 bins, each bin
+keeps its minimum, and empty bins borrow from the next full one. That's
+O(shingles) instead of O(shingles x 128). The signatures are bucketed by
+banded LSH (32 bands of 4 rows), so only papers that share a band are
+ever compared, not every pair. A candidate pair counts as duplicate when
+the signatures agree on at least DEDUP_THRESHOLD of their values, which
+estimates the shingles' Jaccard similarity. Clusters are the connected
+components of those pairs.
+
+Triage analyses one representative per cluster, the one with the most
+text (usually the later version). Its analysis is copied to the others,
+each marked with duplicate_of. TRIAGE_DEDUP=off turns it off.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+from collections import defaultdict
+
+log = logging.getLogger(__name__)
+
+TRIAGE_DEDUP = os.environ.get("TRIAGE_DEDUP", "on").lower() not in ("", "0", "off", "false")
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.8"))
+# the front of the paper is plenty, and versions mostly differ at the back
+DEDUP_CHARS = 20_000
+SHINGLE = 5
+BANDS, ROWS = 32, 4
+NUM_PERM = BANDS * ROWS
+MIN_SHINGLES = 20  # less than that is a failed extraction or a cover page
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# numpy is imported where it's used, same as the prefilter
+_MIX = 0x9E3779B97F4A7C15  # odd 64-bit constant, fibonacci hashing
+_BIN_SHIFT = 64 - (NUM_PERM - 1).bit_length()
+
+
+def shingles(text: str):
+    """distinct 64-bit hashes of the word 5-grams -> uint64 array.
+    built on hash(str), so only comparable within one process"""
+    import numpy as np
+
+    words = _WORD.findall(text.lower())
+    n = len(words) - SHINGLE + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64)
+    w = np.fromiter(map(hash, words), dtype=np.int64, count=len(words)).view(np.uint64)
+    h = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k in range(SHINGLE):
+            h = h * np.uint64(_MIX) + w[k:k + n]
+    return np.unique(h)
+
+
+def signature(sh):
+    """one-permutation MinHash of a shingle array -> uint64 array of NUM_PERM"""
+    import numpy as np
+
+    with np.errstate(over="ignore"):
+        h = sh * np.uint64(_MIX)
+    bins = (h >> np.uint64(_BIN_SHIFT)).astype(np.intp)
+    vals = h & np.uint64((1 << _BIN_SHIFT) - 1)
+    sig = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    np.minimum.at(sig, bins, vals)
+    full = np.flatnonzero(sig != np.iinfo(np.uint64).max)
+    if len(full) < NUM_PERM:
+        # densify: an empty bin takes the next full bin's value (wrapping), tagged
+        # with the distance so two borrowed values only match if both borrowed alike
+        pos = np.arange(NUM_PERM)
+        nxt = np.searchsorted(full, pos) % len(full)
+        dist = (full[nxt] - pos) % NUM_PERM
+        sig = sig[full[nxt]] + (dist.astype(np.uint64) << np.uint64(_BIN_SHIFT))
+    return sig
+
+
+def similarity(s1, s2) -> float:
+    """estimated jaccard of the two shingle sets"""
+    return float((s1 == s2).mean())
+
+
+def find_duplicates(texts: dict[str, str], threshold: float | None = None) -> dict[str, str]:
+    """{filename: text} -> {duplicate: representative}, papers without a
+    near-duplicate aren't in it"""
+    threshold = DEDUP_THRESHOLD if threshold is None else threshold
+    sigs, size = {}, {}
+    for f, text in texts.items():
+        sh = shingles(text)
+        if len(sh) >= MIN_SHINGLES:
+            sigs[f], size[f] = signature(sh), len(sh)
+    if len(sigs) < 2:
+        return {}
+
+    buckets = defaultdict(list)
+    for f, sig in sigs.items():
+        for band in range(BANDS):
+            buckets[band, sig[band * ROWS:(band + 1) * ROWS].tobytes()].append(f)
+
+    parent = {f: f for f in sigs}
+
+    def root(f):
+        while parent[f] != f:
+            parent[f] = parent[parent[f]]
+            f = parent[f]
+        return f
+
+    checked = set()
+    for members in buckets.values():
+        for i, f in enumerate(members):
+            for g in members[i + 1:]:
+                if (f, g) in checked:
+                    continue
+                checked.add((f, g))
+                if root(f) != root(g) and similarity(sigs[f], sigs[g]) >= threshold:
+                    parent[root(f)] = root(g)
+
+    groups = defaultdict(list)
+    for f in sigs:
+        groups[root(f)].append(f)
+    out = {}
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        rep = min(members, key=lambda f: (-size[f], f))
+        out.update({f: rep for f in members if f != rep})
+    log.info("dedup: %d papers are near-duplicates of %d others (%d candidate pairs checked)",
+             len(out), len(set(out.values())), len(checked))
+    return out
+
+
+def clusters(dups: dict[str, str]) -> dict[str, list[str]]:
+    """{duplicate: representative} -> {representative: [duplicates]}"""
+    out = defaultdict(list)
+    for f, rep in sorted(dups.items()):
+        out[rep].append(f)
+    return dict(out)
@@ -0,0 +1,145 @@
+"""
+On-disk cache of extracted pdf text, keyed by content hash.
+
+Lives in a single sqlite file so several uvicorn workers can share it —
+sqlite does the cross-process locking for us (WAL + busy timeout), we just
+keep writes short. Eviction is LRU by last hit, bounded by total text size.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_PATH = os.path.expanduser("~/.cache/paper-triage/extract.sqlite")
+# EXTRACT_CACHE=off disables it entirely
+CACHE_PATH = os.environ.get("EXTRACT_CACHE", DEFAULT_PATH)
+CACHE_MAX_MB = float(os.environ.get("EXTRACT_CACHE_MAX_MB", "512"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extracts (
+    key       TEXT PRIMARY KEY,
+    text      TEXT NOT NULL,
+    idx       TEXT,              -- section outline as json, see sections.py
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS extracts_lru ON extracts(last_used);
+"""
+
+
+def hash_file(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while block := fh.read(chunk):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_key(digest, max_chars=0, max_pages=0):
+    # a pymupdf upgrade can change the extracted text, so it's part of the
+    # key. so is the extraction budget, a shorter budget means a shorter text
+    import fitz
+
+    return f"{digest}:{fitz.VersionBind}:{max_chars or 0}:{max_pages or 0}"
+
+
+class ExtractCache:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        db = self._connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            if "idx" not in {r[1] for r in db.execute("PRAGMA table_info(extracts)")}:
+                # cache file from before outlines existed
+                try:
+                    db.execute("ALTER TABLE extracts ADD COLUMN idx TEXT")
+                except sqlite3.OperationalError:
+                    pass  # another worker just did it
+        finally:
+            db.close()
+
+    def _connect(self):
+        # fresh connection per call: scan_inbox runs in a worker thread and
+        # sqlite connections don't like crossing threads
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def get_many(self, keys):
+        """-> {key: (text, index or None)} for the keys we have, bumping their LRU stamp"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        found = {}
+        db = self._connect()
+        try:
+            # sqlite caps host params per statement, go in slices
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                qs = ",".join("?" * len(part))
+                rows = db.execute(f"SELECT key, text, idx FROM extracts WHERE key IN ({qs})", part)
+                found.update((k, (t, json.loads(i) if i else None)) for k, t, i in rows)
+            if found:
+                now = time.time()
+                db.execute("BEGIN IMMEDIATE")
+                db.executemany("UPDATE extracts SET last_used=? WHERE key=?",
+                               [(now, k) for k in found])
+                db.execute("COMMIT")
+        finally:
+            db.close()
+        return found
+
+    def put_many(self, items):
+        """store {key: (text, index or None)} and evict least-recently-used rows
+        past the size cap"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for k, (t, idx) in items.items():
+            idx = json.dumps(idx) if idx is not None else None
+            rows.append((k, t, idx, len(t.encode()) + len(idx or ""), now))
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT OR REPLACE INTO extracts(key, text, idx, size, last_used) VALUES (?,?,?,?,?)",
+                rows,
+            )
+            self._evict(db)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM extracts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in db.execute("SELECT key, size FROM extracts ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        db.executemany("DELETE FROM extracts WHERE key=?", doomed)
+
+
+_cache = None
+_disabled = not CACHE_PATH or CACHE_PATH.lower() == "off"
+
+
+def get_cache():
+    """process-wide cache, or None if disabled / the path isn't writable"""
+    global _cache, _disabled
+    if _cache is None and not _disabled:
+        try:
+            _cache = ExtractCache(CACHE_PATH, CACHE_MAX_MB * 1024 * 1024)
+        except (OSError, sqlite3.Error):
+            # read-only container fs etc — just run uncached
+            _disabled = True
+    return _cache
@@ -0,0 +1,210 @@
+"""
+Background triage jobs.
+
+POST /triage with background=true queues a job and returns right away;
+the client polls GET /triage/{id}. Every run on a given papers_dir —
+queued or synchronous — goes through the same per-directory lock, so two
+requests can't race each other in materialize_results.
+
+Jobs belong to a tenant (the request's `tenant`, else the papers dir).
+Up to TRIAGE_JOB_WORKERS jobs run at once, at most TRIAGE_TENANT_JOBS
+per tenant, and the next one is picked by weighted round-robin over
+tenants rather than first come first served. Past TRIAGE_MAX_QUEUED
+waiting jobs (or TRIAGE_MAX_QUEUED_PER_TENANT for one tenant) submit
+raises QueueFull, which the app turns into a 429. The model calls inside
+a run are shared out the same way, see scheduler.py.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass, field
+
+from agent import materialize, metrics, result_store, scheduler, triage
+from agent.schemas import TriageResult
+from agent.triage import materialize_results, run_triage
+
+JOB_WORKERS = int(os.environ.get("TRIAGE_JOB_WORKERS", "4"))
+TENANT_JOBS = int(os.environ.get("TRIAGE_TENANT_JOBS", "1"))
+MAX_QUEUED = int(os.environ.get("TRIAGE_MAX_QUEUED", "100"))
+MAX_QUEUED_PER_TENANT = int(os.environ.get("TRIAGE_MAX_QUEUED_PER_TENANT", "10"))
+# finished jobs we keep around for polling before forgetting them
+JOB_HISTORY = int(os.environ.get("TRIAGE_JOB_HISTORY", "200"))
+
+STAGES = ("extracting", "analysing", "ranking", "materializing")
+
+_dir_locks: dict[str, asyncio.Lock] = {}
+
+
+def dir_lock(papers_dir: str) -> asyncio.Lock:
+    key = os.path.realpath(papers_dir)
+    if key not in _dir_locks:
+        _dir_locks[key] = asyncio.Lock()
+    return _dir_locks[key]
+
+
+def default_tenant(papers_dir: str) -> str:
+    return os.path.realpath(papers_dir)
+
+
+async def triage_dir(papers_dir: str, on_event=None, files=None, tenant: str | None = None) -> TriageResult:
+    """run_triage + materialize_results for one papers dir, holding its lock.
+    with files set only those get triaged, merged into the existing outputs"""
+    token = scheduler.tenant.set(tenant or default_tenant(papers_dir))
+    try:
+        async with dir_lock(papers_dir):
+            # a crash mid-materialize last time leaves a journal, settle it before scanning the inbox
+            await asyncio.to_thread(materialize.recover, papers_dir)
+            digests = {}
+            result = await run_triage(os.path.join(papers_dir, "inbox"), on_event=on_event, files=files,
+                                      digests=digests)
+            if on_event is not None:
+                on_event("materializing", {})
+            await asyncio.to_thread(materialize_results, result, papers_dir, files is not None)
+            await asyncio.to_thread(result_store.record, result, papers_dir, tenant=scheduler.tenant.get(),
+                                    model=triage._model_key(), mode=triage.TRIAGE_MODE, digests=digests)
+            return result
+    finally:
+        scheduler.tenant.reset(token)
+
+
+@dataclass
+class Job:
+    id: str
+    papers_dir: str
+    tenant: str = "default"
+    status: str = "queued"  # queued | running | done | failed
+    stage: str | None = None
+    progress: dict[str, dict] = field(default_factory=lambda: {s: {"done": 0, "total": 0} for s in STAGES})
+    result: TriageResult | None = None
+    error: str | None = None
+    created: float = field(default_factory=time.time)
+    finished: float | None = None
+
+    def on_event(self, kind: str, data: dict):
+        # may be called from the extraction thread — plain assignments only
+        if kind == "extracted":
+            self.stage = "extracting"
+            self.progress["extracting"] = {"done": data["done"], "total": data["total"]}
+        elif kind == "analysis":
+            self.stage = "analysing"
+            self.progress["analysing"] = {"done": data["done"], "total": data["total"]}
+        elif kind == "ranked":
+            self.stage = "ranking"
+            self.progress["ranking"] = {"done": 1, "total": 1}
+        elif kind == "materializing":
+            self.stage = "materializing"
+            self.progress["materializing"] = {"done": 0, "total": 1}
+
+
+class QueueFull(Exception):
+    """too much already waiting, try again later"""
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, history: int = JOB_HISTORY,
+                 tenant_jobs: int = TENANT_JOBS, max_queued: int = MAX_QUEUED,
+                 max_queued_per_tenant: int = MAX_QUEUED_PER_TENANT, weights=None):
+        self.n_workers = max(1, workers)
+        self.history = history
+        self.tenant_jobs = max(1, tenant_jobs)
+        self.max_queued = max_queued
+        self.max_queued_per_tenant = max_queued_per_tenant
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self.rr = scheduler.WeightedRR(weights)
+        self._pending: dict[str, deque[Job]] = {}
+        self._running: Counter[str] = Counter()
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, papers_dir: str, tenant: str | None = None) -> Job:
+        tenant = tenant or default_tenant(papers_dir)
+        queued = self.queued()
+        if sum(queued.values()) >= self.max_queued or queued.get(tenant, 0) >= self.max_queued_per_tenant:
+            metrics.inc("triage_jobs_rejected_total", tenant=scheduler.metric_tenant(tenant))
+            raise QueueFull(f"{queued.get(tenant, 0)} jobs already queued for {tenant}, "
+                            f"{sum(queued.values())} overall")
+        job = Job(id=uuid.uuid4().hex, papers_dir=papers_dir, tenant=tenant)
+        self.jobs[job.id] = job
+        self._prune()
+        self._pending.setdefault(tenant, deque()).append(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def queued(self) -> dict[str, int]:
+        return {t: len(q) for t, q in self._pending.items() if q}
+
+    def running(self) -> dict[str, int]:
+        return {t: n for t, n in self._running.items() if n}
+
+    def _prune(self):
+        done = [j.id for j in self.jobs.values() if j.finished is not None]
+        for jid in done[:max(0, len(done) - self.history)]:
+            del self.jobs[jid]
+
+    def _dispatch(self):
+        # tasks start on first use so we pick up whatever loop uvicorn runs
+        while sum(self._running.values()) < self.n_workers:
+            tenant = self.rr.pick([t for t, q in self._pending.items()
+                                   if q and self._running[t] < self.tenant_jobs])
+            if tenant is None:
+                return
+            job = self._pending[tenant].popleft()
+            if not self._pending[tenant]:
+                del self._pending[tenant]
+            self._running[tenant] += 1
+            task = asyncio.create_task(self._work(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _work(self, job: Job):
+        job.status = "running"
+        try:
+            job.result = await triage_dir(job.papers_dir, on_event=job.on_event, tenant=job.tenant)
+            job.progress["materializing"] = {"done": 1, "total": 1}
+            job.stage, job.status = None, "done"
+        except Exception as exc:
+            job.status, job.error = "failed", f"{type(exc).__name__}: {exc}"
+        finally:
+            job.finished = time.time()
+            self._running[job.tenant] -= 1
+            if self._running[job.tenant] <= 0:
+                del self._running[job.tenant]
+            self._dispatch()
+
+
+def gauges(queue: "JobQueue") -> dict[str, float]:
+    """queue depth for /metrics, per tenant plus the shared model budget"""
+    out = {"triage_jobs_queued": sum(queue.queued().values()),
+           "triage_jobs_running": sum(queue.running().values()),
+           "triage_llm_slots_in_use": scheduler.llm.busy(),
+           "triage_llm_slots_budget": scheduler.llm.budget,
+           "triage_llm_waiting": sum(scheduler.llm.waiting().values())}
+    for name, per_tenant in (("triage_tenant_jobs_queued", queue.queued()),
+                             ("triage_tenant_jobs_running", queue.running()),
+                             ("triage_tenant_llm_waiting", scheduler.llm.waiting()),
+                             ("triage_tenant_llm_slots_in_use", scheduler.llm.in_use)):
+        # unlisted tenants are summed into "default", see scheduler.metric_tenant
+        summed = Counter()
+        for t, n in per_tenant.items():
+            summed[scheduler.metric_tenant(t)] += n
+        for t, n in summed.items():
+            out[metrics.labeled(name, tenant=t)] = n
+    return out
+
+
+job_queue = JobQueue()
+
+metrics.describe("triage_jobs_rejected_total", "counter", "background jobs turned away because the queue was full")
+metrics.describe("triage_jobs_queued", "gauge", "background jobs waiting to start")
+metrics.describe("triage_jobs_running", "gauge", "background jobs running")
+metrics.describe("triage_llm_slots_in_use", "gauge", "agent runs holding a slot of the shared budget")
+metrics.describe("triage_llm_waiting", "gauge", "agent runs waiting for a slot")
+metrics.describe("triage_llm_slots_budget", "gauge", "TRIAGE_LLM_BUDGET")
+metrics.describe("triage_tenant_jobs_queued", "gauge", "background jobs waiting to start, per tenant")
+metrics.describe("triage_tenant_jobs_running", "gauge", "background jobs running, per tenant")
+metrics.describe("triage_tenant_llm_waiting", "gauge", "agent runs waiting for a slot, per tenant")
+metrics.describe("triage_tenant_llm_slots_in_use", "gauge", "slots of the shared budget held, per tenant")
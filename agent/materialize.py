@@ -0,0 +1,205 @@
+"""
+Sorting the inbox into bucket folders + writing the output files, as one
+recoverable step.
+
+The order matters:
+  1. reading_order.txt / triage_report.json go to temp files next to the
+     real ones, fsynced
+  2. a journal listing every planned move and staged output is atomically
+     written to <papers_dir>/.triage-journal.json — this is the commit point
+  3. the moves run on a thread pool: os.rename when it's the same
+     filesystem, copy to a .part + os.replace + unlink when it isn't
+  4. the staged outputs are os.replace'd over the real ones, journal removed
+
+A crash before 2 leaves nothing but temp files; after 2, recover() (run
+before the next triage on that dir) replays the journal. Every step is
+idempotent so replaying a half-done run is fine. MATERIALIZE_RECOVER=back
+undoes the moves instead, putting the pdfs back in the inbox.
+"""
+import errno
+import fcntl
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from agent import metrics
+
+log = logging.getLogger(__name__)
+
+MATERIALIZE_WORKERS = int(os.environ.get("MATERIALIZE_WORKERS", "8"))
+MATERIALIZE_RECOVER = os.environ.get("MATERIALIZE_RECOVER", "forward")  # forward | back
+
+BUCKETS = ("must-read", "nice-to-read", "bullshit")
+JOURNAL = ".triage-journal.json"
+# the journal comes and goes, so the flock is taken on this file instead
+LOCK = ".triage-journal.lock"
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # not every fs lets you fsync a directory
+    finally:
+        os.close(fd)
+
+
+def _write_durable(path, data: str):
+    with open(path, "w") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def write_atomic(path, data: str):
+    """temp file in the same dir + os.replace, readers see old or new, never half"""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    _write_durable(tmp, data)
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+def plan(result, base_dir) -> list[tuple[str, str]]:
+    """(src, dst) for every analysed pdf still sitting in the inbox"""
+    inbox = os.path.join(base_dir, "inbox")
+    moves = []
+    for p in result.papers:
+        if p.classification not in BUCKETS:
+            continue
+        src = os.path.join(inbox, p.filename)
+        if os.path.exists(src):
+            moves.append((src, os.path.join(base_dir, p.classification, p.filename)))
+    return moves
+
+
+def _outputs(result) -> dict[str, str]:
+    order = "".join(f"{e.rank}. {e.filename} | {e.justification}\n" for e in result.reading_order)
+    report = json.dumps([p.model_dump() for p in result.papers], indent=2)
+    return {"reading_order.txt": order, "triage_report.json": report}
+
+
+@contextmanager
+def _locked(base_dir):
+    """exclusive flock for one commit or recover. jobs.dir_lock only covers
+    this process; this also keeps the watcher, the API and several uvicorn
+    workers off each other's journal and staged files"""
+    fd = os.open(os.path.join(base_dir, LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # drops the lock
+
+
+def _move(src, dst):
+    """idempotent: a move that already happened is a no-op"""
+    if not os.path.exists(src):
+        return
+    try:
+        os.replace(src, dst)
+        return
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+    # other filesystem: never leave a half-copied pdf under the real name
+    part = dst + ".part"
+    shutil.copy2(src, part)
+    with open(part, "rb") as fh:
+        os.fsync(fh.fileno())
+    os.replace(part, dst)
+    os.unlink(src)
+
+
+def _run_moves(moves, workers):
+    if not moves:
+        return
+    with ThreadPoolExecutor(max(1, min(workers, len(moves)))) as pool:
+        # list() so the first failure raises here
+        list(pool.map(lambda m: _move(*m), moves))
+    for d in {os.path.dirname(p) for m in moves for p in m}:
+        _fsync_dir(d)
+
+
+def commit(result, base_dir, workers=None, merge=None):
+    """move pdfs to their folders + write the output files, journaled.
+    merge(result, base_dir) -> result runs under the lock, so whatever it
+    reads of the outputs on disk can't change before they're replaced"""
+    workers = workers or MATERIALIZE_WORKERS
+    for bucket in BUCKETS:
+        os.makedirs(os.path.join(base_dir, bucket), exist_ok=True)
+    with _locked(base_dir):
+        if merge is not None:
+            result = merge(result, base_dir)
+        _commit(result, base_dir, workers)
+
+
+def _commit(result, base_dir, workers):
+    moves = plan(result, base_dir)
+    staged = {}
+    for name, data in _outputs(result).items():
+        staged[name] = os.path.join(base_dir, f".{name}.staged")
+        _write_durable(staged[name], data)
+
+    # paths relative to base_dir, so a journal still replays if the mount moves
+    rel = [[os.path.relpath(p, base_dir) for p in m] for m in moves]
+    write_atomic(os.path.join(base_dir, JOURNAL), json.dumps({
+        "moves": rel, "outputs": {n: os.path.basename(p) for n, p in staged.items()}}))
+    _replay(base_dir, moves, staged, workers)
+
+
+def _replay(base_dir, moves, staged, workers):
+    _run_moves(moves, workers)
+    for name, tmp in staged.items():
+        if os.path.exists(tmp):
+            os.replace(tmp, os.path.join(base_dir, name))
+    _fsync_dir(base_dir)
+    os.unlink(os.path.join(base_dir, JOURNAL))
+
+
+def _rollback(base_dir, moves, staged):
+    # only pdfs that really left the inbox, a dst that predates this run stays put
+    _run_moves([(dst, src) for src, dst in moves if not os.path.exists(src)], MATERIALIZE_WORKERS)
+    for tmp in staged.values():
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    os.unlink(os.path.join(base_dir, JOURNAL))
+
+
+def recover(base_dir, mode=None) -> str | None:
+    """finish (or undo) a materialize that didn't get to the end.
+    returns what was done, None if there was nothing to recover"""
+    path = os.path.join(base_dir, JOURNAL)
+    if not os.path.exists(path):
+        return None  # the usual case, no need to lock for it
+    with _locked(base_dir):
+        # someone else may have just finished it
+        try:
+            with open(path) as fh:
+                journal = json.load(fh)
+        except FileNotFoundError:
+            return None
+        return _recover(base_dir, journal, mode)
+
+
+def _recover(base_dir, journal, mode):
+    moves = [tuple(os.path.join(base_dir, p) for p in m) for m in journal["moves"]]
+    staged = {n: os.path.join(base_dir, t) for n, t in journal["outputs"].items()}
+    mode = mode or MATERIALIZE_RECOVER
+    log.warning("found an interrupted materialize in %s (%d moves), rolling %s",
+                base_dir, len(moves), mode)
+    if mode == "back":
+        _rollback(base_dir, moves, staged)
+    else:
+        _replay(base_dir, moves, staged, MATERIALIZE_WORKERS)
+    metrics.inc("triage_materialize_recovered_total", direction=mode)
+    return mode
+
+
+metrics.describe("triage_materialize_recovered_total", "counter", "interrupted materializations replayed or undone")
@@ -0,0 +1,180 @@
+"""
+Per-stage timings + counters, exposed as Prometheus text on GET /metrics.
+
+Deliberately tiny — no prometheus_client dependency, just counters and
+histograms keyed by (name, labels). Labels stay low-cardinality (stage,
+agent, tool); per-file detail only goes to the optional JSON trace log:
+
+    TRACE_LOG=/var/log/triage-trace.jsonl   # or TRACE_LOG=stderr
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_LOG = os.environ.get("TRACE_LOG")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+_hists: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+_help: dict[str, tuple[str, str]] = {}  # name -> (type, help)
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def describe(name: str, kind: str, text: str):
+    _help[name] = (kind, text)
+
+
+def inc(name: str, value: float = 1, **labels):
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    k = _key(name, labels)
+    with _lock:
+        h = _hists.get(k)
+        if h is None:
+            h = _hists[k] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, b in enumerate(BUCKETS):
+            if value <= b:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+def _trace(record: dict):
+    if not TRACE_LOG:
+        return
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        if TRACE_LOG == "stderr":
+            sys.stderr.write(line)
+        else:
+            with open(TRACE_LOG, "a") as fh:
+                fh.write(line)
+
+
+def record(stage: str, seconds: float, **attrs):
+    """a stage that was timed elsewhere (e.g. inside a pool worker)"""
+    observe("triage_stage_seconds", seconds, stage=stage)
+    _trace({"ts": time.time(), "span": stage, "seconds": round(seconds, 6), **attrs})
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """time a block into triage_stage_seconds{stage=...}. attrs only go to the trace log"""
+    t0 = time.perf_counter()
+    err = None
+    try:
+        yield attrs
+    except BaseException as exc:
+        err = type(exc).__name__
+        raise
+    finally:
+        if err:
+            attrs["error"] = err
+            inc("triage_stage_errors_total", stage=stage)
+        record(stage, time.perf_counter() - t0, **attrs)
+
+
+def record_usage(agent: str, usage):
+    """token counts off a pydantic-ai RunUsage"""
+    inc("triage_llm_tokens_total", getattr(usage, "input_tokens", 0) or 0, agent=agent, kind="input")
+    inc("triage_llm_tokens_total", getattr(usage, "output_tokens", 0) or 0, agent=agent, kind="output")
+
+
+async def run_agent(agent, prompt, **kwargs):
+    """agent.run, but with a model_request span per round-trip to the model.
+
+    walks the run graph with agent.iter — a model request node's time is
+    until the next node starts, which is the model call itself
+    """
+    name = agent.name or "agent"
+    with span("agent_run", agent=name):
+        async with agent.iter(prompt, **kwargs) as run:
+            t0, in_request = None, False
+            async for node in run:
+                if in_request:
+                    record("model_request", time.perf_counter() - t0, agent=name)
+                    inc("triage_model_requests_total", agent=name)
+                in_request = agent.is_model_request_node(node)
+                t0 = time.perf_counter()
+            result = run.result
+    record_usage(name, result.usage())
+    return result
+
+
+def _escape(v) -> str:
+    # the exposition format's escapes for label values: backslash, quote, newline
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def labeled(name: str, **labels) -> str:
+    """'name{k="v"}', for per-label extra_gauges keys"""
+    return name + _fmt_labels(sorted(labels.items()))
+
+
+def render(extra_gauges: dict[str, float] | None = None) -> str:
+    """prometheus text exposition format. extra_gauges are point-in-time
+    values read at scrape time, keys are names or labeled() names"""
+    out, seen = [], set()
+
+    def header(name, default_kind):
+        if name in seen:
+            return
+        seen.add(name)
+        kind, text = _help.get(name, (default_kind, name))
+        out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kind}")
+
+    with _lock:
+        counters = sorted(_counters.items())
+        hists = sorted((k, list(v)) for k, v in _hists.items())
+
+    for (name, labels), v in counters:
+        header(name, "counter")
+        out.append(f"{name}{_fmt_labels(labels)} {v:g}")
+    for (name, labels), h in hists:
+        header(name, "histogram")
+        for b, c in zip(BUCKETS, h):
+            out.append(f"{name}_bucket{_fmt_labels(labels, [('le', b)])} {c}")
+        out.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {h[-1]}")
+        out.append(f"{name}_sum{_fmt_labels(labels)} {h[-2]:g}")
+        out.append(f"{name}_count{_fmt_labels(labels)} {h[-1]}")
+    for name, v in sorted((extra_gauges or {}).items()):
+        header(name.split("{", 1)[0], "gauge")
+        out.append(f"{name} {v:g}")
+    return "\n".join(out) + "\n"
+
+
+describe("triage_stage_seconds", "histogram", "time spent per pipeline stage")
+describe("triage_stage_errors_total", "counter", "stages that raised")
+describe("triage_model_requests_total", "counter", "round-trips to the model")
+describe("triage_llm_tokens_total", "counter", "tokens reported by the model provider")
+describe("triage_extract_cache_hits_total", "counter", "pdfs served from the extraction cache")
+describe("triage_prefilter_papers_seen_total", "counter", "papers the off-topic pre-filter looked at")
+describe("triage_prefilter_papers_skipped_total", "counter", "papers the pre-filter decided without the model")
+describe("triage_prefilter_calls_saved_total", "counter", "estimated model calls saved by the pre-filter")
+describe("triage_prefilter_tokens_saved_total", "counter", "estimated prompt tokens saved by the pre-filter")
+describe("triage_dedup_papers_total", "counter", "near-duplicate papers that reused another paper's analysis")
+describe("triage_output_retries_total", "counter", "single-mode re-requests for papers the last answer got wrong")
+describe("triage_output_invalid_papers_total", "counter", "papers missing from or invalid in a single-mode answer")
+describe("triage_output_salvaged_papers_total", "counter", "valid papers kept from answers that had invalid ones")
+describe("triage_output_wasted_tokens_total", "counter", "estimated output tokens spent on entries that failed validation")
+describe("triage_output_unresolved_papers_total", "counter", "papers still invalid once the retry budget ran out")
@@ -0,0 +1,166 @@
+"""
+Packs paper previews into the upfront triage message under a token budget.
+
+The old fixed PREVIEW_CHARS (100 local / 300 API) wasted most of an API
+model's context and still overflowed small local models on big inboxes.
+Here each backend gets a token budget, previews get whatever share of it
+is left after the fixed overhead, and if even the minimum preview per
+paper won't fit the inbox is split over several calls.
+
+Token counts are estimated at ~4 chars/token — no tokenizer dependency,
+and being a bit off just means a bit of slack either way.
+"""
+import math
+import os
+import re
+
+# tokens available for the preview message, per backend. with several
+# backends the smallest applies. TRIAGE_CONTEXT_TOKENS overrides all of it
+BACKEND_BUDGETS = {
+    "lmstudio": 2_500,    # LM Studio's default 4k context, minus tools + output
+    "bedrock": 60_000,
+    "anthropic": 60_000,
+}
+DEFAULT_BUDGET = 30_000
+
+# system prompt, tool schemas and the output all come out of the same window
+RESERVED_TOKENS = int(os.environ.get("TRIAGE_RESERVED_TOKENS", "1000"))
+
+MAX_PREVIEW_CHARS = int(os.environ.get("MAX_PREVIEW_CHARS", "2000"))
+
+CHARS_PER_TOKEN = 4
+
+_ABSTRACT = re.compile(r"\babstract\b", re.IGNORECASE)
+# the abstract marker is only looked for this far in
+ABSTRACT_SEARCH = 4000
+# so nothing past this point of a paper can end up in its preview, which is
+# all a caller with texts on disk needs to read
+PREVIEW_SOURCE_CHARS = ABSTRACT_SEARCH + MAX_PREVIEW_CHARS
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_backends(spec: str) -> list[tuple[str, str | None, int | None]]:
+    """TRIAGE_BACKENDS -> [(model, url or None, limit or None)]. the router
+    builds its backends from this, here it's only about their context"""
+    out = []
+    for entry in filter(None, (e.strip() for e in spec.replace(";", ",").split(","))):
+        limit = None
+        if "*" in entry:
+            entry, n = entry.rsplit("*", 1)
+            limit = int(n)
+        name, _, url = entry.partition("@")
+        out.append((name.strip(), url.strip() or None, limit))
+    return out
+
+
+def backend_names() -> list[str]:
+    """every backend a call may land on: one, or one per TRIAGE_BACKENDS entry.
+    anything behind an openai-compatible url counts as local (LM Studio, vllm...)"""
+    spec = os.environ.get("TRIAGE_BACKENDS")
+    if spec:
+        return [("lmstudio" if url else name.split(":", 1)[0]) for name, url, _ in split_backends(spec)]
+    if os.environ.get("LMSTUDIO_URL"):
+        return ["lmstudio"]
+    model_str = os.environ.get("TRIAGE_MODEL", "anthropic:")
+    return [model_str.split(":", 1)[0]]
+
+
+def is_local() -> bool:
+    """any local backend in the mix -> callers should size everything for it"""
+    return "lmstudio" in backend_names()
+
+
+def context_budget() -> int:
+    """the router can send a call anywhere, so the smallest context wins"""
+    override = os.environ.get("TRIAGE_CONTEXT_TOKENS")
+    if override:
+        return int(override)
+    return min(BACKEND_BUDGETS.get(n, DEFAULT_BUDGET) for n in backend_names())
+
+
+def preview_region(text: str) -> str:
+    """title + abstract first. papers put the title in the first couple of
+    lines and the abstract right after the author block, so skip the
+    authors/affiliations when we can find the abstract marker"""
+    head = text[:ABSTRACT_SEARCH]
+    m = _ABSTRACT.search(head)
+    if not m:
+        return text
+    lines = [ln for ln in head[:m.start()].splitlines() if ln.strip()]
+    title = "\n".join(lines[:2])
+    return f"{title}\n{text[m.start():]}" if title else text[m.start():]
+
+
+def _header(fname: str) -> str:
+    return f"--- {fname} ---\n"
+
+
+def _frame_tokens(fname: str) -> int:
+    # header plus the blank line after the preview
+    return estimate_tokens(_header(fname) + "\n\n") + 1
+
+
+def _fill(regions: dict[str, str], budget_chars: int, cap: int) -> dict[str, int]:
+    """water-fill: every paper gets an equal share, and short papers hand
+    what they don't use back to the rest"""
+    alloc = {}
+    left = sorted(regions, key=lambda f: len(regions[f]))
+    while left:
+        share = budget_chars // len(left)
+        f = left[0]
+        want = min(len(regions[f]), cap)
+        if want <= share:
+            alloc[f] = want
+            budget_chars -= want
+            left.pop(0)
+        else:
+            for f in left:
+                alloc[f] = min(share, cap)
+            break
+    return alloc
+
+
+def pack_previews(papers: dict[str, str], budget_tokens: int | None = None,
+                  min_chars: int = 300, max_chars: int = MAX_PREVIEW_CHARS,
+                  overhead: str = "") -> list[dict[str, str]]:
+    """split papers into batches of {fname: preview}, each batch fitting
+    in budget_tokens once overhead (instructions etc) is accounted for.
+    every paper gets at least min_chars; a batch is closed off before that
+    stops being true"""
+    budget_tokens = context_budget() if budget_tokens is None else budget_tokens
+    usable = max(budget_tokens - RESERVED_TOKENS - estimate_tokens(overhead), 0)
+
+    # nothing past max_chars of a region can make it into a preview
+    keep = max(max_chars, min_chars)
+    regions = {f: preview_region(t)[:keep] for f, t in papers.items()}
+
+    # greedy batches: keep adding papers while each one could still get min_chars
+    batches, cur, cur_tokens = [], [], 0
+    for f in papers:
+        need = _frame_tokens(f) + math.ceil(min(min_chars, len(regions[f])) / CHARS_PER_TOKEN)
+        if cur and cur_tokens + need > usable:
+            batches.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append(f)
+        cur_tokens += need
+    if cur:
+        batches.append(cur)
+
+    out = []
+    for names in batches:
+        header_tokens = sum(_frame_tokens(f) for f in names)
+        room = max(usable - header_tokens, 0) * CHARS_PER_TOKEN
+        alloc = _fill({f: regions[f] for f in names}, room, max_chars)
+        out.append({f: regions[f][:max(alloc[f], min(min_chars, len(regions[f])))] for f in names})
+    return out
+
+
+def build_message(previews: dict[str, str]) -> str:
+    parts = [f"Triage these {len(previews)} papers:\n\n"]
+    for fname, chunk in previews.items():
+        parts.append(f"{_header(fname)}{chunk}\n\n")
+    parts.append("Classify all and produce the reading order.")
+    return "".join(parts)
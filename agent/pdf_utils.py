@@ -1,23 +1,330 @@
-import fitz
+import faulthandler
+import multiprocessing as mp
 import os
-from tqdm import tqdm
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from agent import metrics, sections
+
+from agent.extract_cache import cache_key, get_cache, hash_file
+
+# worker count for the extraction pool. 1 = old serial loop, which is also
+# what you want under a debugger
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", "1"))
+# seconds a single pdf gets before we give up on it (0 = no limit). only
+# enforced with EXTRACT_WORKERS > 1, the serial loop has nowhere to run a
+# watchdog from (it's usually on a worker thread, where signals can't go)
+EXTRACT_TIMEOUT = float(os.environ.get("EXTRACT_TIMEOUT", "60"))
+# upfront extraction stops around this many chars / pages (0 = no limit).
+# anything past it is pulled lazily when read_paper asks for a later offset
+EXTRACT_CHAR_BUDGET = int(os.environ.get("EXTRACT_CHAR_BUDGET", "12000"))
+EXTRACT_PAGE_BUDGET = int(os.environ.get("EXTRACT_PAGE_BUDGET", "0"))
+
+# build the section outline (sections.py) while extracting. it reads pages
+# via get_text("dict") instead of plain text, a bit slower; 0 turns it off
+EXTRACT_INDEX = os.environ.get("EXTRACT_INDEX", "1") != "0"
+
+MORE_PAGES = "\n[more pages not extracted]"
+
+# cache lookups/writes are batched this many files at a time
+_CACHE_CHUNK = 256
+
+
+# a worker stuck inside mupdf past timeout + this gets killed outright
+HARD_TIMEOUT_GRACE = 5
+
+
+class ExtractTimeout(BaseException):
+    # not an Exception, or _extract's catch-all would turn it into an
+    # ordinary "couldn't read" and carry on with the next page
+    pass
+
+
+def extract_text(path, max_chars=None, max_pages=None):
+    """rip text from a pdf, best effort.
+
+    stops at the first page boundary past max_chars (or after max_pages) so
+    a 50-page paper doesn't get fully parsed just to show the agent its
+    first few thousand chars. if it stopped early the text ends with
+    MORE_PAGES so callers know there's more to fetch.
+    """
+    return _extract(path, max_chars, max_pages, False)[0]
+
+
+def extract_indexed(path, max_chars=None, max_pages=None):
+    """extract_text plus the section outline -> (text, index). same text,
+    index is None if the pdf couldn't be read"""
+    return _extract(path, max_chars, max_pages, True)
+
+
+def _extract(path, max_chars, max_pages, want_index):
+    import fitz  # ~0.1s, not worth paying at import for a server that may only serve /health
 
-def extract_text(path):
-    """rip text from a pdf, best effort"""
     try:
         doc = fitz.open(path)
-        out = ""
-        for pg in doc:
-            out += pg.get_text()
-        doc.close()
-        return out.strip()
+        try:
+            parts, lines, n, more = [], [], 0, False
+            for i, pg in enumerate(doc):
+                if (max_pages and i >= max_pages) or (max_chars and n >= max_chars):
+                    more = True
+                    break
+                if want_index:
+                    # same lines get_text() would give, plus their font info
+                    t = []
+                    at = n
+                    for text, size, bold in sections.page_lines(
+                            pg.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)):
+                        lines.append((at, i, text, size, bold))
+                        t.append(text + "\n")
+                        at += len(text) + 1
+                    t = "".join(t)
+                else:
+                    t = pg.get_text()
+                parts.append(t)
+                n += len(t)
+        finally:
+            doc.close()
+        raw = "".join(parts)
+        out = raw.strip()
+        index = None
+        if want_index:
+            index = sections.build_index(lines)
+            # offsets were into the unstripped text
+            lead = len(raw) - len(raw.lstrip())
+            for sec in index["sections"]:
+                sec["start"] -= lead
+            if index["references"] is not None:
+                index["references"] -= lead
+        return (out + MORE_PAGES if more else out), index
     except Exception as exc:
         # some pdfs are just broken beyond repair
-        return f"[couldn't read {path}: {exc}]"
-
-def scan_inbox(inbox_dir):
-    papers = {}
-    files = sorted(f for f in os.listdir(inbox_dir) if f.lower().endswith(".pdf"))
-    for f in tqdm(files, desc="Extracting PDFs", unit="paper"):
-        papers[f] = extract_text(os.path.join(inbox_dir, f))
-    return papers
+        return f"[couldn't read {path}: {exc}]", None
+
+
+def has_more(text):
+    return text.endswith(MORE_PAGES)
+
+
+def strip_more(text):
+    return text[:-len(MORE_PAGES)] if has_more(text) else text
+
+
+def _on_alarm(signum, frame):
+    raise ExtractTimeout()
+
+
+def _extract_worker(path, timeout, max_chars, max_pages, want_index):
+    """runs inside a pool worker. two limits: the alarm raises ExtractTimeout
+    at the next python bytecode, which covers slow page-by-page extraction
+    but can't interrupt a single call stuck inside mupdf. for that,
+    faulthandler's watchdog thread (plain C, doesn't need the GIL) kills
+    the whole worker HARD_TIMEOUT_GRACE seconds later, and the parent sees
+    a broken pool, see _extract_parallel"""
+    t0 = time.perf_counter()
+    if timeout:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        faulthandler.dump_traceback_later(timeout + HARD_TIMEOUT_GRACE, exit=True)
+    try:
+        text, index = _extract(path, max_chars, max_pages, want_index)
+    except ExtractTimeout:
+        text, index = f"[couldn't read {path}: timed out after {timeout:g}s]", None
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            faulthandler.cancel_dump_traceback_later()
+    # timing comes back with the text, metrics live in the parent process
+    return text, index, time.perf_counter() - t0
+
+
+def _extract_serial(paths, budget, want_index):
+    for p in paths:
+        with metrics.span("extract", file=os.path.basename(p)):
+            res = _extract(p, *budget, want_index)
+        yield res
+
+
+def _extract_parallel(paths, workers, timeout, budget, want_index):
+    """yields (text, index) in the order of paths. only a few tasks are kept
+    ahead of the consumer, so finished texts don't pile up in the parent.
+
+    a worker that dies (segfault in mupdf, the hard timeout) breaks the
+    whole pool and fails every task in flight, with no telling whose pdf
+    did it. those tasks are rerun one at a time in a pool of their own, so
+    only the culprit ends up as "couldn't read", then the scan carries on
+    in a fresh pool"""
+    # spawn, not fork — we may be called from a uvicorn worker thread and
+    # forking a threaded process is asking for trouble
+    ctx = mp.get_context("spawn")
+    todo = deque(paths)
+    pending = deque()
+    pool = solo = None
+
+    def run(executor, path):
+        return executor.submit(_extract_worker, path, timeout, *budget, want_index)
+
+    def collect(path, fut):
+        try:
+            text, index, secs = fut.result()
+        except BrokenProcessPool:
+            raise
+        except Exception as exc:
+            return f"[couldn't read {path}: {exc}]", None
+        metrics.record("extract", secs, file=os.path.basename(path))
+        return text, index
+
+    def alone(path):
+        nonlocal solo
+        if solo is None:
+            solo = ProcessPoolExecutor(1, mp_context=ctx)
+        t0 = time.perf_counter()
+        try:
+            return collect(path, run(solo, path))
+        except BrokenProcessPool:
+            solo.shutdown(wait=False)
+            solo = None
+            if timeout and time.perf_counter() - t0 >= timeout:
+                return f"[couldn't read {path}: timed out after {timeout:g}s]", None
+            return f"[couldn't read {path}: extraction process crashed]", None
+
+    try:
+        while todo or pending:
+            if pool is None:
+                pool = ProcessPoolExecutor(workers, mp_context=ctx)
+            while todo and len(pending) < workers * 4:
+                p = todo.popleft()
+                pending.append((p, run(pool, p)))
+            # collect in submission order so output stays sorted by filename
+            path, fut = pending.popleft()
+            try:
+                yield collect(path, fut)
+            except BrokenProcessPool:
+                pool.shutdown(wait=False)
+                pool = None
+                suspects = [(path, fut), *pending]
+                pending.clear()
+                for p, f in suspects:
+                    # some may have finished before the crash, those stand
+                    done = f.done() and not isinstance(f.exception(), BrokenProcessPool)
+                    yield collect(p, f) if done else alone(p)
+    finally:
+        for executor in (pool, solo):
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+
+def extract_failed(text):
+    return text.startswith("[couldn't read ")
+
+
+def iter_inbox(inbox_dir, workers=None, timeout=None, use_cache=True,
+               max_chars=None, max_pages=None, on_file=None, files=None, digests=None):
+    """extract every pdf in inbox_dir, yielding (filename, text, index) as
+    each one is done. cache hits come first, then fresh extractions in
+    filename order.
+
+    anything already in the extraction cache (same bytes, same pymupdf) is
+    served from there and never opened with fitz. workers > 1 spreads the
+    misses over a process pool so one broken pdf can only take down its
+    own worker, not the whole scan. cache reads and writes go in chunks and
+    nothing is held once it's yielded, so memory stays flat however big
+    the inbox is (as long as the caller doesn't keep it all either).
+
+    texts are cut at the char/page budget, see extract_text. index is the
+    section outline (sections.py), None with EXTRACT_INDEX=0. on_file(name)
+    fires as each file is done (cache hits included), for progress reporting.
+    files limits the scan to those names (the watcher's micro-batches).
+    pass a dict as digests to get {filename: content hash} filled in, the
+    same hashes the cache lookup uses, so nobody downstream has to rehash.
+    """
+    workers = EXTRACT_WORKERS if workers is None else workers
+    timeout = EXTRACT_TIMEOUT if timeout is None else timeout
+    budget = (EXTRACT_CHAR_BUDGET if max_chars is None else max_chars,
+              EXTRACT_PAGE_BUDGET if max_pages is None else max_pages)
+    want_index = EXTRACT_INDEX
+
+    if files is None:
+        files = os.listdir(inbox_dir)
+    files = sorted(f for f in files if f.lower().endswith(".pdf"))
+    paths = {f: os.path.join(inbox_dir, f) for f in files}
+
+    from tqdm import tqdm
+
+    # disable=None: no bar when stdout isn't a tty (i.e. in the container)
+    bar = tqdm(total=len(files), desc="Extracting PDFs", unit="paper", disable=None)
+
+    def tick(name):
+        bar.update(1)
+        if on_file is not None:
+            on_file(name)
+
+    cache = get_cache() if use_cache else None
+    keys, todo = {}, []
+    try:
+        for i in range(0, len(files), _CACHE_CHUNK):
+            chunk = files[i:i + _CACHE_CHUNK]
+            if cache is not None or digests is not None:
+                for f in chunk:
+                    try:
+                        digest = hash_file(paths[f])
+                    except OSError:
+                        continue  # unreadable — let extract_text report it
+                    keys[f] = cache_key(digest, *budget)
+                    if digests is not None:
+                        digests[f] = digest
+            if cache is None:
+                todo += chunk
+                continue
+            hits = cache.get_many({keys[f] for f in chunk if f in keys})
+            n_hits = 0
+            for f in chunk:
+                hit = hits.get(keys.get(f))
+                # rows cached before outlines existed count as misses, once
+                if hit is None or (want_index and hit[1] is None):
+                    todo.append(f)
+                    continue
+                n_hits += 1
+                tick(f)
+                yield f, *hit
+            metrics.inc("triage_extract_cache_hits_total", n_hits)
+
+        if workers > 1 and len(todo) > 1:
+            fresh = _extract_parallel([paths[f] for f in todo], min(workers, len(todo)),
+                                      timeout, budget, want_index)
+        else:
+            fresh = _extract_serial([paths[f] for f in todo], budget, want_index)
+
+        unsaved = {}
+        for f, (text, index) in zip(todo, fresh):
+            # don't pin failures, a timeout might just have been a busy box
+            if cache is not None and f in keys and not extract_failed(text):
+                unsaved[keys[f]] = (text, index)
+                if len(unsaved) >= _CACHE_CHUNK:
+                    cache.put_many(unsaved)
+                    unsaved = {}
+            tick(f)
+            yield f, text, index
+        if unsaved:
+            cache.put_many(unsaved)
+    finally:
+        bar.close()
+
+
+def scan_inbox(inbox_dir, workers=None, timeout=None, use_cache=True,
+               max_chars=None, max_pages=None, on_file=None, files=None, indexes=None, digests=None):
+    """iter_inbox collected -> {filename: text}, sorted by filename.
+
+    pass a dict as indexes to get {filename: section outline} filled in
+    (see sections.py; stays empty with EXTRACT_INDEX=0). digests, same
+    idea, see iter_inbox.
+    """
+    texts = {}
+    for f, text, index in iter_inbox(inbox_dir, workers, timeout, use_cache,
+                                     max_chars, max_pages, on_file, files, digests):
+        texts[f] = text
+        if indexes is not None and index is not None:
+            indexes[f] = index
+    return {f: texts[f] for f in sorted(texts)}
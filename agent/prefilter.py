@@ -0,0 +1,161 @@
+"""
+Cheap local pre-filter that marks obviously off-topic papers as bullshit
+without spending a model call on them.
+
+Plain multinomial naive bayes over L2-normalised TF-IDF vectors, trained
+from a ground_truth.json-style label file (title + key contribution +
+tags per paper). Only the off-topic side is ever decided
+locally, and only when the posterior clears PREFILTER_THRESHOLD —
+everything else still goes to the LLM.
+
+Off unless PREFILTER_LABELS points at a label file. Don't point it at the
+ground truth you're scoring against, that's just leaking the answers.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from typing import TYPE_CHECKING
+
+from agent.schemas import PaperAnalysis
+
+if TYPE_CHECKING:
+    import numpy as np
+    from scipy import sparse
+
+log = logging.getLogger(__name__)
+
+PREFILTER_LABELS = os.environ.get("PREFILTER_LABELS")
+PREFILTER_THRESHOLD = float(os.environ.get("PREFILTER_THRESHOLD", "0.9"))
+# only look at the start of the paper, that's where the topic is
+SCORE_CHARS = 3000
+
+STOP_WORDS = frozenset(
+    "the a an and or of in for to is are that with on by as it its this we our from be at "
+    "which can these using via into than not have has been such also".split()
+)
+_TOKEN = re.compile(r"[a-z][a-z0-9\-]+")
+
+# running totals since process start, for the metrics endpoint
+STATS = {"papers_seen": 0, "papers_skipped": 0, "calls_saved": 0, "tokens_saved": 0}
+
+
+def tokenize(text: str) -> list[str]:
+    return [w for w in _TOKEN.findall(text.lower()) if w not in STOP_WORDS]
+
+
+# numpy/scipy are imported where they're used: the filter is off by default
+# and scipy alone is a quarter second of every cold start
+
+
+class OffTopicFilter:
+    def __init__(self, docs: list[str], off_topic: list[bool], alpha: float = 0.1):
+        import numpy as np
+
+        toks = [tokenize(d) for d in docs]
+        self.vocab = {w: i for i, w in enumerate(sorted({w for t in toks for w in t}))}
+        tf = self._counts(toks)
+
+        n_docs = tf.shape[0]
+        df = np.bincount(tf.indices, minlength=len(self.vocab))
+        self.idf = np.log((1 + n_docs) / (1 + df)) + 1.0
+
+        X = self._tfidf(tf)
+        y = np.asarray(off_topic, dtype=bool)
+        # row 0 = on-topic, row 1 = off-topic
+        feats = np.vstack([np.asarray(X[~y].sum(axis=0)).ravel(),
+                           np.asarray(X[y].sum(axis=0)).ravel()]) + alpha
+        self.log_prob = np.log(feats / feats.sum(axis=1, keepdims=True))
+        prior = np.array([(~y).sum(), y.sum()], dtype=float) + 1.0
+        self.log_prior = np.log(prior / prior.sum())
+
+    @classmethod
+    def from_labels(cls, path: str) -> "OffTopicFilter":
+        with open(path) as fh:
+            labels = json.load(fh)["labels"]
+        docs, off = [], []
+        for meta in labels.values():
+            docs.append(" ".join([meta.get("title", ""), meta.get("key_contribution", ""),
+                                  " ".join(meta.get("domain_tags", []))]))
+            off.append(meta.get("classification") == "bullshit")
+        return cls(docs, off)
+
+    def _counts(self, toks: list[list[str]]) -> sparse.csr_matrix:
+        import numpy as np
+        from scipy import sparse
+
+        rows, cols = [], []
+        for r, t in enumerate(toks):
+            for w in t:
+                c = self.vocab.get(w)
+                if c is not None:
+                    rows.append(r)
+                    cols.append(c)
+        data = np.ones(len(rows))
+        m = sparse.csr_matrix((data, (rows, cols)), shape=(len(toks), len(self.vocab)))
+        m.sum_duplicates()
+        return m
+
+    def _tfidf(self, tf: sparse.csr_matrix) -> sparse.csr_matrix:
+        import numpy as np
+        from scipy import sparse
+
+        X = tf.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ X
+
+    def off_topic_proba(self, texts: list[str]) -> np.ndarray:
+        """P(off-topic) per text, all in one sparse matmul"""
+        import numpy as np
+
+        X = self._tfidf(self._counts([tokenize(t[:SCORE_CHARS]) for t in texts]))
+        jll = np.asarray(X @ self.log_prob.T) + self.log_prior
+        jll -= jll.max(axis=1, keepdims=True)
+        p = np.exp(jll)
+        return p[:, 1] / p.sum(axis=1)
+
+
+_filter = None
+
+
+def get_filter() -> OffTopicFilter | None:
+    global _filter
+    if _filter is None and PREFILTER_LABELS:
+        _filter = OffTopicFilter.from_labels(PREFILTER_LABELS)
+    return _filter
+
+
+def _guess_title(text: str) -> str:
+    for ln in text.splitlines():
+        if ln.strip():
+            return ln.strip()[:200]
+    return ""
+
+
+def prefilter(papers: dict[str, str], threshold: float | None = None) -> dict[str, PaperAnalysis]:
+    """-> {fname: analysis} for the papers confidently off-topic. the rest
+    are left for the model"""
+    flt = get_filter()
+    if flt is None or not papers:
+        return {}
+    threshold = PREFILTER_THRESHOLD if threshold is None else threshold
+
+    names = list(papers)
+    proba = flt.off_topic_proba([papers[f] for f in names])
+    out = {}
+    for fname, p in zip(names, proba):
+        if p < threshold:
+            continue
+        title = _guess_title(papers[fname]) or fname
+        out[fname] = PaperAnalysis(
+            filename=fname,
+            title=title,
+            classification="bullshit",
+            domain_tags=["off-topic"],
+            key_contribution=title,
+            relevance_score=round(float(1.0 - p), 3),
+        )
+    return out
@@ -0,0 +1,193 @@
+"""
+Every triage result ever produced, append-only.
+
+triage_report.json and reading_order.txt only hold the latest run of a
+papers dir. After each run triage_dir also appends the result here: one
+row per run (dir, tenant, model, mode, reading order), and one row per
+paper with its analysis as compact json. Filename, classification,
+content hash and time are real indexed columns, so "what is X classified
+as now" is an index lookup instead of a rescan of report files. Rows are
+never updated. The one exception is `latest`, a small table with one row
+per (papers dir, filename) pointing at its newest result. That's what
+makes "every must-read of the last 30 days" a few milliseconds, however
+many times each paper has been re-triaged.
+
+Same sqlite setup as the analysis cache (WAL, a connection per call),
+safe to share between uvicorn workers. RESULT_STORE=off disables it.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.expanduser("~/.cache/paper-triage/results.sqlite")
+STORE_PATH = os.environ.get("RESULT_STORE", DEFAULT_PATH)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id            INTEGER PRIMARY KEY,
+    created       REAL NOT NULL,
+    papers_dir    TEXT NOT NULL,
+    tenant        TEXT,
+    model         TEXT,
+    mode          TEXT,
+    n_papers      INTEGER NOT NULL,
+    reading_order TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id              INTEGER PRIMARY KEY,
+    run_id          INTEGER NOT NULL REFERENCES runs(id),
+    created         REAL NOT NULL,
+    filename        TEXT NOT NULL,
+    digest          TEXT,
+    classification  TEXT NOT NULL,
+    relevance_score REAL NOT NULL,
+    rank            INTEGER,
+    duplicate_of    TEXT,
+    data            TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_filename ON results(filename, created);
+CREATE INDEX IF NOT EXISTS results_class ON results(classification, created);
+CREATE INDEX IF NOT EXISTS results_digest ON results(digest, created);
+CREATE INDEX IF NOT EXISTS results_run ON results(run_id);
+CREATE TABLE IF NOT EXISTS latest (
+    papers_dir      TEXT NOT NULL,
+    filename        TEXT NOT NULL,
+    result_id       INTEGER NOT NULL,
+    classification  TEXT NOT NULL,
+    created         REAL NOT NULL,
+    relevance_score REAL NOT NULL,
+    PRIMARY KEY (papers_dir, filename)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS latest_class ON latest(classification, created, relevance_score, result_id);
+CREATE TRIGGER IF NOT EXISTS runs_append_only BEFORE UPDATE ON runs
+    BEGIN SELECT RAISE(ABORT, 'runs are append-only'); END;
+CREATE TRIGGER IF NOT EXISTS results_append_only BEFORE UPDATE ON results
+    BEGIN SELECT RAISE(ABORT, 'results are append-only'); END;
+"""
+
+_COLS = ("r.filename, r.classification, r.relevance_score, r.rank, r.digest, r.created, r.data, "
+         "r.run_id, u.papers_dir, u.tenant, u.model, u.mode")
+
+
+def _row(row) -> dict:
+    (filename, cls, score, rank, digest, created, data, run_id, papers_dir, tenant, model, mode) = row
+    return {"filename": filename, "classification": cls, "relevance_score": score, "rank": rank,
+            "digest": digest, "created": created, "analysis": json.loads(data),
+            "run": {"id": run_id, "papers_dir": papers_dir, "tenant": tenant, "model": model, "mode": mode}}
+
+
+class ResultStore:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        db = self._connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _query(self, sql, args) -> list[dict]:
+        db = self._connect()
+        try:
+            return [_row(r) for r in db.execute(sql, args)]
+        finally:
+            db.close()
+
+    def record(self, result, papers_dir, tenant=None, model=None, mode=None, digests=None) -> int:
+        """append one TriageResult -> run id. digests is {filename: content
+        hash}, the ones the scan already computed (run_triage fills them in)"""
+        digests = digests or {}
+        rank = {e.filename: e.rank for e in result.reading_order}
+        order = json.dumps([e.model_dump() for e in result.reading_order], separators=(",", ":"))
+        now = time.time()
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            run_id = db.execute(
+                "INSERT INTO runs(created, papers_dir, tenant, model, mode, n_papers, reading_order) "
+                "VALUES (?,?,?,?,?,?,?)",
+                (now, os.path.realpath(papers_dir), tenant, model, mode, len(result.papers), order),
+            ).lastrowid
+            db.executemany(
+                "INSERT INTO results(run_id, created, filename, digest, classification, relevance_score, "
+                "rank, duplicate_of, data) VALUES (?,?,?,?,?,?,?,?,?)",
+                [(run_id, now, p.filename, digests.get(p.filename), p.classification, p.relevance_score,
+                  rank.get(p.filename), p.duplicate_of, p.model_dump_json()) for p in result.papers],
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO latest SELECT ?, filename, id, classification, created, relevance_score "
+                "FROM results WHERE run_id = ? ORDER BY id", (os.path.realpath(papers_dir), run_id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+        return run_id
+
+    def latest(self, filename) -> dict | None:
+        """most recent analysis of filename, from any papers dir"""
+        rows = self.history(filename, limit=1)
+        return rows[0] if rows else None
+
+    def history(self, filename, limit=50) -> list[dict]:
+        """every analysis of filename, newest first"""
+        return self._query(
+            f"SELECT {_COLS} FROM results r JOIN runs u ON u.id = r.run_id "
+            "WHERE r.filename = ? ORDER BY r.created DESC, r.id DESC LIMIT ?", (filename, limit))
+
+    def by_digest(self, digest, limit=50) -> list[dict]:
+        """analyses of this exact pdf under whatever name, newest first"""
+        return self._query(
+            f"SELECT {_COLS} FROM results r JOIN runs u ON u.id = r.run_id "
+            "WHERE r.digest = ? ORDER BY r.created DESC, r.id DESC LIMIT ?", (digest, limit))
+
+    def search(self, classification, since=0.0, papers_dir=None, limit=1000) -> list[dict]:
+        """papers whose latest analysis (per papers dir) is `classification` and
+        is from after `since` (epoch secs), best relevance first"""
+        where, args = "l.classification = ? AND l.created >= ?", [classification, since]
+        if papers_dir is not None:
+            where += " AND l.papers_dir = ?"
+            args.append(os.path.realpath(papers_dir))
+        # pick the winners off the index first, only they get their json read
+        return self._query(
+            f"SELECT {_COLS} FROM (SELECT result_id FROM latest l WHERE {where} "
+            "ORDER BY l.relevance_score DESC, l.filename LIMIT ?) t "
+            "JOIN results r ON r.id = t.result_id JOIN runs u ON u.id = r.run_id "
+            "ORDER BY r.relevance_score DESC, r.filename", (*args, limit))
+
+
+_store = None
+_disabled = not STORE_PATH or STORE_PATH.lower() == "off"
+
+
+def get_store():
+    """process-wide store, or None if disabled / the path isn't writable"""
+    global _store, _disabled
+    if _store is None and not _disabled:
+        try:
+            _store = ResultStore(STORE_PATH)
+        except (OSError, sqlite3.Error):
+            _disabled = True
+    return _store
+
+
+def record(result, papers_dir, **meta):
+    """append to the process-wide store if there is one. never raises, the
+    outputs on disk are what matter, history is a bonus"""
+    store = get_store()
+    if store is None:
+        return None
+    try:
+        return store.record(result, papers_dir, **meta)
+    except (OSError, sqlite3.Error) as exc:
+        log.warning("couldn't record the result of %s: %s", papers_dir, exc)
+        return None
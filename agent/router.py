@@ -0,0 +1,246 @@
+"""
+Spread model calls over several backends instead of the one _pick_model()
+used to choose. Set an ordered list:
+
+    TRIAGE_BACKENDS="qwen2.5-7b@http://gpu1:1234/v1*4, qwen2.5-7b@http://gpu2:1234/v1*2, anthropic:claude-sonnet-4-20250514*8"
+
+each entry is `model[@openai-compatible base url][*max in flight]`. Without
+a url it's any pydantic-ai model string. RouterModel is a normal
+pydantic-ai Model, so the agents don't know it's there:
+
+  - every request goes to the least loaded backend (in flight / limit,
+    earlier in the list wins ties), and waits when they're all full
+  - 429/5xx, connection errors and ROUTER_TIMEOUT fail over to the next
+    backend, and the failing one sits out ROUTER_COOLDOWN seconds
+  - with ROUTER_HEDGE=1, a call that runs past its backend's p95 gets a
+    duplicate on another backend with a free slot, first answer wins
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass, field
+
+from pydantic_ai.exceptions import FallbackExceptionGroup, ModelAPIError, ModelHTTPError
+from pydantic_ai.models import Model, infer_model
+
+from agent import metrics
+from agent.packing import split_backends
+
+log = logging.getLogger(__name__)
+
+ROUTER_TIMEOUT = float(os.environ.get("ROUTER_TIMEOUT", "120"))
+ROUTER_COOLDOWN = float(os.environ.get("ROUTER_COOLDOWN", "10"))
+ROUTER_HEDGE = os.environ.get("ROUTER_HEDGE", "0") not in ("", "0", "false", "off")
+# extra passes over the whole list once every backend has failed a request
+ROUTER_RETRIES = int(os.environ.get("ROUTER_RETRIES", "1"))
+DEFAULT_LIMIT = 4
+HEDGE_MIN_SAMPLES = 20  # no p95 worth trusting before this many calls
+RETRY_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+
+@dataclass(eq=False)
+class Backend:
+    model: Model
+    limit: int = DEFAULT_LIMIT
+    name: str = ""
+    inflight: int = 0
+    cooldown_until: float = 0.0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=200))
+
+    def __post_init__(self):
+        self.name = self.name or f"{self.model.system}:{self.model.model_name}"
+
+    def p95(self) -> float | None:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+
+def _failover(exc: BaseException) -> bool:
+    """worth trying another backend? (bad requests would fail anywhere)"""
+    if isinstance(exc, ModelHTTPError):
+        return exc.status_code in RETRY_STATUS
+    return isinstance(exc, (ModelAPIError, TimeoutError))
+
+
+def openai_backend(model_name: str, base_url: str, limit: int = DEFAULT_LIMIT,
+                   api_key: str | None = None, timeout: float | None = None) -> Backend:
+    # only url entries need the openai sdk, an anthropic-only install never gets here
+    from openai import AsyncOpenAI
+    from pydantic_ai.models.openai import OpenAIChatModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    # the router does the retrying, the sdk's own backoff would just delay failover
+    client = AsyncOpenAI(base_url=base_url, api_key=api_key or os.environ.get("OPENAI_API_KEY") or "api-key-not-set",
+                         max_retries=0, timeout=timeout or ROUTER_TIMEOUT)
+    model = OpenAIChatModel(model_name, provider=OpenAIProvider(openai_client=client))
+    return Backend(model, limit, name=f"{model_name}@{base_url}")
+
+
+def parse_backends(spec: str) -> list[Backend]:
+    """'model@url*4, anthropic:claude-...*8' -> [Backend]"""
+    out = []
+    for name, url, limit in split_backends(spec):
+        limit = DEFAULT_LIMIT if limit is None else limit
+        if url:
+            out.append(openai_backend(name, url, limit))
+        else:
+            out.append(Backend(infer_model(name), limit, name=name))
+    if not out:
+        raise ValueError(f"no backends in {spec!r}")
+    return out
+
+
+class RouterModel(Model):
+    def __init__(self, backends: list[Backend], timeout: float | None = None,
+                 cooldown: float | None = None, hedge: bool | None = None,
+                 retries: int | None = None):
+        super().__init__()
+        self.backends = list(backends)
+        self.timeout = ROUTER_TIMEOUT if timeout is None else timeout
+        self.cooldown = ROUTER_COOLDOWN if cooldown is None else cooldown
+        self.hedge = ROUTER_HEDGE if hedge is None else hedge
+        self.retries = ROUTER_RETRIES if retries is None else retries
+        # futures of requests waiting for a slot. plain futures rather than a
+        # Condition so one router survives several asyncio.run()s
+        self._waiters: list[asyncio.Future] = []
+
+    @property
+    def model_name(self) -> str:
+        return ",".join(b.name for b in self.backends)
+
+    @property
+    def system(self) -> str:
+        return "router"
+
+    @property
+    def profile(self):
+        return self.backends[0].model.profile
+
+    # each backend prepares its own request, like FallbackModel
+    def customize_request_parameters(self, model_request_parameters):
+        return model_request_parameters
+
+    def prepare_request(self, model_settings, model_request_parameters):
+        return model_settings, model_request_parameters
+
+    # --- slots ---
+
+    def _try_acquire(self, tried: set) -> Backend | None:
+        now = time.monotonic()
+        free = [b for b in self.backends
+                if b not in tried and b.cooldown_until <= now and b.inflight < b.limit]
+        if not free:
+            return None
+        best = min(free, key=lambda b: b.inflight / b.limit)  # min keeps list order on ties
+        best.inflight += 1
+        return best
+
+    async def _acquire(self, tried: set) -> Backend | None:
+        """least loaded untried backend, waiting for a slot or a cooldown to end.
+        None once every backend has been tried"""
+        while True:
+            b = self._try_acquire(tried)
+            if b is not None:
+                return b
+            left = [b for b in self.backends if b not in tried]
+            if not left:
+                return None
+            now = time.monotonic()
+            cooling = [b.cooldown_until - now for b in left if b.cooldown_until > now]
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await asyncio.wait_for(fut, timeout=min(cooling) if cooling else None)
+            except TimeoutError:
+                pass
+            finally:
+                with suppress(ValueError):
+                    self._waiters.remove(fut)
+
+    def _release(self, b: Backend):
+        b.inflight -= 1
+        # wake everyone, a waiter may have already tried the backend that freed up
+        for fut in self._waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+    # --- requests ---
+
+    async def _attempt(self, b: Backend, messages, model_settings, params):
+        t0 = time.perf_counter()
+        outcome = "error"
+        try:
+            res = await asyncio.wait_for(b.model.request(messages, model_settings, params), self.timeout)
+            outcome = "ok"
+            b.latencies.append(time.perf_counter() - t0)
+            metrics.observe("triage_router_seconds", time.perf_counter() - t0, backend=b.name)
+            return res
+        except asyncio.CancelledError:
+            outcome = "cancelled"  # lost a hedge race
+            raise
+        except Exception as exc:
+            if _failover(exc):
+                outcome = "timeout" if isinstance(exc, TimeoutError) else "failover"
+                b.cooldown_until = time.monotonic() + self.cooldown
+                log.warning("backend %s failed (%s), cooling down %.0fs", b.name,
+                            type(exc).__name__, self.cooldown)
+            raise
+        finally:
+            metrics.inc("triage_router_requests_total", backend=b.name, outcome=outcome)
+            self._release(b)
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        errors: list[Exception] = []
+        for _ in range(self.retries + 1):
+            tried: set[Backend] = set()
+            while (b := await self._acquire(tried)) is not None:
+                tried.add(b)
+                res = await self._race(b, tried, errors, messages, model_settings, model_request_parameters)
+                if res is not None:
+                    return res
+        raise FallbackExceptionGroup("every backend failed", errors)
+
+    async def _race(self, b, tried, errors, *args):
+        """run on b, hedge onto another backend past b's p95. None if all attempts failed over"""
+        loop = asyncio.get_running_loop()
+        tasks = {loop.create_task(self._attempt(b, *args))}
+        p95 = b.p95() if self.hedge else None
+        deadline = None if p95 is None else time.monotonic() + p95
+        try:
+            while tasks:
+                wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+                done, tasks = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    deadline = None  # one hedge per request
+                    h = self._try_acquire(tried)
+                    if h is not None:
+                        tried.add(h)
+                        metrics.inc("triage_router_hedges_total", backend=h.name)
+                        tasks.add(loop.create_task(self._attempt(h, *args)))
+                    continue
+                for t in done:
+                    exc = t.exception()
+                    if exc is None:
+                        return t.result()
+                    if not _failover(exc):
+                        raise exc
+                    errors.append(exc)
+            return None
+        finally:
+            for t in tasks:
+                t.cancel()
+
+
+def from_env() -> RouterModel | None:
+    spec = os.environ.get("TRIAGE_BACKENDS")
+    return RouterModel(parse_backends(spec)) if spec else None
+
+
+metrics.describe("triage_router_requests_total", "counter", "model calls per backend and outcome")
+metrics.describe("triage_router_hedges_total", "counter", "duplicate requests sent past the p95")
+metrics.describe("triage_router_seconds", "histogram", "successful model call latency per backend")
@@ -0,0 +1,157 @@
+"""
+Sharing one deployment between teams.
+
+Every agent run (one paper in mapreduce mode, one preview batch in single
+mode, the ranking call) takes a slot from a global budget of
+TRIAGE_LLM_BUDGET concurrent runs. When slots are short they're handed out
+by smooth weighted round-robin over the tenants that are waiting, not by
+arrival order. So a 2,000-paper inbox queues behind itself, and a
+10-paper run from another team still gets its share of every round.
+
+    TRIAGE_TENANT_WEIGHTS="ml-team=3,infra=1"   # unlisted tenants weigh 1
+
+Only listed tenants show up by name on /metrics, the rest as "default".
+
+The tenant rides along in a contextvar, set by jobs.triage_dir. Anything
+that runs outside it (tests, benchmarks) is tenant "default".
+"""
+import asyncio
+import os
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from agent import metrics
+
+TRIAGE_LLM_BUDGET = int(os.environ.get("TRIAGE_LLM_BUDGET", "16"))
+
+
+def _parse_weights(spec: str) -> dict[str, float]:
+    out = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, w = part.rpartition("=")
+        out[name.strip()] = float(w)
+    return out
+
+
+TENANT_WEIGHTS = _parse_weights(os.environ.get("TRIAGE_TENANT_WEIGHTS", ""))
+
+tenant: ContextVar[str] = ContextVar("triage_tenant", default="default")
+
+
+def metric_tenant(name: str) -> str:
+    """tenant as a metric label. tenants are free text (a request field, a
+    papers dir), so only the ones in TRIAGE_TENANT_WEIGHTS get series of
+    their own and everyone else is counted as "default" """
+    return name if name in TENANT_WEIGHTS else "default"
+
+
+class WeightedRR:
+    """smooth weighted round-robin (the nginx one): over any run of picks each
+    tenant gets its weight's share, interleaved rather than in bursts"""
+
+    def __init__(self, weights: dict[str, float] | None = None):
+        self.weights = TENANT_WEIGHTS if weights is None else weights
+        self._current: dict[str, float] = {}
+        self._last: dict[str, int] = {}  # when each was last picked, for ties
+        self._picks = 0
+
+    def weight(self, name: str) -> float:
+        return self.weights.get(name, 1.0)
+
+    def pick(self, candidates) -> str | None:
+        candidates = list(candidates)
+        if not candidates:
+            return None
+        # tenants that stopped waiting don't bank credit for later
+        for name in [n for n in self._current if n not in candidates]:
+            del self._current[name]
+            self._last.pop(name, None)
+        total = 0.0
+        for name in candidates:
+            self._current[name] = self._current.get(name, 0.0) + self.weight(name)
+            total += self.weight(name)
+        # on a tie the one that waited longest goes, so a newcomer isn't
+        # stuck behind whoever happened to be first in the dict
+        best = max(candidates, key=lambda n: (self._current[n], -self._last.get(n, -1)))
+        self._current[best] -= total
+        self._last[best] = self._picks
+        self._picks += 1
+        return best
+
+
+class FairScheduler:
+    def __init__(self, budget: int = TRIAGE_LLM_BUDGET, weights: dict[str, float] | None = None):
+        self.budget = max(1, budget)
+        self.rr = WeightedRR(weights)
+        self.in_use: Counter[str] = Counter()
+        # plain futures per waiter, so one scheduler outlives several event loops
+        self._waiting: dict[str, deque[asyncio.Future]] = {}
+
+    def busy(self) -> int:
+        return sum(self.in_use.values())
+
+    def waiting(self) -> dict[str, int]:
+        return {t: len(q) for t, q in self._waiting.items() if q}
+
+    def _grant(self, name):
+        self.in_use[name] += 1
+
+    def _dispatch(self):
+        while self.busy() < self.budget:
+            name = self.rr.pick([t for t, q in self._waiting.items() if q])
+            if name is None:
+                return
+            fut = self._waiting[name].popleft()
+            if not self._waiting[name]:
+                del self._waiting[name]
+            if fut.done():  # cancelled while queued
+                continue
+            self._grant(name)
+            fut.set_result(None)
+
+    async def acquire(self, name: str):
+        if self.busy() < self.budget and not self._waiting:
+            self._grant(name)
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(name, deque()).append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(name)  # granted just as we were cancelled
+            else:
+                q = self._waiting.get(name)
+                if q is not None and fut in q:
+                    q.remove(fut)
+                    if not q:
+                        del self._waiting[name]
+            raise
+
+    def release(self, name: str):
+        self.in_use[name] -= 1
+        if self.in_use[name] <= 0:
+            del self.in_use[name]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, name: str | None = None):
+        name = name or tenant.get()
+        await self.acquire(name)
+        metrics.inc("triage_llm_slots_granted_total", tenant=metric_tenant(name))
+        try:
+            yield
+        finally:
+            self.release(name)
+
+
+llm = FairScheduler()
+
+
+def llm_slot():
+    """async with llm_slot(): one agent run against the shared budget, as the current tenant"""
+    return llm.slot()
+
+
+metrics.describe("triage_llm_slots_granted_total", "counter", "agent runs started, per tenant")
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Literal
+from pydantic import BaseModel, ConfigDict, Field
+from pydantic.json_schema import WithJsonSchema
+from typing import Annotated, Any, Literal
 
 VALID_BUCKETS = ("must-read", "nice-to-read", "bullshit")
 
@@ -11,11 +12,28 @@ class PaperAnalysis(BaseModel):
     key_contribution: str
     relevance_score: float = Field(ge=0.0, le=1.0)
 
+# a paper as it goes into the report. the extra field is set by dedup after
+# the fact, so the model never sees it and the analysis cache never stores it.
+# from_attributes lets a plain PaperAnalysis go straight into a TriageResult
+class ReportedPaper(PaperAnalysis):
+    model_config = ConfigDict(from_attributes=True)
+    # the paper this one is a near-copy of
+    duplicate_of: str | None = None
+
 class ReadingOrderEntry(BaseModel):
     rank: int
     filename: str
     justification: str
 
 class TriageResult(BaseModel):
-    papers: list[PaperAnalysis]
+    papers: list[ReportedPaper]
     reading_order: list[ReadingOrderEntry]
+
+# what the whole-inbox agent is asked for. the model sees TriageResult's
+# schema, but entries only get validated one at a time afterwards
+# (triage._salvage), so one bad paper doesn't throw away the rest
+class TriageDraft(BaseModel):
+    papers: Annotated[list[dict[str, Any]],
+                      WithJsonSchema({"type": "array", "items": PaperAnalysis.model_json_schema()})]
+    reading_order: Annotated[list[dict[str, Any]],
+                             WithJsonSchema({"type": "array", "items": ReadingOrderEntry.model_json_schema()})]
@@ -0,0 +1,133 @@
+"""
+Per-paper outline built while extracting: title, section headings and where
+the references start, as char offsets into the extracted text. read_section
+uses it to hand the agent "3 Method" directly instead of it paging through
+the same prefix again.
+
+Headings come from PyMuPDF's font info: lines set bigger than the body
+text, bold numbered lines ("2.1 Reward model"), and the usual section names
+on a line of their own. Heuristic, but cheap, and it only has to be good
+enough to jump to roughly the right place.
+"""
+import re
+from collections import Counter
+
+KNOWN = frozenset({
+    "abstract", "introduction", "background", "preliminaries", "related work", "method",
+    "methods", "methodology", "approach", "model", "setup", "experiments",
+    "experimental setup", "results", "evaluation", "discussion", "analysis",
+    "limitations", "conclusion", "conclusions", "future work", "acknowledgments",
+    "acknowledgements", "acknowledgment", "references", "bibliography", "appendix",
+})
+REFERENCES = frozenset({"references", "bibliography"})
+
+# "3", "3.1", "3.1.", "IV.", "A." — a bare "A" is too often just the article
+_NUMBER = re.compile(r"^(?:\d+(?:\.\d+)*\.?|[IVX]+\.|[A-H]\.)\s+(?=\S)")
+_INLINE_ABSTRACT = re.compile(r"^abstract\s*[-—–.:]", re.I)
+MAX_HEADING = 80
+BOLD = 1 << 4
+
+
+def page_lines(page_dict):
+    """(text, size, bold) per line of a get_text("dict") page, in reading order.
+    joining the texts with "\\n" after each gives back page.get_text() exactly"""
+    out = []
+    for block in page_dict["blocks"]:
+        for line in block.get("lines", ()):
+            spans = line["spans"]
+            text = "".join(s["text"] for s in spans)
+            size = max((s["size"] for s in spans if s["text"].strip()), default=0.0)
+            bold = all(s["flags"] & BOLD or "bold" in s["font"].lower()
+                       for s in spans if s["text"].strip())
+            out.append((text, size, bold))
+    return out
+
+
+def _bare(name):
+    """'3.1 Related Work:' -> 'related work'"""
+    return _NUMBER.sub("", name).strip().rstrip(".:").lower()
+
+
+def build_index(lines):
+    """lines: (offset, page, text, size, bold) for every extracted line.
+    -> {"title", "sections": [{"name", "start"}], "references"}"""
+    weights = Counter()
+    for _, _, text, size, _ in lines:
+        weights[round(size * 2) / 2] += len(text)
+    if not weights:
+        return {"title": None, "sections": [], "references": None}
+    body = weights.most_common(1)[0][0]
+
+    # title: the first run of the biggest font on page one, if it stands out
+    first = [ln for ln in lines if ln[1] == 0 and ln[2].strip()]
+    title, title_at = None, set()
+    top = max((ln[3] for ln in first), default=0)
+    if top >= body + 1:
+        run = []
+        for ln in first:
+            if ln[3] == top:
+                run.append(ln)
+            elif run:
+                break
+        title = " ".join(ln[2].strip() for ln in run)[:200]
+        title_at = {ln[0] for ln in run}
+    elif first:
+        title = first[0][2].strip()[:200]
+
+    sections = []
+    for off, _, text, size, bold in lines:
+        s = text.strip()
+        if off in title_at or not s:
+            continue
+        if _INLINE_ABSTRACT.match(s):
+            name = "Abstract"
+        elif len(s) > MAX_HEADING or sum(c.isalpha() for c in s) < 3:
+            continue
+        elif _bare(s) in KNOWN:
+            name = s
+        elif (size >= body + 1 or bold) and _NUMBER.match(s) and not s.endswith("."):
+            name = s
+        elif size >= body + 1.5 and s[0].isupper() and not s.endswith(".") and len(s) <= 60:
+            name = s
+        else:
+            continue
+        if sections and sections[-1]["name"] == name:
+            continue  # heading wrapped over two lines of the same text, or a running header
+        sections.append({"name": name, "start": off + len(text) - len(text.lstrip())})
+
+    refs = next((sec["start"] for sec in sections if _bare(sec["name"]) in REFERENCES), None)
+    return {"title": title, "sections": sections, "references": refs}
+
+
+def find_section(index, name):
+    """(start, end) of the best match for name, end None = runs to the end.
+    exact heading first, then ignoring numbering, then prefix, then substring"""
+    secs = (index or {}).get("sections") or []
+    want = name.strip().lower()
+    want_bare = _bare(name)
+    for test in (lambda s: s["name"].lower() == want,
+                 lambda s: _bare(s["name"]) == want_bare,
+                 lambda s: _bare(s["name"]).startswith(want_bare),
+                 lambda s: want_bare in _bare(s["name"])):
+        for i, sec in enumerate(secs):
+            if want_bare and test(sec):
+                end = next((s["start"] for s in secs[i + 1:] if s["start"] > sec["start"]), None)
+                return sec["start"], end
+    return None
+
+
+def outline(index, text_len, more=False):
+    """compact outline the agent can pick sections from"""
+    if not index:
+        return "no outline available, use read_paper"
+    lines = [f"title: {index.get('title') or '?'}"]
+    secs = index.get("sections") or []
+    for i, sec in enumerate(secs):
+        end = secs[i + 1]["start"] if i + 1 < len(secs) else text_len
+        lines.append(f"{sec['name']} @{sec['start']} (~{max(end - sec['start'], 0)} chars)")
+    if not secs:
+        lines.append("(no headings found, use read_paper)")
+    if more:
+        lines.append("[only the first pages are extracted so far; read_section pulls in more "
+                     "if the section isn't listed yet]")
+    return "\n".join(lines)
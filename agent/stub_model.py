@@ -0,0 +1,96 @@
+"""
+Deterministic offline stand-in for the LLM, built on pydantic-ai's
+FunctionModel. Classifies by keyword, answers every output schema the
+triage agents use (whole TriageResult, single PaperAnalysis, ranking
+list) and can sleep to simulate backend latency. For benchmarks and
+offline rollouts — never touches the network.
+"""
+import asyncio
+import re
+import time
+
+from pydantic_ai.messages import ModelMessage, ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+MUST = ("rlhf", "preference", "reward", "alignment", "dpo", "kto", "ppo")
+NICE = ("mlops", "deployment", "serving", "pipeline", "monitoring")
+
+_SECTION = re.compile(r"^--- (.+?) ---$", re.MULTILINE)
+
+
+def classify(text: str) -> tuple[str, float]:
+    low = text.lower()
+    if any(w in low for w in MUST):
+        return "must-read", 0.9
+    if any(w in low for w in NICE):
+        return "nice-to-read", 0.55
+    return "bullshit", 0.1
+
+
+def _analysis(fname: str, text: str) -> dict:
+    cls, score = classify(text)
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    title = lines[0] if lines else fname
+    return {
+        "filename": fname,
+        "title": title,
+        "classification": cls,
+        "domain_tags": [cls.replace("-", "_")],
+        "key_contribution": title,
+        "relevance_score": score,
+    }
+
+
+def _sections(prompt: str) -> list[tuple[str, str]]:
+    """split a '--- fname ---' style prompt back into (fname, text) pairs"""
+    parts = _SECTION.split(prompt)
+    return [(parts[i].strip(), parts[i + 1]) for i in range(1, len(parts) - 1, 2)]
+
+
+def _last_prompt(messages: list[ModelMessage]) -> str:
+    for part in reversed(messages[-1].parts):
+        content = getattr(part, "content", None)
+        if isinstance(content, str):
+            return content
+    return ""
+
+
+class StubModel(FunctionModel):
+    """FunctionModel that also records how long each request took"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.request_times: list[float] = []
+        super().__init__(self._respond, model_name="stub")
+
+    async def _respond(self, messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        t0 = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        out = info.output_tools[0]
+        props = out.parameters_json_schema.get("properties", {})
+        prompt = _last_prompt(messages)
+
+        if "reading_order" in props:
+            # whole-inbox TriageResult
+            papers = [_analysis(f, t) for f, t in _sections(prompt)]
+            args = {"papers": papers, "reading_order": _order(papers)}
+        elif out.outer_typed_dict_key:
+            # ranking pass: "filename | classification | relevance | ..." lines
+            rows = [ln.split(" | ") for ln in prompt.splitlines() if ln.count(" | ") >= 2]
+            papers = [{"filename": r[0], "classification": r[1], "relevance_score": float(r[2]),
+                       "key_contribution": r[-1]} for r in rows]
+            args = {out.outer_typed_dict_key: _order(papers)}
+        else:
+            (fname, text), = _sections(prompt) or [("unknown.pdf", prompt)]
+            args = _analysis(fname, text)
+
+        self.request_times.append(time.perf_counter() - t0)
+        return ModelResponse(parts=[ToolCallPart(out.name, args)])
+
+
+def _order(papers: list[dict]) -> list[dict]:
+    must = [p for p in papers if p["classification"] == "must-read"]
+    must.sort(key=lambda p: (-p["relevance_score"], p["filename"]))
+    return [{"rank": i, "filename": p["filename"], "justification": p["key_contribution"]}
+            for i, p in enumerate(must, 1)]
@@ -0,0 +1,40 @@
+"""
+Synthetic inboxes: n generated pdfs whose abstracts match the stub
+model's keywords, one topic per bucket. For the benchmark, the offline
+rollout farm's tests and the test suite, next to stub_model.
+"""
+import os
+import random
+
+import fitz
+
+TOPICS = {
+    "must-read": "We study direct preference optimization and reward modeling for RLHF alignment.",
+    "nice-to-read": "We describe an MLOps pipeline for model deployment, serving and monitoring.",
+    "bullshit": "We measure phonon dispersion in layered cond-mat samples at low temperature.",
+}
+FILLER = ("Experiments across several benchmarks show consistent improvements over strong "
+          "baselines while keeping compute overhead small. ")
+
+
+def make_inbox(inbox: str, n: int, min_pages: int = 1, max_pages: int = 12, seed: int = 0):
+    """n synthetic papers, topic and page count drawn from a seeded rng"""
+    rng = random.Random(seed)
+    os.makedirs(inbox, exist_ok=True)
+    buckets = list(TOPICS)
+    for i in range(n):
+        cls = buckets[i % len(buckets)]
+        doc = fitz.open()
+        for pg in range(rng.randint(min_pages, max_pages)):
+            page = doc.new_page()
+            y = 72
+            if pg == 0:
+                page.insert_text((72, y), f"Synthetic Paper {i}", fontsize=16)
+                page.insert_text((72, y + 30), "Abstract", fontsize=12)
+                page.insert_text((72, y + 50), TOPICS[cls], fontsize=9)
+                y += 80
+            while y < 760:
+                page.insert_text((72, y), FILLER[:95], fontsize=9)
+                y += 12
+        doc.save(os.path.join(inbox, f"paper_{i:05d}.pdf"))
+        doc.close()
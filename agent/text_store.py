@@ -0,0 +1,142 @@
+"""
+On-disk spill store for extracted text, so a few thousand papers don't all
+have to sit in RAM for the whole run (the Fargate task only gets 1 GB).
+
+TextStore is a MutableMapping over a throwaway sqlite file, so the code
+that takes a {fname: text} dict takes a store too; only the one text being
+used is in memory at a time. slice()/head() read just a range, which is all
+the preview packer and prefilter need.
+
+Plain dicts still work everywhere, small inboxes never touch the disk.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections.abc import MutableMapping
+
+# inboxes with more pdfs than this keep their text on disk (0 = always)
+SPILL_PAPERS = int(os.environ.get("TRIAGE_SPILL_PAPERS", "500"))
+
+
+class TextStore(MutableMapping):
+    def __init__(self, path: str | None = None):
+        self._tmpdir = None
+        if path is None:
+            self._tmpdir = tempfile.mkdtemp(prefix="triage-text-")
+            path = os.path.join(self._tmpdir, "texts.sqlite")
+        self.path = path
+        # tools run in pydantic-ai's thread pool and the scan in another
+        # thread, so one shared connection behind a lock
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            # scratch data, nothing to recover after a crash
+            self._db.execute("PRAGMA journal_mode=OFF")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute("CREATE TABLE IF NOT EXISTS texts "
+                             "(name TEXT PRIMARY KEY, text TEXT NOT NULL)")
+
+    def _one(self, sql, args):
+        with self._lock:
+            return self._db.execute(sql, args).fetchone()
+
+    def __getitem__(self, name):
+        row = self._one("SELECT text FROM texts WHERE name=?", (name,))
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def __setitem__(self, name, text):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO texts(name, text) VALUES (?,?)", (name, text))
+
+    def __delitem__(self, name):
+        with self._lock:
+            if self._db.execute("DELETE FROM texts WHERE name=?", (name,)).rowcount == 0:
+                raise KeyError(name)
+
+    def __contains__(self, name):
+        return self._one("SELECT 1 FROM texts WHERE name=?", (name,)) is not None
+
+    def __iter__(self):
+        # names are small, texts are what we're keeping out of memory
+        with self._lock:
+            names = [r[0] for r in self._db.execute("SELECT name FROM texts ORDER BY name")]
+        return iter(names)
+
+    def __len__(self):
+        return self._one("SELECT COUNT(*) FROM texts", ())[0]
+
+    def put_many(self, items):
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO texts(name, text) VALUES (?,?)", items)
+            self._db.execute("COMMIT")
+
+    def slice(self, name, start, stop):
+        """text[start:stop] without loading the rest (sqlite substr is in chars)"""
+        row = self._one("SELECT substr(text, ?, ?) FROM texts WHERE name=?",
+                        (start + 1, max(stop - start, 0), name))
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Subset(MutableMapping):
+    """read-through view of some names in a store; writes go to the store"""
+
+    def __init__(self, base, names):
+        self.base, self.names = base, list(names)
+        self._set = set(self.names)
+
+    def __getitem__(self, name):
+        if name not in self._set:
+            raise KeyError(name)
+        return self.base[name]
+
+    def __setitem__(self, name, text):
+        if name not in self._set:
+            self._set.add(name)
+            self.names.append(name)
+        self.base[name] = text
+
+    def __delitem__(self, name):
+        # only drops it from the view, the store keeps it
+        self._set.remove(name)
+        self.names.remove(name)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
+def subset(texts, names):
+    """{name: text} for names, without pulling texts off disk for a store"""
+    if isinstance(texts, dict):
+        return {f: texts[f] for f in names}
+    return Subset(texts, names)
+
+
+def head(texts, name, n):
+    """first n chars of one text"""
+    if isinstance(texts, TextStore):
+        return texts.slice(name, 0, n)
+    if isinstance(texts, Subset):
+        return head(texts.base, name, n) if name in texts else texts[name]
+    return texts[name][:n]
@@ -1,15 +1,28 @@
+from __future__ import annotations
+
+import asyncio
 import json
+import logging
 import os
-import shutil
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, field
+from collections.abc import Mapping, MutableMapping
+from typing import TYPE_CHECKING, Callable
+
+from pydantic import ValidationError
+
+from agent.schemas import PaperAnalysis, ReadingOrderEntry, ReportedPaper, TriageDraft, TriageResult
+from agent import analysis_cache, dedup, materialize, metrics, prefilter, scheduler
+from agent.packing import (MAX_PREVIEW_CHARS, PREVIEW_SOURCE_CHARS, build_message,
+                           estimate_tokens, is_local, pack_previews)
+from agent.pdf_utils import extract_failed, extract_indexed, has_more, iter_inbox, strip_more
+from agent.sections import find_section, outline
+from agent.text_store import SPILL_PAPERS, TextStore, head, subset
 
-from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
-from tqdm import tqdm
+if TYPE_CHECKING:
+    from pydantic_ai import Agent, RunContext
 
-from agent.schemas import PaperAnalysis, ReadingOrderEntry, TriageResult
-from agent.pdf_utils import scan_inbox
+log = logging.getLogger(__name__)
 
 # kept this as a big string on purpose — easier to tweak prompts
 # inline than loading from a file during dev
@@ -32,27 +45,73 @@ Be ruthless. If a paper has nothing to do with RL or alignment, it's bullshit 
 Only mark must-read for papers you'd actually cancel a meeting to go read.\
 """
 
-# local models have way less context headroom than API
-_local = bool(os.environ.get("LMSTUDIO_URL"))
+# local models have way less context headroom than API.
+# PREVIEW_CHARS is the floor per paper now, packing.py hands out the rest of the budget
+_local = is_local()
 PREVIEW_CHARS  = 100   if _local else 300
 PAPER_TEXT_CAP = 1_500 if _local else 10_000
 
+# "single"    -> one agent run over the whole inbox (the original flow)
+# "mapreduce" -> one classification call per paper, then a ranking call
+TRIAGE_MODE = os.environ.get("TRIAGE_MODE", "single")
+# max in-flight per-paper calls in mapreduce mode
+TRIAGE_CONCURRENCY = int(os.environ.get("TRIAGE_CONCURRENCY", "8"))
+# single mode: how many times papers missing from / invalid in the agent's
+# answer get asked for again (just those papers). after that they stay in the inbox
+TRIAGE_OUTPUT_RETRIES = int(os.environ.get("TRIAGE_OUTPUT_RETRIES", "2"))
+
+# extra instructions for the two mapreduce agents, appended to SYSTEM_MSG
+PAPER_MSG = """
+
+Right now you're only looking at ONE paper. Produce the analysis for that paper;
+ranking happens later in a separate pass, so skip it.\
+"""
+
+RANKING_MSG = """
+
+The papers have already been classified. You get one line per paper:
+filename | classification | relevance | title | key contribution
+Produce the reading order for the must-reads only. Use the exact filenames.\
+"""
+
+# progress hook for run_triage, called as on_event(kind, data):
+#   "extracted" {"filename", "done", "total"}   — may fire from a worker thread
+#   "deduplicated" {"clusters": {representative: [duplicate fname]}}  — only if dedup found any
+#   "prefiltered" {"skipped": [fname], "calls_saved", "tokens_saved"}  — only with PREFILTER_LABELS
+#   "analysis"  {"paper": PaperAnalysis, "cached": bool, "done", "total"}
+#   "ranked"    {"reading_order": list[ReadingOrderEntry]}
+# jobs.triage_dir adds "materializing" {} once the run is done and the pdfs are being moved
+EventFn = Callable[[str, dict], None]
+
+
 @dataclass
 class TriageDeps:
-    paper_texts: dict[str, str]  # fname -> text
+    # fname -> text (possibly only the first pages). a view into a TextStore for big inboxes
+    paper_texts: MutableMapping[str, str]
+    inbox_dir: str | None = None  # where to pull more pages from on demand
+    sections: dict[str, dict] = field(default_factory=dict)  # fname -> outline, see sections.py
 
 
 def _pick_model():
     """
     model priority:
+      0. TRIAGE_BACKENDS -> router over several backends, see router.py
       1. LMSTUDIO_URL  -> local LM Studio (openai-compat)
       2. TRIAGE_MODEL starting with "bedrock:" -> AWS Bedrock
       3. TRIAGE_MODEL with any other pydantic-ai string -> whatever provider that is
       4. default -> anthropic claude sonnet
     """
+    if os.environ.get("TRIAGE_BACKENDS"):
+        from agent import router
+
+        return router.from_env()
+
     # local LM Studio
     lm_url = os.environ.get("LMSTUDIO_URL")
     if lm_url:
+        from pydantic_ai.models.openai import OpenAIModel
+        from pydantic_ai.providers.openai import OpenAIProvider
+
         name = os.environ.get("LMSTUDIO_MODEL", "loaded-model")
         return OpenAIModel(name, provider=OpenAIProvider(base_url=lm_url))
 
@@ -64,74 +123,560 @@ def _pick_model():
     return "anthropic:claude-sonnet-4-20250514"
 
 
-triage_agent = Agent(
-    _pick_model(),
-    deps_type=TriageDeps,
-    output_type=TriageResult,
-    instructions=SYSTEM_MSG,
-)
+# pydantic-ai + the provider sdks are most of a cold start, so the model and
+# the agents are built on first use (or by prewarm()) rather than at import.
+# triage.triage_agent etc. still work, see __getattr__ at the bottom
+_model = None
+_agents: dict[str, Agent] = {}
+_agents_lock = threading.Lock()
+
+
+def _build_agents() -> dict[str, Agent]:
+    global _model, RunContext
+    # the tools' RunContext annotations get resolved against this module
+    from pydantic_ai import Agent, RunContext
+
+    _model = _pick_model()
+    return {
+        "triage_agent": Agent(
+            _model,
+            name="triage",
+            deps_type=TriageDeps,
+            output_type=TriageDraft,
+            instructions=SYSTEM_MSG,
+            tools=[get_paper_list, read_paper, list_sections, read_section],
+        ),
+        # mapreduce mode: no tools, the paper text goes straight into the prompt
+        "paper_agent": Agent(_model, name="paper", output_type=PaperAnalysis,
+                             instructions=SYSTEM_MSG + PAPER_MSG),
+        "ranking_agent": Agent(_model, name="ranking", output_type=list[ReadingOrderEntry],
+                               instructions=SYSTEM_MSG + RANKING_MSG),
+    }
+
+
+def _agent(name: str) -> Agent:
+    if not _agents:
+        with _agents_lock:
+            if not _agents:
+                _agents.update(_build_agents())
+    return _agents[name]
+
+
+def get_triage_agent() -> Agent:
+    return _agent("triage_agent")
+
+
+def get_paper_agent() -> Agent:
+    return _agent("paper_agent")
+
+
+def get_ranking_agent() -> Agent:
+    return _agent("ranking_agent")
+
+
+def prewarm():
+    """do the slow imports + client setup now instead of on the first request"""
+    try:
+        with metrics.span("prewarm"):
+            _agent("triage_agent")
+            import fitz  # noqa: F401
+    except Exception:
+        # bad model config etc. — the first real request will raise it properly
+        log.exception("prewarm failed")
+
+
+def _model_key() -> str:
+    """stable string for whatever _pick_model() gave us, for cache keys"""
+    _agent("triage_agent")
+    if isinstance(_model, str):
+        return _model
+    return f"{_model.system}:{_model.model_name}"
+
 
-@triage_agent.tool
 def get_paper_list(ctx: RunContext[TriageDeps]) -> list[str]:
     """list all available paper filenames"""
-    return list(ctx.deps.paper_texts.keys())
+    with metrics.span("tool.get_paper_list"):
+        return list(ctx.deps.paper_texts.keys())
+
+def _ensure_text(deps: TriageDeps, filename: str, upto: int) -> str | None:
+    """paper text, re-extracting further into the pdf if we stopped short of upto"""
+    t = deps.paper_texts.get(filename)
+    if t is None or not has_more(t) or len(strip_more(t)) >= upto or not deps.inbox_dir:
+        return t
+    # only pay for the extra pages when someone actually reads past the budget.
+    # the prefix comes out the same, so earlier section offsets stay valid
+    t, index = extract_indexed(os.path.join(deps.inbox_dir, filename), max_chars=upto)
+    deps.paper_texts[filename] = t
+    if index is not None:
+        deps.sections[filename] = index
+    return t
+
+
+def _continue_hint(t: str, end: int) -> str:
+    return f"\n[truncated, continue at offset={end}]" if has_more(t) or end < len(strip_more(t)) else ""
+
 
-@triage_agent.tool
-def read_paper(ctx: RunContext[TriageDeps], filename: str) -> str:
-    """return paper text, truncated to fit context window"""
-    t = ctx.deps.paper_texts.get(filename)
+def read_paper(ctx: RunContext[TriageDeps], filename: str, offset: int = 0,
+               length: int | None = None) -> str:
+    """return paper text from offset, at most length chars (capped to fit the
+    context window). call again with a larger offset to keep reading; for one
+    part of a paper, list_sections + read_section is cheaper"""
+    offset = max(offset, 0)
+    size = min(length, PAPER_TEXT_CAP) if length and length > 0 else PAPER_TEXT_CAP
+    with metrics.span("tool.read_paper", file=filename, offset=offset):
+        t = _ensure_text(ctx.deps, filename, offset + size)
     if t is None:
         return f"not found: {filename}"
-    if len(t) > PAPER_TEXT_CAP:
-        return t[:PAPER_TEXT_CAP] + "\n[truncated]"
-    return t
+    chunk = strip_more(t)[offset:offset + size]
+    return chunk + _continue_hint(t, offset + len(chunk))
+
+
+def list_sections(ctx: RunContext[TriageDeps], filename: str) -> str:
+    """outline of a paper: title plus section headings with their char offsets"""
+    with metrics.span("tool.list_sections", file=filename):
+        t = ctx.deps.paper_texts.get(filename)
+        if t is None:
+            return f"not found: {filename}"
+        return outline(ctx.deps.sections.get(filename), len(strip_more(t)), has_more(t))
+
+
+def read_section(ctx: RunContext[TriageDeps], filename: str, section: str) -> str:
+    """text of one section by heading, e.g. "abstract", "introduction",
+    "3 Method", "conclusion". see list_sections for what a paper has"""
+    deps = ctx.deps
+    with metrics.span("tool.read_section", file=filename):
+        t = deps.paper_texts.get(filename)
+        if t is None:
+            return f"not found: {filename}"
+        bounds = find_section(deps.sections.get(filename), section)
+        if bounds is None and has_more(t):
+            # probably past the upfront budget (conclusion, references...)
+            t = _ensure_text(deps, filename, 1 << 62)
+            bounds = find_section(deps.sections.get(filename), section)
+        if bounds is None:
+            return (f"no section like {section!r} in {filename}\n"
+                    + outline(deps.sections.get(filename), len(strip_more(t)), has_more(t)))
+        start, end = bounds
+        want = start + PAPER_TEXT_CAP if end is None else min(end, start + PAPER_TEXT_CAP)
+        t = _ensure_text(deps, filename, want)
+        if end is None:
+            # the last heading we knew of, pulling more pages may have found the next one
+            start, end = find_section(deps.sections.get(filename), section) or (start, end)
+    body = strip_more(t)
+    stop = min(start + PAPER_TEXT_CAP, len(body) if end is None else end, len(body))
+    chunk = body[start:stop]
+    return chunk if stop == end else chunk + _continue_hint(t, stop)
+
+
+async def run_triage(inbox_dir: str, mode: str | None = None,
+                     on_event: EventFn | None = None,
+                     files: list[str] | None = None,
+                     digests: dict[str, str] | None = None) -> TriageResult:
+    """files restricts the run to those inbox entries instead of everything.
+    pass a dict as digests to get each pdf's content hash filled in (the
+    result store wants them), they're computed during the scan anyway"""
+    emit = on_event or (lambda kind, data: None)
+    # hashed once, in the scan: the extraction cache, the analysis memo and
+    # the caller's result store all key on the same digest
+    if digests is None and analysis_cache.get_cache() is not None:
+        digests = {}
+
+    # extraction is blocking (and possibly a process pool), keep it off the event loop
+    total = sum(1 for f in (os.listdir(inbox_dir) if files is None else files)
+                if f.lower().endswith(".pdf"))
+    n_done = 0
+
+    def on_file(fname):
+        nonlocal n_done
+        n_done += 1
+        emit("extracted", {"filename": fname, "done": n_done, "total": total})
+
+    # big inboxes keep their text on disk, only handles and outlines stay in memory
+    store = TextStore() if total > SPILL_PAPERS else None
+    papers = store if store is not None else {}
+    outlines, failed = {}, set()
+
+    def scan():
+        for fname, text, index in iter_inbox(inbox_dir, on_file=on_file, files=files, digests=digests):
+            papers[fname] = text
+            if index is not None:
+                outlines[fname] = index
+            if extract_failed(text):
+                failed.add(fname)
 
+    try:
+        with metrics.span("scan_inbox"):
+            await asyncio.to_thread(scan)
+        if not papers:
+            raise ValueError(f"no pdfs in {inbox_dir}")
+        if store is None:
+            papers = {f: papers[f] for f in sorted(papers)}  # cache hits came out first
+        return await _triage_papers(papers, outlines, failed, inbox_dir, mode or TRIAGE_MODE, emit,
+                                    digests or {})
+    finally:
+        if store is not None:
+            store.close()
 
-async def run_triage(inbox_dir: str) -> TriageResult:
-    papers = scan_inbox(inbox_dir)
-    if not papers:
-        raise ValueError(f"no pdfs in {inbox_dir}")
 
-    deps = TriageDeps(paper_texts=papers)
+async def _triage_papers(papers, outlines: dict[str, dict], failed: set[str],
+                         inbox_dir: str, mode: str, emit: EventFn,
+                         digests: dict[str, str]) -> TriageResult:
+    """everything after extraction. papers is a dict or a TextStore, texts
+    are only pulled out one paper (or one preview) at a time. digests are
+    the content hashes from the scan"""
+    names = list(papers)
 
-    # feed previews upfront so the agent doesn't have to tool-call each one individually
-    # just enough to get the title + start of abstract
-    msg = f"Triage these {len(papers)} papers:\n\n"
-    for fname, txt in papers.items():
-        chunk = txt[:PREVIEW_CHARS] if len(txt) > PREVIEW_CHARS else txt
-        msg += f"--- {fname} ---\n{chunk}\n\n"
-    msg += "Classify all and produce the reading order."
+    # near-copies of another paper in this inbox borrow its analysis
+    dups = await asyncio.to_thread(_dedup, papers, [f for f in names if f not in failed])
+    if dups:
+        emit("deduplicated", {"clusters": dedup.clusters(dups)})
+    reps = [f for f in names if f not in dups]
 
-    bar = tqdm(total=len(papers), desc="Triaging papers", unit="paper")
-    res = await triage_agent.run(msg, deps=deps)
-    bar.update(len(papers))
-    bar.close()
+    # papers we've already analysed with this model + prompt skip the llm entirely
+    memo = analysis_cache.get_cache()
+    keys, cached = {}, {}
+    if memo is not None:
+        prompt = SYSTEM_MSG + (PAPER_MSG if mode == "mapreduce" else "")
+        keys = {f: analysis_cache.analysis_key(digests[f], _model_key(), prompt) for f in reps if f in digests}
+        hits = memo.get_many(keys.values())
+        cached = {f: hits[k].model_copy(update={"filename": f}) for f, k in keys.items() if k in hits}
+    todo = subset(papers, [f for f in reps if f not in cached])
+
+    # obvious off-topic stuff gets decided locally (no-op unless PREFILTER_LABELS is set)
+    skipped = await asyncio.to_thread(_prefilter, todo, [f for f in todo if f not in failed])
+    if prefilter.get_filter() is not None:
+        emit("prefiltered", _note_prefilter(skipped, todo, mode))
+    todo = subset(papers, [f for f in todo if f not in skipped])
+
+    known = {**cached, **skipped}
+    for i, p in enumerate(known.values(), 1):
+        emit("analysis", {"paper": p, "cached": p.filename in cached, "done": i, "total": len(names)})
+
+    order = None
+    if not todo:
+        fresh = []
+    elif mode == "mapreduce":
+        fresh = await _analyse_all(todo, emit, offset=len(known), total=len(names))
+    else:
+        res = await _run_single(todo, inbox_dir, outlines)
+        fresh = res.papers
+        for i, p in enumerate(fresh, len(known) + 1):
+            emit("analysis", {"paper": p, "cached": False, "done": i, "total": len(names)})
+        # prefiltered papers are bullshit, they don't change the must-read order
+        if not cached:
+            order = res.reading_order
+
+    if memo is not None:
+        memo.put_many({keys[p.filename]: p for p in fresh
+                       if p.filename in keys and p.filename not in failed})
+
+    by_name = {**known, **{p.filename: p for p in fresh}}
+    done = len(by_name)
+    for f, rep in dups.items():
+        if rep in by_name:
+            by_name[f] = ReportedPaper.model_validate({**by_name[rep].model_dump(), "filename": f,
+                                                       "duplicate_of": rep})
+            done += 1
+            emit("analysis", {"paper": by_name[f], "cached": False, "done": done, "total": len(names)})
+    merged = [by_name[f] for f in names if f in by_name]
+    # anything the single-run agent invented that isn't in the inbox stays, as before
+    inbox = set(names)
+    merged += [p for p in fresh if p.filename not in inbox]
+    if order is None:
+        # cached + fresh analyses need ranking together. a duplicate would
+        # just be ranked right next to its original
+        order = await rank_papers([p for p in merged if p.filename not in dups])
+    emit("ranked", {"reading_order": order})
+    return TriageResult(papers=merged, reading_order=order)
+
+
+def _dedup(papers, names: list[str]) -> dict[str, str]:
+    """dedup.find_duplicates on the head of each text -> {duplicate: representative}"""
+    if not dedup.TRIAGE_DEDUP or len(names) < 2:
+        return {}
+    dups = dedup.find_duplicates({f: strip_more(head(papers, f, dedup.DEDUP_CHARS)) for f in names})
+    if dups:
+        metrics.inc("triage_dedup_papers_total", len(dups))
+    return dups
+
+
+def _prefilter(papers, names: list[str]) -> dict[str, PaperAnalysis]:
+    """prefilter.prefilter in chunks, on just the head of each text it scores"""
+    if prefilter.get_filter() is None:
+        return {}
+    out = {}
+    for i in range(0, len(names), 256):
+        chunk = {f: strip_more(head(papers, f, prefilter.SCORE_CHARS)) for f in names[i:i + 256]}
+        out.update(prefilter.prefilter(chunk))
+    if out and len(out) == len(names):
+        # a whole inbox of off-topic papers is more likely a bad label file.
+        # nothing gets skipped then, the model has the final say
+        log.warning("prefilter would skip all %d papers, sending them to the model anyway", len(names))
+        return {}
+    return out
+
+
+def _note_prefilter(skipped: dict[str, PaperAnalysis], todo: Mapping[str, str], mode: str):
+    """count what the pre-filter saved us: in mapreduce one call + its paper
+    text per skipped paper, in single mode just the preview (and the whole
+    call if nothing is left)"""
+    if mode == "mapreduce":
+        calls = len(skipped)
+        tokens = sum(estimate_tokens(strip_more(todo[f])[:PAPER_TEXT_CAP]) for f in skipped)
+    else:
+        calls = int(len(skipped) == len(todo))
+        tokens = sum(estimate_tokens(strip_more(todo[f])[:MAX_PREVIEW_CHARS]) for f in skipped)
+    for k, v in (("papers_seen", len(todo)), ("papers_skipped", len(skipped)),
+                 ("calls_saved", calls), ("tokens_saved", tokens)):
+        prefilter.STATS[k] += v
+        metrics.inc(f"triage_prefilter_{k}_total", v)
+    log.info("prefilter: %d/%d papers off-topic, ~%d calls / ~%d tokens saved",
+             len(skipped), len(todo), calls, tokens)
+    return {"skipped": sorted(skipped), "calls_saved": calls, "tokens_saved": tokens}
+
+
+async def _run_single(papers: Mapping[str, str], inbox_dir: str,
+                      outlines: dict[str, dict] | None = None) -> TriageResult:
+    # feed previews upfront so the agent doesn't have to tool-call each one individually.
+    # the packer sizes them to the backend's budget and splits the inbox if it won't fit
+    texts = {f: strip_more(head(papers, f, PREVIEW_SOURCE_CHARS)) for f in papers}
+    batches = pack_previews(texts, min_chars=PREVIEW_CHARS, overhead=SYSTEM_MSG)
+    del texts
+
+    from tqdm import tqdm
+
+    bar = tqdm(total=len(papers), desc="Triaging papers", unit="paper", disable=None)
+    sem = asyncio.Semaphore(TRIAGE_CONCURRENCY)
+
+    async def one(previews):
+        got, order, todo = [], None, dict(previews)
+        problems: dict[str, str] = {}
+        for attempt in range(TRIAGE_OUTPUT_RETRIES + 1):
+            deps = TriageDeps(paper_texts=subset(papers, todo), inbox_dir=inbox_dir,
+                              sections={f: outlines[f] for f in todo if f in (outlines or {})})
+            prompt = build_message(todo) if attempt == 0 else _retry_message(todo, problems)
+            async with sem:
+                res = await _run_agent(get_triage_agent(), prompt, deps=deps)
+            ok, ok_order, problems = _salvage(res.output, todo)
+            if attempt > 0:
+                # a retry may repeat papers it wasn't asked about, what we already took stands
+                ok = [p for p in ok if p.filename in todo]
+            got += ok
+            if attempt == 0:
+                order = ok_order
+            todo = {f: todo[f] for f in problems}
+            if not todo:
+                break
+            if attempt < TRIAGE_OUTPUT_RETRIES:
+                metrics.inc("triage_output_retries_total")
+        if todo:
+            metrics.inc("triage_output_unresolved_papers_total", len(todo))
+            log.warning("no valid analysis for %d papers after %d retries, leaving them in the inbox: %s",
+                        len(todo), TRIAGE_OUTPUT_RETRIES, ", ".join(sorted(todo)))
+        bar.update(len(previews))
+        # the first answer only ranked what it got right
+        return got, (order if attempt == 0 and not todo else None)
+
+    try:
+        outs = await asyncio.gather(*(one(b) for b in batches))
+    finally:
+        bar.close()
+
+    if len(outs) == 1 and outs[0][1] is not None:
+        return TriageResult(papers=outs[0][0], reading_order=outs[0][1])
+    # each batch (or retry) only ranked its own papers, do one pass over all of them
+    analyses = [p for got, _ in outs for p in got]
+    return TriageResult(papers=analyses, reading_order=await rank_papers(analyses))
+
+
+_MISSING = "missing from your answer"
+
+
+def _salvage(draft: TriageDraft, asked: Mapping[str, str]):
+    """validate the agent's answer entry by entry -> (analyses that validated,
+    their reading order, {asked-for filename: what was wrong with it})"""
+    papers, seen, problems, wasted = [], set(), {}, 0
+    for entry in draft.papers:
+        try:
+            p = PaperAnalysis.model_validate(entry)
+        except ValidationError as exc:
+            err = exc.errors()[0]
+            name = entry.get("filename") if isinstance(entry.get("filename"), str) else None
+            if name in asked:
+                problems[name] = f"{'.'.join(map(str, err['loc']))}: {err['msg']}"
+            wasted += estimate_tokens(json.dumps(entry, default=str))
+            continue
+        if p.filename in seen:
+            continue
+        seen.add(p.filename)
+        # anything invented that isn't in the inbox stays, as before
+        papers.append(p)
+    for f in asked:
+        if f not in seen and f not in problems:
+            problems[f] = _MISSING
+    problems = {f: why for f, why in problems.items() if f not in seen}
+
+    order = []
+    for entry in draft.reading_order:
+        try:
+            order.append(ReadingOrderEntry.model_validate(entry))
+        except ValidationError:
+            wasted += estimate_tokens(json.dumps(entry, default=str))
+
+    if problems:
+        for why in problems.values():
+            metrics.inc("triage_output_invalid_papers_total", reason="missing" if why == _MISSING else "invalid")
+        metrics.inc("triage_output_salvaged_papers_total", len(papers))
+    if wasted:
+        metrics.inc("triage_output_wasted_tokens_total", wasted)
+    return papers, order, problems
+
+
+def _retry_message(todo: Mapping[str, str], problems: dict[str, str]) -> str:
+    """ask again for just the papers the last answer got wrong"""
+    notes = "".join(f"- {f}: {problems[f]}\n" for f in todo)
+    return (f"Your previous answer had problems with these papers, the others are done:\n{notes}\n"
+            + build_message(todo))
+
+
+async def _run_agent(agent: Agent, prompt: str, **kwargs):
+    """every model run takes a slot from the shared budget, fairly between tenants"""
+    async with scheduler.llm_slot():
+        return await metrics.run_agent(agent, prompt, **kwargs)
+
+
+async def analyse_paper(fname: str, text: str) -> PaperAnalysis:
+    """map step: classify a single paper"""
+    chunk = strip_more(text)[:PAPER_TEXT_CAP]
+    res = await _run_agent(get_paper_agent(), f"--- {fname} ---\n{chunk}")
+    # the model sometimes mangles the filename, we know the real one
+    return res.output.model_copy(update={"filename": fname})
+
+
+async def rank_papers(papers: list[PaperAnalysis]) -> list[ReadingOrderEntry]:
+    """reduce step: one call over the compact analyses -> reading order"""
+    must = [p for p in papers if p.classification == "must-read"]
+    if not must:
+        return []
+    lines = [
+        f"{p.filename} | {p.classification} | {p.relevance_score:.2f} | {p.title} | {p.key_contribution}"
+        for p in papers
+    ]
+    res = await _run_agent(get_ranking_agent(), "\n".join(lines))
+
+    # drop anything that isn't a real must-read and renumber
+    known = {p.filename for p in must}
+    order, seen = [], set()
+    for e in res.output:
+        if e.filename in known and e.filename not in seen:
+            seen.add(e.filename)
+            order.append(e)
+    # a must-read the ranker forgot still belongs in the list, at the end by score
+    for p in sorted(must, key=lambda p: -p.relevance_score):
+        if p.filename not in seen:
+            order.append(ReadingOrderEntry(rank=0, filename=p.filename, justification=p.key_contribution))
+    return [e.model_copy(update={"rank": i}) for i, e in enumerate(order, 1)]
+
+
+async def _analyse_all(papers: Mapping[str, str], emit: EventFn | None = None,
+                       offset: int = 0, total: int | None = None) -> list[PaperAnalysis]:
+    """map step over the whole dict (or store), at most TRIAGE_CONCURRENCY
+    calls in flight. a text is only read once its call gets a slot"""
+    from tqdm import tqdm
+
+    sem = asyncio.Semaphore(TRIAGE_CONCURRENCY)
+    bar = tqdm(total=len(papers), desc="Triaging papers", unit="paper", disable=None)
+    done = offset
+
+    async def one(fname):
+        nonlocal done
+        async with sem:
+            out = await analyse_paper(fname, papers[fname])
+        bar.update(1)
+        done += 1
+        if emit is not None:
+            emit("analysis", {"paper": out, "cached": False, "done": done,
+                              "total": total or len(papers)})
+        return out
+
+    try:
+        return list(await asyncio.gather(*(one(f) for f in papers)))
+    finally:
+        bar.close()
+
+
+def _read_previous(base_dir: str) -> tuple[list[ReportedPaper], list[ReadingOrderEntry]]:
+    """whatever an earlier run left in triage_report.json / reading_order.txt"""
+    papers, order = [], []
+    try:
+        with open(os.path.join(base_dir, "triage_report.json")) as fh:
+            raw = json.load(fh)
+    except (OSError, json.JSONDecodeError):
+        raw = []
+    for entry in raw if isinstance(raw, list) else []:
+        try:
+            papers.append(ReportedPaper.model_validate(entry))
+        except ValueError:
+            pass  # hand-edited or from an older schema, drop it
+
+    try:
+        with open(os.path.join(base_dir, "reading_order.txt")) as fh:
+            lines = [ln.strip() for ln in fh if ln.strip()]
+    except OSError:
+        lines = []
+    for ln in lines:
+        # "1. foo.pdf | some reason"
+        try:
+            rank, rest = ln.split(".", 1)
+            name, _, why = rest.partition("|")
+            order.append(ReadingOrderEntry(rank=int(rank), filename=name.strip(), justification=why.strip()))
+        except ValueError:
+            pass
+    return papers, order
+
+
+def _still_there(base_dir: str, p: PaperAnalysis) -> bool:
+    return any(os.path.exists(os.path.join(base_dir, sub, p.filename)) for sub in (p.classification, "inbox"))
+
+
+def merge_with_previous(result: TriageResult, base_dir: str) -> TriageResult:
+    """fold a partial run (a watcher batch) into the outputs already on disk.
+
+    new analyses replace old ones for the same filename, and old ones whose
+    pdf is gone (deleted from its bucket folder and not back in the inbox)
+    drop out. the two reading orders get merged by relevance, keeping each
+    one's internal order — we never re-rank papers that were already ranked.
+    """
+    old_papers, old_order = _read_previous(base_dir)
+    fresh = {p.filename for p in result.papers}
+    gone = {p.filename for p in old_papers if p.filename not in fresh and not _still_there(base_dir, p)}
+    papers = [p for p in old_papers if p.filename not in fresh | gone] + list(result.papers)
 
-    return res.output
+    score = {p.filename: p.relevance_score for p in papers}
+    a = [e for e in old_order if e.filename not in fresh | gone]
+    b = list(result.reading_order)
+    merged = []
+    while a and b:
+        take_b = score.get(b[0].filename, 0.0) > score.get(a[0].filename, 0.0)
+        merged.append((b if take_b else a).pop(0))
+    merged += a + b
+    order = [e.model_copy(update={"rank": i}) for i, e in enumerate(merged, 1)]
+    return TriageResult(papers=papers, reading_order=order)
 
 
-def materialize_results(result: TriageResult, base_dir: str):
-    """move pdfs to their folders + dump output files"""
-    inbox = os.path.join(base_dir, "inbox")
+def materialize_results(result: TriageResult, base_dir: str, merge: bool = False):
+    """move pdfs to their folders + dump output files, crash-safe (see materialize.py).
+    merge=True keeps what earlier runs wrote, see merge_with_previous"""
+    with metrics.span("materialize", n_papers=len(result.papers)):
+        _materialize(result, base_dir, merge)
 
-    dst_dirs = {}
-    for bucket in ("must-read", "nice-to-read", "bullshit"):
-        d = os.path.join(base_dir, bucket)
-        os.makedirs(d, exist_ok=True)
-        dst_dirs[bucket] = d
 
-    for p in result.papers:
-        src = os.path.join(inbox, p.filename)
-        target = dst_dirs.get(p.classification)
-        if target and os.path.exists(src):
-            shutil.move(src, os.path.join(target, p.filename))
+def _materialize(result: TriageResult, base_dir: str, merge: bool):
+    # the merge reads the previous outputs, it has to happen under commit's lock
+    materialize.commit(result, base_dir, merge=merge_with_previous if merge else None)
 
-    # write reading order
-    with open(os.path.join(base_dir, "reading_order.txt"), "w") as fh:
-        for e in result.reading_order:
-            fh.write(f"{e.rank}. {e.filename} | {e.justification}\n")
 
-    # dump full report
-    report_data = [p.model_dump() for p in result.papers]
-    with open(os.path.join(base_dir, "triage_report.json"), "w") as fh:
-        json.dump(report_data, fh, indent=2)
+def __getattr__(name):
+    if name in ("triage_agent", "paper_agent", "ranking_agent"):
+        return _agent(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,105 @@
+"""
+Long-running inbox watcher.
+
+Instead of re-triaging the whole inbox on a timer, this watches inbox/ and
+only triages PDFs that showed up since the last batch, then folds them
+into the existing reading_order.txt / triage_report.json.
+
+Uses watchfiles (inotify on linux, ships with uvicorn[standard]) to wake
+up when something changes, and falls back to plain polling without it.
+A file is only picked up once its size + mtime have held still for one
+debounce window, so half-downloaded PDFs aren't read, and everything that
+lands within a window goes out as one micro-batch.
+
+    python -m agent.watcher [papers_dir]
+"""
+import asyncio
+import logging
+import os
+import sys
+
+from agent import materialize
+from agent.jobs import triage_dir
+
+try:
+    from watchfiles import awatch
+except ImportError:  # polling it is
+    awatch = None
+
+log = logging.getLogger(__name__)
+
+WATCH_DEBOUNCE = float(os.environ.get("WATCH_DEBOUNCE", "5"))
+WATCH_MAX_BATCH = int(os.environ.get("WATCH_MAX_BATCH", "50"))
+
+
+def _snapshot(inbox):
+    snap = {}
+    for e in os.scandir(inbox):
+        if e.is_file() and e.name.lower().endswith(".pdf"):
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue  # moved away between scandir and stat
+            snap[e.name] = (st.st_size, st.st_mtime_ns)
+    return snap
+
+
+async def _watch_fs(inbox, changed: asyncio.Event):
+    async for _ in awatch(inbox):
+        changed.set()
+
+
+async def watch_inbox(papers_dir, debounce=WATCH_DEBOUNCE, max_batch=WATCH_MAX_BATCH):
+    inbox = os.path.join(papers_dir, "inbox")
+    os.makedirs(inbox, exist_ok=True)
+    materialize.recover(papers_dir)  # before the first snapshot, it may move files
+
+    changed = asyncio.Event()
+    fs_task = asyncio.create_task(_watch_fs(inbox, changed)) if awatch else None
+    log.info("watching %s (%s)", inbox, "inotify" if awatch else "polling")
+
+    prev = {}
+    # (name, stat) we already tried. if the model skipped a paper or the
+    # batch blew up we don't hammer it every window — only if the file changes
+    tried = set()
+    try:
+        while True:
+            snap = _snapshot(inbox)
+            ready = sorted(f for f, st in snap.items() if prev.get(f) == st and (f, st) not in tried)
+            for i in range(0, len(ready), max_batch):
+                batch = ready[i:i + max_batch]
+                tried.update((f, snap[f]) for f in batch)
+                log.info("triaging %d new paper(s)", len(batch))
+                try:
+                    await triage_dir(papers_dir, files=batch)
+                except Exception:
+                    log.exception("batch failed: %s", batch)
+            if ready:
+                snap = _snapshot(inbox)
+            tried &= {(f, st) for f, st in snap.items()}
+            prev = snap
+
+            # inotify wakes us early, but a file still has to sit still for
+            # one full window before we trust it
+            changed.clear()
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=debounce)
+                await asyncio.sleep(debounce)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if fs_task is not None:
+            fs_task.cancel()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    papers_dir = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("PAPERS_DIR", "/papers")
+    try:
+        asyncio.run(watch_inbox(papers_dir))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+End-to-end throughput benchmark against the offline stub model.
+
+Generates a synthetic inbox with PyMuPDF, then times scan_inbox,
+run_triage, materialize_results and the /triage endpoint with a
+deterministic stub LLM (configurable injected latency). Prints one JSON
+blob per run; save them and diff across commits with --compare.
+
+    uv run python benchmarks/bench_triage.py --papers 200 --latency 0.05
+    uv run python benchmarks/bench_triage.py --papers 200 --out new.json --compare old.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import analysis_cache, dedup, extract_cache, result_store, triage  # noqa: E402
+from agent.pdf_utils import scan_inbox  # noqa: E402
+from agent.stub_model import StubModel  # noqa: E402
+from agent.synthetic import make_inbox  # noqa: E402
+
+
+def _pct(xs, q):
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))]
+
+
+def _peak_rss_mb():
+    # linux reports kilobytes. children = the extraction pool
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    kids_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(self_kb, kids_kb) / 1024, 1)
+
+
+def _git_rev():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, cwd=os.path.dirname(__file__) or ".")
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+@contextmanager
+def _patched(*settings):
+    """(obj, attr, value), ... set for the duration of the block, then put back"""
+    saved = [(obj, attr, getattr(obj, attr)) for obj, attr, _ in settings]
+    for obj, attr, value in settings:
+        setattr(obj, attr, value)
+    try:
+        yield
+    finally:
+        for obj, attr, value in reversed(saved):
+            setattr(obj, attr, value)
+
+
+def run_bench(n_papers=50, latency=0.0, mode="mapreduce", repeat=3, workers=None,
+              min_pages=1, max_pages=12, seed=0):
+    stub = StubModel(latency=latency)
+    agents = (triage.triage_agent, triage.paper_agent, triage.ranking_agent)
+    # the endpoint doesn't take a mode, it reads the module default. caches would
+    # turn every run after the first into a no-op, the synthetic papers of one topic
+    # are near-identical so dedup would fold them up, and benchmark runs aren't
+    # history worth keeping. all of it only for the run, importing this changes nothing
+    with _patched((triage, "TRIAGE_MODE", mode), (dedup, "TRIAGE_DEDUP", False),
+                  (extract_cache, "_cache", None), (extract_cache, "_disabled", True),
+                  (analysis_cache, "_cache", None), (analysis_cache, "_disabled", True),
+                  (result_store, "_store", None), (result_store, "_disabled", True)):
+        return _run(stub, agents, n_papers, latency, mode, repeat, workers, min_pages, max_pages, seed)
+
+
+def _run(stub, agents, n_papers, latency, mode, repeat, workers, min_pages, max_pages, seed):
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src")
+        make_inbox(src, n_papers, min_pages, max_pages, seed)
+
+        def fresh_dir(name):
+            base = os.path.join(tmp, name)
+            shutil.copytree(src, os.path.join(base, "inbox"))
+            return base
+
+        stages = {}
+        t = time.perf_counter()
+        scan_inbox(src, workers=workers)
+        stages["scan_inbox"] = time.perf_counter() - t
+
+        with agents[0].override(model=stub), agents[1].override(model=stub), agents[2].override(model=stub):
+            base = fresh_dir("direct")
+            t = time.perf_counter()
+            result = asyncio.run(triage.run_triage(os.path.join(base, "inbox"), mode=mode))
+            stages["run_triage"] = time.perf_counter() - t
+
+            t = time.perf_counter()
+            triage.materialize_results(result, base)
+            stages["materialize_results"] = time.perf_counter() - t
+
+            # endpoint, repeated for a latency distribution
+            from fastapi.testclient import TestClient
+            from agent.app import app
+
+            endpoint = []
+            with TestClient(app) as client:
+                for r in range(repeat):
+                    base = fresh_dir(f"endpoint{r}")
+                    t = time.perf_counter()
+                    resp = client.post("/triage", json={"papers_dir": base})
+                    endpoint.append(time.perf_counter() - t)
+                    resp.raise_for_status()
+
+    total = stages["run_triage"]
+    return {
+        "commit": _git_rev(),
+        "config": {"papers": n_papers, "latency": latency, "mode": mode, "repeat": repeat,
+                   "workers": workers, "pages": [min_pages, max_pages], "seed": seed},
+        "papers_per_sec": round(n_papers / total, 2) if total else None,
+        "endpoint_latency_s": {"p50": round(_pct(endpoint, 0.5), 4), "p95": round(_pct(endpoint, 0.95), 4),
+                               "mean": round(statistics.fmean(endpoint), 4)},
+        "model_request_s": {"n": len(stub.request_times),
+                            "p50": round(_pct(stub.request_times, 0.5), 4),
+                            "p95": round(_pct(stub.request_times, 0.95), 4)},
+        "stages_s": {k: round(v, 4) for k, v in stages.items()},
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def compare(new, old):
+    """relative change for the headline numbers, + is better for throughput"""
+    def rel(a, b):
+        return round((a - b) / b * 100, 1) if b else None
+    out = {"papers_per_sec_%": rel(new["papers_per_sec"], old["papers_per_sec"]),
+           "peak_rss_mb_%": rel(new["peak_rss_mb"], old["peak_rss_mb"])}
+    for k in ("p50", "p95"):
+        out[f"endpoint_{k}_%"] = rel(new["endpoint_latency_s"][k], old["endpoint_latency_s"][k])
+    for k, v in new["stages_s"].items():
+        if k in old["stages_s"]:
+            out[f"{k}_%"] = rel(v, old["stages_s"][k])
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--papers", type=int, default=50)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds per stub model request")
+    ap.add_argument("--mode", default="mapreduce", choices=("single", "mapreduce"))
+    ap.add_argument("--repeat", type=int, default=3, help="endpoint runs for p50/p95")
+    ap.add_argument("--workers", type=int, default=None, help="extraction processes")
+    ap.add_argument("--min-pages", type=int, default=1)
+    ap.add_argument("--max-pages", type=int, default=12)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="also write the result json here")
+    ap.add_argument("--compare", help="earlier result json to diff against")
+    args = ap.parse_args(argv)
+
+    res = run_bench(args.papers, args.latency, args.mode, args.repeat, args.workers,
+                    args.min_pages, args.max_pages, args.seed)
+    if args.compare:
+        with open(args.compare) as fh:
+            res["vs_baseline"] = compare(res, json.load(fh))
+    text = json.dumps(res, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
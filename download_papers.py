@@ -4,6 +4,14 @@ Usage:
     uv run python download_papers.py
     uv run python download_papers.py --inbox /tmp/papers/inbox
     uv run python download_papers.py papers.json --inbox /tmp/papers/inbox
+    uv run python download_papers.py --workers 8
+
+Downloads run on a small thread pool. Each host gets a token bucket, and
+arxiv is held to one request every 3 s. Connections are kept alive per
+thread. Bodies stream to <name>.pdf.part, are checked for %PDF in the first
+bytes, and are renamed into place once complete. An interrupted download
+resumes with a Range request, and transient failures (timeouts, resets,
+429/5xx) are retried with exponential backoff.
 
 Category-to-classification mapping:
     "AI and RL (2026)"  -> must-read
@@ -11,14 +19,26 @@ Category-to-classification mapping:
     everything else     -> bullshit
 """
 
+import http.client
 import json
+import random
 import re
 import sys
 import os
+import threading
 import time
-import urllib.request
-import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES", "4"))
+DOWNLOAD_BACKOFF = float(os.environ.get("DOWNLOAD_BACKOFF", "2"))  # seconds, doubles per retry
+# requests/second per host. arxiv asks for one every 3 s
+HOST_RATES = {"arxiv.org": 1 / 3}
+DEFAULT_RATE = float(os.environ.get("DOWNLOAD_RATE", "5"))
+CHUNK = 64 * 1024
+USER_AGENT = "Mozilla/5.0"
 
 CATEGORY_MAP = {
     "AI and RL (2026)": {
@@ -64,19 +84,182 @@ def url_to_filename(url: str, title: str) -> str:
     return f"{slug}.pdf"
 
 
-def download(url: str, dest: Path, timeout: int = 60) -> bool:
-    req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+class TokenBucket:
+    """blocking token bucket: `rate` tokens/s, at most `burst` saved up"""
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate, self.burst = rate, burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket(host: str) -> TokenBucket:
+    with _buckets_lock:
+        if host not in _buckets:
+            rate = next((r for h, r in HOST_RATES.items() if host == h or host.endswith("." + h)),
+                        DEFAULT_RATE)
+            _buckets[host] = TokenBucket(rate)
+        return _buckets[host]
+
+
+# one keep-alive connection per (thread, scheme, host)
+_local = threading.local()
+
+
+def _conn(scheme: str, netloc: str, timeout: float) -> http.client.HTTPConnection:
+    conns = _local.__dict__.setdefault("conns", {})
+    c = conns.get((scheme, netloc))
+    if c is None:
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        c = conns[(scheme, netloc)] = cls(netloc, timeout=timeout)
+    return c
+
+
+def _drop_conn(scheme: str, netloc: str):
+    c = _local.__dict__.get("conns", {}).pop((scheme, netloc), None)
+    if c is not None:
+        c.close()
+
+
+class Retry(Exception):
+    """transient failure, worth another go"""
+
+    def __init__(self, msg, after=None):
+        super().__init__(msg)
+        self.after = after
+
+
+def _get(url: str, offset: int, timeout: float):
+    """GET with redirects over a pooled connection. returns (response, scheme, netloc)"""
+    for _ in range(6):
+        parts = urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        headers = {"User-Agent": USER_AGENT}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        _bucket(parts.hostname or "").acquire()
+        conn = _conn(parts.scheme, parts.netloc, timeout)
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+        except (OSError, http.client.HTTPException):
+            # stale keep-alive connections show up here too
+            _drop_conn(parts.scheme, parts.netloc)
+            raise
+        if resp.status in (301, 302, 303, 307, 308) and resp.getheader("Location"):
+            resp.read()
+            url = urljoin(url, resp.getheader("Location"))
+            continue
+        return resp, parts.scheme, parts.netloc
+    raise http.client.HTTPException(f"too many redirects for {url}")
+
+
+def _fetch(url: str, dest: Path, part: Path, timeout: float) -> bool:
+    """one attempt. True when dest is in place, False if it's not a pdf. raises Retry"""
+    offset = part.stat().st_size if part.exists() else 0
+    if offset:
+        with open(part, "rb") as fh:
+            if not fh.read(4) == b"%PDF":
+                part.unlink()
+                offset = 0
+
+    resp, scheme, netloc = _get(url, offset, timeout)
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            content = resp.read()
-            if not content[:5].startswith(b'%PDF'):
-                print(f"  WARNING: response doesn't look like a PDF ({content[:20]!r})")
+        if resp.status == 416:  # our partial is no good (file changed?) — start over
+            part.unlink(missing_ok=True)
+            raise Retry("range not satisfiable, restarting")
+        if resp.status == 429 or resp.status >= 500:
+            after = resp.getheader("Retry-After")
+            raise Retry(f"HTTP {resp.status}", float(after) if after and after.isdigit() else None)
+        if resp.status not in (200, 206):
+            print(f"  ERROR: HTTP {resp.status} for {url}")
+            return False
+
+        mode = "wb"
+        if resp.status == 206:
+            m = re.match(r"bytes (\d+)-", resp.getheader("Content-Range", ""))
+            if not m or int(m.group(1)) != offset:
+                part.unlink(missing_ok=True)
+                raise Retry("unexpected Content-Range, restarting")
+            mode = "ab"
+
+        head = b""
+        if mode == "wb":
+            # check the magic before anything touches the disk
+            head = resp.read(5)
+            if not head.startswith(b"%PDF"):
+                print(f"  WARNING: response doesn't look like a PDF ({head + resp.read(15)!r})")
+                return False
+        with open(part, mode) as fh:
+            fh.write(head)
+            while chunk := resp.read(CHUNK):
+                fh.write(chunk)
+            if resp.length:  # read(amt) just returns short when the peer hangs up
+                raise http.client.IncompleteRead(b"", resp.length)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(part, dest)
+        return True
+    except (OSError, http.client.HTTPException) as e:
+        # truncated body, reset, timeout — keep the .part and resume next time
+        _drop_conn(scheme, netloc)
+        raise Retry(f"{type(e).__name__}: {e}") from e
+    finally:
+        if not resp.isclosed():
+            # body left unread, the connection can't be reused
+            _drop_conn(scheme, netloc)
+
+
+def download(url: str, dest: Path, timeout: int = 60, retries: int | None = None) -> bool:
+    """stream url to dest via dest.part, resuming and retrying transient errors"""
+    retries = DOWNLOAD_RETRIES if retries is None else retries
+    part = dest.with_name(dest.name + ".part")
+    for attempt in range(retries + 1):
+        try:
+            return _fetch(url, dest, part, timeout)
+        except Retry as e:
+            if attempt == retries:
+                print(f"  ERROR: {e} (gave up after {retries + 1} tries)")
                 return False
-            dest.write_bytes(content)
-            return True
-    except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError) as e:
-        print(f"  ERROR: {e}")
-        return False
+            wait = e.after if e.after is not None else DOWNLOAD_BACKOFF * 2 ** attempt
+            time.sleep(wait * (1 + random.random() * 0.25))
+        except (OSError, http.client.HTTPException) as e:
+            # couldn't even connect/send — same deal
+            if attempt == retries:
+                print(f"  ERROR: {e}")
+                return False
+            time.sleep(DOWNLOAD_BACKOFF * 2 ** attempt * (1 + random.random() * 0.25))
+    return False
+
+
+def download_all(jobs: list[tuple[str, Path]], workers: int | None = None, on_done=None) -> dict[Path, bool]:
+    """download (url, dest) pairs on a thread pool. on_done(url, dest, ok) as each finishes"""
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers or DOWNLOAD_WORKERS) as pool:
+        futs = {pool.submit(download, url, dest): (url, dest) for url, dest in jobs}
+        for fut in as_completed(futs):
+            url, dest = futs[fut]
+            results[dest] = ok = fut.result()
+            if on_done:
+                on_done(url, dest, ok)
+    return results
 
 
 def main():
@@ -89,6 +272,10 @@ def main():
         inbox = Path(sys.argv[idx + 1])
         papers_dir = inbox.parent
 
+    workers = None
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+
     with open(json_path) as f:
         data = json.load(f)
 
@@ -104,12 +291,11 @@ def main():
     must_reads = []
 
     total = len(papers)
-    downloaded = 0
-    failed = 0
     skipped = 0
 
     print(f"Downloading {total} papers into {inbox}\n")
 
+    jobs = []
     for paper in papers:
         url = paper["url"]
         title = paper["title"]
@@ -125,16 +311,7 @@ def main():
             print(f"  {filename} — already exists, skipping")
             skipped += 1
         else:
-            print(f"  [{classification:>12}] {filename}")
-            print(f"               <- {pdf_url}")
-            if download(pdf_url, dest):
-                downloaded += 1
-            else:
-                failed += 1
-
-            # Rate-limit for arxiv
-            if 'arxiv.org' in pdf_url:
-                time.sleep(3)
+            jobs.append((pdf_url, dest))
 
         # Add to ground truth regardless of download success (for format)
         labels[filename] = {
@@ -148,6 +325,15 @@ def main():
         if classification == "must-read":
             must_reads.append(filename)
 
+    def report(pdf_url, dest, ok):
+        cls = labels[dest.name]["classification"]
+        print(f"  [{cls:>12}] {dest.name} {'ok' if ok else 'FAILED'}")
+        print(f"               <- {pdf_url}")
+
+    results = download_all(jobs, workers=workers, on_done=report)
+    downloaded = sum(results.values())
+    failed = len(results) - downloaded
+
     ground_truth = {
         "labels": labels,
         "reference_ranking": must_reads,
@@ -0,0 +1,175 @@
+"""
+Score many rollout directories in one go.
+
+Same numbers as judge.py, but the ground truth is loaded and tokenized
+once per worker instead of once per rollout, each triage_report.json is
+parsed once instead of twice, and classification does one scandir per
+bucket instead of a stat per ground-truth file. Keyword overlap and
+ranking are scored a chunk at a time by vector_scorer.VectorScorer.
+Chunks are spread over a process pool and results stream out as JSONL,
+in input order.
+
+Usage:
+    python environment/batch_judge.py GT_PATH DIR [DIR ...] [--workers N] [--out FILE]
+    find /rollouts -mindepth 1 -maxdepth 1 -type d | python environment/batch_judge.py GT_PATH -
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from judge import (  # noqa: E402
+    _load_gt,
+    _read_report,
+    combine,
+    content_words,
+    keyword_score,
+    parse_reading_order,
+    schema_score,
+    score_ranking,
+)
+from vector_scorer import VectorScorer  # noqa: E402
+
+BUCKETS = ("must-read", "nice-to-read", "bullshit")
+
+
+class GroundTruth:
+    """ground truth with everything per-rollout scoring needs precomputed"""
+
+    def __init__(self, gt):
+        self.labels = gt["labels"]
+        self.reference = gt["reference_ranking"]
+        self.n = len(self.labels)
+        self.words = {fn: content_words(m["key_contribution"]) for fn, m in self.labels.items()}
+        self.expected = [(fn, m["classification"]) for fn, m in self.labels.items()]
+        self.scorer = VectorScorer(self.labels, self.reference)
+
+    @classmethod
+    def load(cls, path):
+        return cls(_load_gt(path))
+
+
+def _bucket_files(base_dir):
+    out = {}
+    for b in BUCKETS:
+        try:
+            with os.scandir(os.path.join(base_dir, b)) as it:
+                out[b] = {e.name for e in it if e.is_file()}
+        except (FileNotFoundError, NotADirectoryError):
+            out[b] = set()
+    return out
+
+
+def _classification(base_dir, gt):
+    if not gt.n:
+        return 0.0
+    placed = _bucket_files(base_dir)
+    return sum(fn in placed[cls] for fn, cls in gt.expected) / gt.n
+
+
+def judge_one(base_dir, gt: GroundTruth):
+    """judge.judge(base_dir, gt_path), minus the repeated work"""
+    c = _classification(base_dir, gt)
+    ro_ok, pred_order = parse_reading_order(base_dir)
+    r = score_ranking(pred_order, gt.reference)
+    report = _read_report(base_dir)
+    s = schema_score(report, gt.n)
+    k = keyword_score(report, gt.labels, gt.words)
+    return combine(c, ro_ok, r, s, k)
+
+
+def _error(base_dir, exc):
+    return {"base_dir": base_dir, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def _judge_safe(base_dir, gt):
+    try:
+        return {"base_dir": base_dir, **judge_one(base_dir, gt)}
+    except Exception as exc:
+        return _error(base_dir, exc)
+
+
+def judge_chunk(base_dirs, gt: GroundTruth):
+    """judge_one for each dir, with ranking + keywords vectorized across the chunk"""
+    out, read = [], []
+    for d in base_dirs:
+        try:
+            ro_ok, pred_order = parse_reading_order(d)
+            report = _read_report(d)
+            read.append((d, _classification(d, gt), ro_ok, pred_order, report,
+                         schema_score(report, gt.n)))
+            out.append(None)
+        except Exception as exc:  # one bad rollout shouldn't kill the batch
+            out.append(_error(d, exc))
+    try:
+        rs = gt.scorer.ranking([row[3] for row in read])
+        ks = gt.scorer.keywords([row[4] for row in read])
+    except Exception:
+        # something in the chunk the vector path can't take (e.g. a non-string
+        # key_contribution) — redo it one by one so only that rollout errors
+        return [_judge_safe(d, gt) for d in base_dirs]
+    j = 0
+    for i, slot in enumerate(out):
+        if slot is None:
+            d, c, ro_ok, _, _, s = read[j]
+            out[i] = {"base_dir": d, **combine(c, ro_ok, float(rs[j]), s, float(ks[j]))}
+            j += 1
+    return out
+
+
+# one GroundTruth per worker process, built by the pool initializer
+_worker_gt = None
+
+
+def _init_worker(gt_path):
+    global _worker_gt
+    _worker_gt = GroundTruth.load(gt_path)
+
+
+def _score_chunk(base_dirs):
+    return judge_chunk(base_dirs, _worker_gt)
+
+
+def judge_many(base_dirs, gt_path, workers=None, chunksize=None):
+    """yield one result dict per rollout dir, in order, as they're scored"""
+    base_dirs = list(base_dirs)
+    workers = workers or os.cpu_count() or 1
+    chunksize = chunksize or max(1, min(256, len(base_dirs) // (workers * 4)))
+    chunks = [base_dirs[i:i + chunksize] for i in range(0, len(base_dirs), chunksize)]
+    if workers == 1 or len(chunks) < 2:
+        _init_worker(gt_path)
+        for chunk in chunks:
+            yield from _score_chunk(chunk)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(gt_path,)) as pool:
+        for res in pool.map(_score_chunk, chunks):
+            yield from res
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="score many rollout dirs, one JSON line each")
+    ap.add_argument("gt_path")
+    ap.add_argument("dirs", nargs="+", help="rollout dirs, or - to read them from stdin")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", help="write JSONL here instead of stdout")
+    args = ap.parse_args(argv)
+
+    dirs = args.dirs
+    if dirs == ["-"]:
+        dirs = [ln.strip() for ln in sys.stdin if ln.strip()]
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        for res in judge_many(dirs, args.gt_path, workers=args.workers):
+            out.write(json.dumps(res) + "\n")
+            out.flush()
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -70,18 +70,25 @@ def score_ranking(predicted, reference):
     return (tau + 1.0) / 2.0
 
 
-def score_report_schema(base_dir, n_expected):
+def _read_report(base_dir):
+    """parsed triage_report.json, or None if it's missing/unparseable/not a list"""
     path = os.path.join(base_dir, "triage_report.json")
     if not os.path.isfile(path):
-        return 0.0
+        return None
     try:
         with open(path) as f:
             data = json.load(f)
-    except json.JSONDecodeError:
-        return 0.0
+    except (json.JSONDecodeError, FileNotFoundError):
+        return None
     if not isinstance(data, list):
-        return 0.0
+        return None
+    return data
+
 
+def schema_score(data, n_expected):
+    """score_report_schema on an already-parsed report"""
+    if data is None:
+        return 0.0
     need = {"filename", "title", "classification", "domain_tags",
             "key_contribution", "relevance_score"}
     ok_cls = {"must-read", "nice-to-read", "bullshit"}
@@ -103,18 +110,19 @@ def score_report_schema(base_dir, n_expected):
     return good / n_expected if n_expected else 0.0
 
 
-def score_keywords(base_dir, gt_labels):
-    path = os.path.join(base_dir, "triage_report.json")
-    if not os.path.isfile(path):
-        return 0.0
-    try:
-        with open(path) as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return 0.0
-    if not isinstance(data, list):
-        return 0.0
+def score_report_schema(base_dir, n_expected):
+    return schema_score(_read_report(base_dir), n_expected)
+
+
+def content_words(text):
+    return set(text.lower().split()) - STOP_WORDS
 
+
+def keyword_score(data, gt_labels, gt_words=None):
+    """score_keywords on an already-parsed report. gt_words lets a caller
+    scoring many reports tokenize the ground truth once"""
+    if data is None:
+        return 0.0
     by_name = {}
     for e in data:
         if isinstance(e, dict) and "filename" in e:
@@ -125,8 +133,8 @@ def score_keywords(base_dir, gt_labels):
         if fn not in by_name:
             scores.append(0.0)
             continue
-        gt_w = set(meta["key_contribution"].lower().split()) - STOP_WORDS
-        pred_w = set(by_name[fn].get("key_contribution", "").lower().split()) - STOP_WORDS
+        gt_w = gt_words[fn] if gt_words is not None else content_words(meta["key_contribution"])
+        pred_w = content_words(by_name[fn].get("key_contribution", ""))
         if not gt_w:
             scores.append(0.0)
             continue
@@ -135,18 +143,12 @@ def score_keywords(base_dir, gt_labels):
     return sum(scores) / len(scores) if scores else 0.0
 
 
-def judge(base_dir, gt_path):
-    gt = _load_gt(gt_path)
-    labels = gt["labels"]
-    ref_rank = gt["reference_ranking"]
-    n = len(labels)
+def score_keywords(base_dir, gt_labels):
+    return keyword_score(_read_report(base_dir), gt_labels)
 
-    c = score_classification(base_dir, labels)
-    ro_ok, pred_order = parse_reading_order(base_dir)
-    r = score_ranking(pred_order, ref_rank)
-    s = score_report_schema(base_dir, n)
-    k = score_keywords(base_dir, labels)
 
+def combine(c, ro_ok, r, s, k):
+    """weighted total + breakdown, the shape judge() returns"""
     total = (0.40*c + 0.10*(1.0 if ro_ok else 0.0) + 0.25*r + 0.10*s + 0.15*k) * 100
 
     return {
@@ -161,6 +163,21 @@ def judge(base_dir, gt_path):
     }
 
 
+def judge(base_dir, gt_path):
+    gt = _load_gt(gt_path)
+    labels = gt["labels"]
+    ref_rank = gt["reference_ranking"]
+    n = len(labels)
+
+    c = score_classification(base_dir, labels)
+    ro_ok, pred_order = parse_reading_order(base_dir)
+    r = score_ranking(pred_order, ref_rank)
+    s = score_report_schema(base_dir, n)
+    k = score_keywords(base_dir, labels)
+
+    return combine(c, ro_ok, r, s, k)
+
+
 if __name__ == "__main__":
     base = sys.argv[1] if len(sys.argv) > 1 else "/papers"
     gt = sys.argv[2] if len(sys.argv) > 2 else "/environment/ground_truth.json"
@@ -0,0 +1,282 @@
+"""
+Collect scored triage episodes in bulk, for RL.
+
+Each episode gets its own workspace: the source inbox cloned into
+<workdir>/ep00000/inbox with hardlinks (reflinks, then plain copies, when
+the workdir is on another filesystem). That's safe because nothing
+writes to a pdf. materialize only renames, and a rename moves this
+workspace's link without touching the others. Then run_triage +
+materialize_results + the batch judge's scorer run on the workspace, N
+episodes at a time in one event loop. Their model calls share the
+scheduler's budget (--model-concurrency).
+
+Every model request/response pair is recorded, and one line per episode
+(score, breakdown, timings, trajectory) goes to a JSONL file (.gz works),
+or to Parquet with --format parquet if pyarrow is installed. The headline
+number is rollouts/hour.
+
+Offline by default against the stub model; --model env uses whatever the
+agent would normally pick (TRIAGE_BACKENDS, LMSTUDIO_URL, ...). The
+analysis cache is off while run_farm runs, otherwise every episode after
+the first would be a cache replay.
+
+    python environment/rollout_farm.py /papers/inbox environment/ground_truth.json \\
+        --episodes 256 --concurrency 16 --model-concurrency 32 --latency 0.2 --out rollouts.jsonl.gz
+"""
+import argparse
+import asyncio
+import errno
+import gzip
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from batch_judge import GroundTruth, judge_one  # noqa: E402
+
+from agent import analysis_cache, scheduler, triage  # noqa: E402
+from agent.pdf_utils import scan_inbox  # noqa: E402
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # jsonl it is
+    pa = pq = None
+
+FICLONE = 0x40049409  # linux ioctl, reflink on btrfs/xfs
+
+# the running episode's list of model calls, see RecordingModel
+_trajectory: ContextVar[list | None] = ContextVar("rollout_trajectory", default=None)
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+
+
+def clone_inbox(src, dst, how="auto"):
+    """hardlink (or reflink, or copy) every file in src into dst -> method used"""
+    os.makedirs(dst, exist_ok=True)
+    names = [e.name for e in os.scandir(src) if e.is_file()]
+    order = {"auto": ("hardlink", "reflink", "copy")}.get(how, (how,))
+    for method in order:
+        try:
+            for name in names:
+                s, d = os.path.join(src, name), os.path.join(dst, name)
+                if method == "hardlink":
+                    os.link(s, d)
+                elif method == "reflink":
+                    _reflink(s, d)
+                else:
+                    shutil.copy2(s, d)
+            return method
+        except OSError as exc:
+            if how != "auto" or exc.errno not in (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP,
+                                                  errno.ENOTTY, errno.EINVAL, errno.EMLINK):
+                raise
+            for name in names:  # partial attempt, start over with the next method
+                try:
+                    os.unlink(os.path.join(dst, name))
+                except FileNotFoundError:
+                    pass
+    raise OSError(f"couldn't clone {src}")
+
+
+def _recording_model(model):
+    """model wrapper that appends each request/response to the running episode"""
+    from pydantic_ai.messages import ModelMessagesTypeAdapter
+    from pydantic_ai.models.wrapper import WrapperModel
+
+    class RecordingModel(WrapperModel):
+        async def request(self, messages, model_settings, model_request_parameters):
+            t0 = time.perf_counter()
+            res = await super().request(messages, model_settings, model_request_parameters)
+            calls = _trajectory.get()
+            if calls is not None:
+                # the history is the earlier calls, only the new request is worth keeping
+                req, resp = ModelMessagesTypeAdapter.dump_python([messages[-1], res], mode="json")
+                calls.append({"request": req, "response": resp,
+                              "seconds": round(time.perf_counter() - t0, 4)})
+            return res
+
+    return RecordingModel(model)
+
+
+@contextmanager
+def _no_analysis_cache():
+    """analysis cache off for the farm's run only, importing this changes nothing"""
+    saved = analysis_cache._cache, analysis_cache._disabled
+    analysis_cache._cache, analysis_cache._disabled = None, True
+    try:
+        yield
+    finally:
+        analysis_cache._cache, analysis_cache._disabled = saved
+
+
+@contextmanager
+def _tmp_workdir(src, keep):
+    workdir = tempfile.mkdtemp(prefix="rollouts-", dir=os.path.dirname(os.path.abspath(src)))
+    try:
+        yield workdir
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))] if xs else 0.0
+
+
+async def _episode(i, src, workdir, gt, mode, clone, keep):
+    ws = os.path.join(workdir, f"ep{i:05d}")
+    rec = {"episode": i}
+    calls = []
+    _trajectory.set(calls)
+    t0 = time.perf_counter()
+    try:
+        rec["clone"] = await asyncio.to_thread(clone_inbox, src, os.path.join(ws, "inbox"), clone)
+        t1 = time.perf_counter()
+        result = await triage.run_triage(os.path.join(ws, "inbox"), mode=mode)
+        await asyncio.to_thread(triage.materialize_results, result, ws)
+        t2 = time.perf_counter()
+        rec.update(judge_one(ws, gt))
+        rec["seconds"] = {"clone": round(t1 - t0, 4), "triage": round(t2 - t1, 4),
+                          "judge": round(time.perf_counter() - t2, 4)}
+        rec["result"] = result.model_dump(mode="json")
+    except Exception as exc:  # one broken episode shouldn't sink the batch
+        rec["error"] = f"{type(exc).__name__}: {exc}"
+    finally:
+        if not keep:
+            await asyncio.to_thread(shutil.rmtree, ws, True)
+    rec["model_calls"] = len(calls)
+    rec["trajectory"] = calls
+    return rec
+
+
+async def run_farm(src, gt_path, episodes, concurrency=8, model=None, mode="mapreduce",
+                   workdir=None, clone="auto", keep=False, on_episode=None):
+    """run `episodes` scored episodes, `concurrency` at a time -> summary dict.
+    on_episode(record) gets each episode as it finishes (in completion order).
+    without a workdir the workspaces go in a tmp dir next to src, removed
+    afterwards unless keep"""
+    if workdir is None:
+        # same filesystem as the inbox, so clone=auto can hardlink
+        with _tmp_workdir(src, keep) as tmp:
+            return await run_farm(src, gt_path, episodes, concurrency, model, mode,
+                                  tmp, clone, keep, on_episode)
+    gt = GroundTruth.load(gt_path)
+    model = _recording_model(model or triage.get_triage_agent().model)  # wrapper infers a model string
+    # warm the extraction cache once instead of every episode missing at the same time
+    await asyncio.to_thread(scan_inbox, src)
+
+    sem = asyncio.Semaphore(concurrency)
+    scores, durations, errors = [], [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            rec = await _episode(i, src, workdir, gt, mode, clone, keep)
+        if "error" in rec:
+            errors += 1
+        else:
+            scores.append(rec["score"])
+            durations.append(sum(rec["seconds"].values()))
+        if on_episode is not None:
+            on_episode(rec)
+
+    with ExitStack() as stack:
+        stack.enter_context(_no_analysis_cache())
+        for agent in (triage.triage_agent, triage.paper_agent, triage.ranking_agent):
+            stack.enter_context(agent.override(model=model))
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(episodes)))
+        wall = time.perf_counter() - t0
+
+    ok = len(scores)
+    return {
+        "episodes": episodes, "ok": ok, "errors": errors, "wall_s": round(wall, 3),
+        "rollouts_per_hour": round(ok / wall * 3600, 1) if wall else None,
+        "score": {"mean": round(statistics.fmean(scores), 3) if scores else None,
+                  "min": min(scores, default=None), "max": max(scores, default=None)},
+        "episode_s": {"p50": round(_pct(durations, 0.5), 4), "p95": round(_pct(durations, 0.95), 4)},
+        "config": {"concurrency": concurrency, "model_concurrency": scheduler.llm.budget,
+                   "mode": mode, "model": f"{model.system}:{model.model_name}"},
+    }
+
+
+class _Writer:
+    """episode records -> jsonl (optionally gzipped) or parquet"""
+
+    def __init__(self, path, fmt):
+        self.path, self.fmt, self.rows = path, fmt, []
+        self.fh = None
+        if fmt == "jsonl":
+            self.fh = gzip.open(path, "wt") if path.endswith(".gz") else open(path, "w")
+
+    def __call__(self, rec):
+        if self.fh is not None:
+            self.fh.write(json.dumps(rec, separators=(",", ":")) + "\n")
+        else:
+            # nested bits as json strings, keeps the schema flat and stable
+            self.rows.append({"episode": rec["episode"], "score": rec.get("score"),
+                              "error": rec.get("error"), "model_calls": rec["model_calls"],
+                              **{k: json.dumps(rec.get(k)) for k in ("breakdown", "seconds",
+                                                                      "result", "trajectory")}})
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+        else:
+            pq.write_table(pa.Table.from_pylist(sorted(self.rows, key=lambda r: r["episode"])),
+                           self.path, compression="zstd")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="run many triage episodes in parallel and score them")
+    ap.add_argument("inbox", help="source inbox, cloned per episode")
+    ap.add_argument("gt_path")
+    ap.add_argument("--episodes", type=int, default=32)
+    ap.add_argument("--concurrency", type=int, default=8, help="episodes in flight")
+    ap.add_argument("--model-concurrency", type=int, default=None,
+                    help="model calls in flight across all episodes (default TRIAGE_LLM_BUDGET)")
+    ap.add_argument("--model", default="stub", choices=("stub", "env"))
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds per stub model request")
+    ap.add_argument("--mode", default="mapreduce", choices=("single", "mapreduce"))
+    ap.add_argument("--workdir", help="where workspaces go, ideally the inbox's filesystem")
+    ap.add_argument("--clone", default="auto", choices=("auto", "hardlink", "reflink", "copy"))
+    ap.add_argument("--keep", action="store_true", help="keep the workspaces")
+    ap.add_argument("--out", default="rollouts.jsonl")
+    ap.add_argument("--format", default="jsonl", choices=("jsonl", "parquet"))
+    args = ap.parse_args(argv)
+
+    if args.format == "parquet" and pa is None:
+        ap.error("--format parquet needs pyarrow (pip install pyarrow)")
+    if args.model_concurrency:
+        scheduler.llm = scheduler.FairScheduler(args.model_concurrency)
+    model = None
+    if args.model == "stub":
+        from agent.stub_model import StubModel
+        model = StubModel(latency=args.latency)
+
+    writer = _Writer(args.out, args.format)
+    try:
+        summary = asyncio.run(run_farm(args.inbox, args.gt_path, args.episodes, args.concurrency, model,
+                                       args.mode, args.workdir, args.clone, args.keep, on_episode=writer))
+    finally:
+        writer.close()
+    summary["out"] = args.out
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
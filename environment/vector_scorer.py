@@ -0,0 +1,137 @@
+"""
+Keyword-overlap and ranking scores for a whole batch of rollouts at once.
+
+VectorScorer compiles the ground truth once: key contributions become a
+vocabulary plus a binary (papers x vocab) sparse matrix, and the reference
+ranking becomes a filename -> position map. After that, scoring B reports
+is one sparse elementwise product, and B reading orders is one masked
+pairwise-sign pass. The results are bit-for-bit what judge.keyword_score and
+judge.score_ranking return. The final sums run left to right (cumsum, not
+pairwise), and tau uses scipy's own con_minus_dis / sqrt(tot) / sqrt(tot).
+"""
+from itertools import repeat
+
+import numpy as np
+import scipy.sparse as sp
+
+from judge import content_words, score_ranking
+
+_SEP = "\x00"  # row separator for batched tokenizing
+
+
+class VectorScorer:
+    def __init__(self, gt_labels, reference):
+        self.files = list(gt_labels)
+        words = [content_words(m["key_contribution"]) for m in gt_labels.values()]
+        self.vocab = {w: j for j, w in enumerate(sorted(set().union(*words)))}
+        self.gt = self._rows_matrix([[self.vocab[w] for w in ws] for ws in words])
+        self._lookup = {**self.vocab, _SEP: -2}.get
+        self.gt_len = np.asarray(self.gt.sum(axis=1)).ravel()
+
+        self.reference = list(reference)
+        self.ref_pos = {p: i for i, p in enumerate(self.reference)}
+        # duplicate reference entries mean ties in x — leave those to scipy
+        self._ref_ties = len(self.ref_pos) != len(self.reference)
+        n = len(self.reference)
+        self._upper = np.triu(np.ones((n, n), dtype=bool), k=1)
+
+    def _matrix(self, indptr, indices):
+        data = np.ones(len(indices), dtype=np.int64)
+        return sp.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(self.vocab)))
+
+    def _rows_matrix(self, rows):
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(r) for r in rows])
+        indices = np.fromiter((j for r in rows for j in r), dtype=np.int64, count=indptr[-1])
+        return self._matrix(indptr, indices)
+
+    def _texts(self, report):
+        """predicted key_contribution per gt paper ("" if absent), last entry wins"""
+        by_name = {}
+        for e in report:
+            if isinstance(e, dict) and "filename" in e:
+                by_name[e["filename"]] = e
+        texts = []
+        for fn in self.files:
+            e = by_name.get(fn)
+            texts.append("" if e is None else e.get("key_contribution", ""))
+        return texts
+
+    def _texts_matrix(self, texts):
+        """binary (texts x vocab) matrix of which vocab words each text has.
+
+        one join/lower/split for the whole batch with a sentinel token between
+        rows. stop words are never in the vocab, so vocab lookup on the raw split
+        is content_words() minus words that can't match; repeats get collapsed
+        """
+        if any(_SEP in t for t in texts):  # sentinel would misalign rows
+            rows = [[self.vocab[w] for w in t.lower().split() if w in self.vocab] for t in texts]
+            return self._binary(self._rows_matrix(rows))
+        toks = f" {_SEP} ".join(texts).lower().split()
+        toks.append(_SEP)
+        ids = np.fromiter(map(self._lookup, toks, repeat(-1, len(toks))), dtype=np.int64, count=len(toks))
+        sep = ids == -2
+        row = np.cumsum(sep) - sep  # row of each token
+        keep = ids >= 0
+        indptr = np.zeros(len(texts) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(row[keep], minlength=len(texts)))
+        return self._binary(self._matrix(indptr, ids[keep]))
+
+    @staticmethod
+    def _binary(m):
+        m.sum_duplicates()
+        m.data[:] = 1
+        return m
+
+    def _tiled_gt(self, times):
+        g = self.gt
+        indptr = np.concatenate([[0], (g.indptr[1:] + g.nnz * np.arange(times)[:, None]).ravel()])
+        return sp.csr_matrix((np.tile(g.data, times), np.tile(g.indices, times), indptr),
+                             shape=(g.shape[0] * times, g.shape[1]))
+
+    def keywords(self, reports):
+        """keyword_score for each parsed report (None = missing/invalid)"""
+        n, out = len(self.files), np.zeros(len(reports))
+        live = [b for b, rep in enumerate(reports) if rep is not None]
+        if not n or not live:
+            return out
+        pred = self._texts_matrix([t for b in live for t in self._texts(reports[b])])
+        overlap = np.asarray(pred.multiply(self._tiled_gt(len(live))).sum(axis=1)).ravel()
+        overlap = overlap.reshape(len(live), n)
+        denom = np.broadcast_to(self.gt_len, overlap.shape)
+        ratio = np.divide(overlap, denom, out=np.zeros(overlap.shape), where=denom > 0)
+        out[live] = np.cumsum(ratio, axis=1)[:, -1] / n
+        return out
+
+    def ranking(self, orderings):
+        """score_ranking(pred, reference) for each predicted ordering"""
+        out = np.zeros(len(orderings))
+        if not self.reference:
+            return out
+        if self._ref_ties:
+            return np.array([score_ranking(p, self.reference) for p in orderings])
+
+        n = len(self.reference)
+        ranks = np.full((len(orderings), n), -1, dtype=np.int64)
+        for b, pred in enumerate(orderings):
+            for i, p in enumerate(pred):
+                j = self.ref_pos.get(p)
+                if j is not None:
+                    ranks[b, j] = i
+        present = ranks >= 0
+        m = present.sum(axis=1)
+        out[m == 1] = 0.5
+
+        many = np.flatnonzero(m >= 2)
+        if len(many):
+            r, pr = ranks[many], present[many]
+            # reference positions increase along the row, so a pair (i<j) is
+            # concordant iff the predicted rank increases too
+            sign = np.sign(r[:, None, :] - r[:, :, None])
+            both = pr[:, :, None] & pr[:, None, :] & self._upper
+            con_minus_dis = np.where(both, sign, 0).sum(axis=(1, 2))
+            tot = (m[many] * (m[many] - 1)) // 2
+            tau = con_minus_dis / np.sqrt(tot) / np.sqrt(tot)
+            tau = np.minimum(1.0, np.maximum(-1.0, tau))
+            out[many] = (tau + 1.0) / 2.0
+        return out
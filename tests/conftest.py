@@ -0,0 +1,33 @@
+import os, sys
+from contextlib import ExitStack
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import analysis_cache, extract_cache, result_store, triage
+from agent.stub_model import StubModel
+
+
+@pytest.fixture(autouse=True)
+def _tmp_caches(tmp_path_factory, monkeypatch):
+    """every cache and store lives in a fresh tmp dir, so no test reads
+    ~/.cache or leaves anything there, whatever the env says"""
+    where = tmp_path_factory.mktemp("caches")
+    for mod, path_attr, obj_attr in ((extract_cache, "CACHE_PATH", "_cache"),
+                                     (analysis_cache, "CACHE_PATH", "_cache"),
+                                     (result_store, "STORE_PATH", "_store")):
+        monkeypatch.setattr(mod, path_attr, str(where / f"{mod.__name__.rsplit('.', 1)[-1]}.sqlite"))
+        monkeypatch.setattr(mod, obj_attr, None)
+        monkeypatch.setattr(mod, "_disabled", False)
+
+
+@pytest.fixture
+def stub_agents(request):
+    """all three agents on one StubModel -> the model. parametrize it
+    indirectly with a factory to get some other model (a StubModel subclass, say)"""
+    model = getattr(request, "param", StubModel)()
+    with ExitStack() as stack:
+        for agent in (triage.triage_agent, triage.paper_agent, triage.ranking_agent):
+            stack.enter_context(agent.override(model=model))
+        yield model
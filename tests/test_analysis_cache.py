@@ -0,0 +1,55 @@
+import asyncio, os, sqlite3, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import analysis_cache, triage
+from agent.schemas import PaperAnalysis
+from agent.synthetic import make_inbox
+
+
+def test_memo_hits_and_misses(tmp_path, monkeypatch, stub_agents):
+    make_inbox(str(tmp_path), 3, max_pages=1)
+
+    def calls():
+        # -> model requests made by one run, the ranking call not counted
+        before = len(stub_agents.request_times)
+        asyncio.run(triage.run_triage(str(tmp_path), mode="mapreduce"))
+        return len(stub_agents.request_times) - before - 1
+
+    assert calls() == 3
+    assert calls() == 0  # same bytes, model and prompt
+    make_inbox(str(tmp_path), 1, max_pages=3, seed=7)  # paper_00000.pdf gets new bytes
+    assert calls() == 1
+    monkeypatch.setattr(triage, "_model_key", lambda: "other:model")
+    assert calls() == 3
+    monkeypatch.setattr(triage, "SYSTEM_MSG", triage.SYSTEM_MSG + "\nbe brief.")
+    assert calls() == 3
+    assert calls() == 0
+
+
+def _analysis(f):
+    return PaperAnalysis(filename=f, title=f, classification="bullshit", domain_tags=["x"],
+                         key_contribution="stuff", relevance_score=0.1)
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(analysis_cache.time, "time", lambda: next(clock))
+    cache = analysis_cache.AnalysisCache(str(tmp_path / "a.sqlite"), max_entries=2)
+    cache.put_many({"a": _analysis("a.pdf"), "b": _analysis("b.pdf")})
+    assert set(cache.get_many(["a"])) == {"a"}  # a is now fresher than b
+    cache.put_many({"c": _analysis("c.pdf")})
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+
+def test_upgrades_old_cache_files(tmp_path):
+    path = str(tmp_path / "a.sqlite")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE analyses (key TEXT PRIMARY KEY, data TEXT NOT NULL, created REAL NOT NULL)")
+    db.execute("INSERT INTO analyses VALUES ('old', ?, 1.0)", (_analysis("old.pdf").model_dump_json(),))
+    db.commit()
+    db.close()
+    cache = analysis_cache.AnalysisCache(path, max_entries=10)
+    assert cache.get_many(["old"])["old"].filename == "old.pdf"
+    cache.put_many({"new": _analysis("new.pdf")})
+    assert set(cache.get_many(["old", "new"])) == {"old", "new"}
@@ -0,0 +1,67 @@
+import json, os, sys, tempfile
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "environment"))
+
+from judge import judge
+from batch_judge import GroundTruth, judge_chunk, judge_many, judge_one, main
+
+GT_PATH = os.path.join(os.path.dirname(__file__), "..", "environment", "ground_truth.json")
+with open(GT_PATH) as _f:
+    GT = json.load(_f)
+
+
+def _rollout(root, name, n_correct, order, report):
+    d = os.path.join(root, name)
+    for sub in ("inbox", "must-read", "nice-to-read", "bullshit"):
+        os.makedirs(os.path.join(d, sub))
+    for i, (fn, m) in enumerate(GT["labels"].items()):
+        bucket = m["classification"] if i < n_correct else "bullshit"
+        open(os.path.join(d, bucket, fn), "w").close()
+    if order is not None:
+        with open(os.path.join(d, "reading_order.txt"), "w") as f:
+            for i, fn in enumerate(order, 1):
+                f.write(f"{i}. {fn} | reason\n")
+    if report is not None:
+        with open(os.path.join(d, "triage_report.json"), "w") as f:
+            f.write(report if isinstance(report, str) else json.dumps(report))
+    return d
+
+
+@pytest.fixture
+def rollouts():
+    ref = GT["reference_ranking"]
+    full = [{"filename": fn, "title": m["title"], "classification": m["classification"],
+             "domain_tags": m["domain_tags"], "key_contribution": m["key_contribution"],
+             "relevance_score": m["relevance_score"]} for fn, m in GT["labels"].items()]
+    half = [dict(e, key_contribution=" ".join(e["key_contribution"].split()[:3])) for e in full[::2]]
+    with tempfile.TemporaryDirectory() as root:
+        yield [
+            _rollout(root, "perfect", len(GT["labels"]), ref, full),
+            _rollout(root, "nothing", 0, None, None),
+            _rollout(root, "reversed", 12, list(reversed(ref)), half),
+            _rollout(root, "shuffled", 20, ref[1::2] + ref[::2], full[:5]),
+            _rollout(root, "bad_json", 5, ref[:2], "nope{{{"),
+        ]
+
+
+def test_matches_judge(rollouts):
+    gt = GroundTruth.load(GT_PATH)
+    for d in rollouts:
+        assert judge_one(d, gt) == judge(d, GT_PATH)
+    chunk = judge_chunk(rollouts, gt)
+    assert [{k: v for k, v in r.items() if k != "base_dir"} for r in chunk] == [judge(d, GT_PATH) for d in rollouts]
+
+
+def test_pool_streams_in_order(rollouts):
+    got = list(judge_many(rollouts, GT_PATH, workers=2))
+    assert [g["base_dir"] for g in got] == rollouts
+    assert [g["score"] for g in got] == [judge(d, GT_PATH)["score"] for d in rollouts]
+
+
+def test_cli_jsonl(rollouts, tmp_path):
+    out = tmp_path / "scores.jsonl"
+    main([GT_PATH, *rollouts, "--workers", "1", "--out", str(out)])
+    lines = [json.loads(ln) for ln in out.read_text().splitlines()]
+    assert len(lines) == len(rollouts)
+    assert lines[0]["score"] == 100.0
@@ -0,0 +1,22 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from bench_triage import run_bench, compare
+
+
+# tiny run, just so the harness doesn't rot between the times someone
+# actually benchmarks something
+
+def test_mapreduce_smoke():
+    res = run_bench(n_papers=6, repeat=1, max_pages=2, mode="mapreduce")
+    assert res["config"]["papers"] == 6
+    assert res["papers_per_sec"] > 0
+    assert set(res["stages_s"]) == {"scan_inbox", "run_triage", "materialize_results"}
+    # 6 map calls + 1 ranking call, direct and through the endpoint
+    assert res["model_request_s"]["n"] == 14
+
+
+def test_compare_against_itself():
+    res = run_bench(n_papers=3, repeat=1, max_pages=1, mode="single")
+    assert compare(res, res)["papers_per_sec_%"] == 0.0
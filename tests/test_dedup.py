@@ -0,0 +1,58 @@
+import asyncio, json, os, random, shutil, sqlite3, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import fitz
+
+from agent import analysis_cache, dedup, triage
+from agent.schemas import PaperAnalysis
+
+VOCAB = [f"word{i}" for i in range(3000)]
+
+
+def _text(seed, n=1500):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(VOCAB) for _ in range(n))
+
+
+def test_finds_near_copies_only():
+    docs = {f"p{i}.pdf": _text(i) for i in range(300)}
+    docs["p0v2.pdf"] = docs["p0.pdf"] + " plus a new appendix" * 20
+    words = docs["p1.pdf"].split()
+    words[200:230] = ["edited"] * 30
+    docs["p1-renamed.pdf"] = " ".join(words)
+    docs["short.pdf"] = docs["short2.pdf"] = "too short to say"
+    dups = dedup.find_duplicates(docs)
+    assert dups == {"p0.pdf": "p0v2.pdf", "p1-renamed.pdf": "p1.pdf"}  # the longer one represents
+    assert dedup.clusters(dups) == {"p0v2.pdf": ["p0.pdf"], "p1.pdf": ["p1-renamed.pdf"]}
+
+
+def _pdf(path, title, body):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(72, 72, 540, 770), f"{title}\n\nAbstract\n{body}", fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def test_duplicates_share_one_analysis(tmp_path, stub_agents):
+    _pdf(tmp_path / "2401.00001v1.pdf", "Reward modeling for RLHF", _text(1, 600))
+    shutil.copy(tmp_path / "2401.00001v1.pdf", tmp_path / "reward-modeling-for-rlhf.pdf")
+    _pdf(tmp_path / "other.pdf", "Serving pipelines", "deployment " + _text(2, 600))
+    res = asyncio.run(triage.run_triage(str(tmp_path), mode="mapreduce"))
+
+    assert len(stub_agents.request_times) == 3  # two papers + the ranking, not three papers
+    by_name = {p.filename: p for p in res.papers}
+    assert len(by_name) == 3 and by_name["other.pdf"].duplicate_of is None
+    dup = by_name["reward-modeling-for-rlhf.pdf"]
+    assert dup.duplicate_of == "2401.00001v1.pdf"
+    assert dup.model_dump(exclude={"filename", "duplicate_of"}) == \
+        by_name["2401.00001v1.pdf"].model_dump(exclude={"filename", "duplicate_of"})
+    assert [e.filename for e in res.reading_order] == ["2401.00001v1.pdf"]
+
+    # the model never sees duplicate_of, and the cache never stores it
+    assert "duplicate_of" not in json.dumps(PaperAnalysis.model_json_schema())
+    db = sqlite3.connect(analysis_cache.CACHE_PATH)
+    rows = [json.loads(d) for (d,) in db.execute("SELECT data FROM analyses")]
+    db.close()
+    assert len(rows) == 2 and all("duplicate_of" not in r for r in rows)
@@ -0,0 +1,111 @@
+import os, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import download_papers as dp
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 400 + b"\n%%EOF\n"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    hits: dict = {}
+    ports: set = set()
+
+    def log_message(self, *a):
+        pass
+
+    def do_GET(self):
+        self.ports.add(self.client_address[1])
+        n = self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        body, start = PDF, 0
+        rng = self.headers.get("Range")
+
+        if self.path == "/html":
+            return self._send(200, b"<html>nope</html>")
+        if self.path == "/flaky" and n == 1:
+            return self._send(503, b"busy", {"Retry-After": "0"})
+        if self.path == "/redirect":
+            return self._send(302, b"", {"Location": "/ok"})
+        if rng:
+            start = int(rng.split("=")[1].rstrip("-"))
+            body = PDF[start:]
+        if self.path == "/truncate" and n == 1:
+            # promise the whole thing, send half, hang up
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(PDF)))
+            self.end_headers()
+            self.wfile.write(PDF[: len(PDF) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        if rng:
+            return self._send(206, body, {"Content-Range": f"bytes {start}-{len(PDF) - 1}/{len(PDF)}"})
+        self._send(200, body)
+
+    def _send(self, status, body, headers=()):
+        self.send_response(status)
+        for k, v in dict(headers).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(dp, "DOWNLOAD_BACKOFF", 0.01)
+    monkeypatch.setattr(dp, "DEFAULT_RATE", 1000.0)
+    monkeypatch.setattr(dp, "_buckets", {})
+    Handler.hits, Handler.ports = {}, set()
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_happy_path_and_keepalive(server, tmp_path):
+    jobs = [(f"{server}/ok?n={i}", tmp_path / f"p{i}.pdf") for i in range(5)]
+    res = dp.download_all(jobs, workers=1)
+    assert all(res.values())
+    assert all(d.read_bytes() == PDF for _, d in jobs)
+    assert not list(tmp_path.glob("*.part"))
+    assert len(Handler.ports) == 1  # one connection for all five
+
+
+def test_rejects_non_pdf_early(server, tmp_path):
+    dest = tmp_path / "x.pdf"
+    assert dp.download(f"{server}/html", dest) is False
+    assert not dest.exists() and not list(tmp_path.iterdir())
+
+
+def test_resumes_truncated_download(server, tmp_path):
+    dest = tmp_path / "t.pdf"
+    assert dp.download(f"{server}/truncate", dest)
+    assert dest.read_bytes() == PDF
+    assert Handler.hits["/truncate"] == 2
+
+
+def test_retries_5xx_and_follows_redirects(server, tmp_path):
+    assert dp.download(f"{server}/flaky", tmp_path / "f.pdf")
+    assert Handler.hits["/flaky"] == 2
+    assert dp.download(f"{server}/redirect", tmp_path / "r.pdf")
+    assert (tmp_path / "r.pdf").read_bytes() == PDF
+
+
+def test_gives_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(dp, "DOWNLOAD_BACKOFF", 0.01)
+    # nothing listening on this port
+    assert dp.download("http://127.0.0.1:9/x.pdf", tmp_path / "g.pdf", timeout=1, retries=1) is False
+
+
+def test_token_bucket_paces():
+    b = dp.TokenBucket(rate=50, burst=1)
+    t0 = time.monotonic()
+    for _ in range(6):
+        b.acquire()
+    assert time.monotonic() - t0 >= 5 / 50 * 0.9
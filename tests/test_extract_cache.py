@@ -0,0 +1,43 @@
+import os, sys
+
+import fitz
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import extract_cache, pdf_utils
+from agent.synthetic import make_inbox
+
+
+def test_key_covers_bytes_budget_and_pymupdf(tmp_path, monkeypatch):
+    (tmp_path / "a.pdf").write_bytes(b"one")
+    (tmp_path / "b.pdf").write_bytes(b"two")
+    a, b = (extract_cache.hash_file(str(tmp_path / f)) for f in ("a.pdf", "b.pdf"))
+    key = extract_cache.cache_key(a, 12000, 0)
+    assert key == extract_cache.cache_key(a, 12000, None)
+    assert key not in {extract_cache.cache_key(b, 12000, 0), extract_cache.cache_key(a, 6000, 0),
+                       extract_cache.cache_key(a, 12000, 3)}
+    monkeypatch.setattr(fitz, "VersionBind", "9.9.9")
+    assert extract_cache.cache_key(a, 12000, 0) != key
+
+
+def test_lru_eviction(tmp_path):
+    cache = extract_cache.ExtractCache(str(tmp_path / "c.sqlite"), max_bytes=250)
+    cache.put_many({"a": ("x" * 100, None), "b": ("y" * 100, {"sections": []})})
+    assert cache.get_many(["a"]) == {"a": ("x" * 100, None)}  # a is now the more recent
+    cache.put_many({"c": ("z" * 100, None)})
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+
+def test_failures_arent_cached(tmp_path):
+    make_inbox(str(tmp_path), 2, max_pages=1)
+    (tmp_path / "broken.pdf").write_bytes(b"%PDF-1.4 not really")
+    first = dict((f, t) for f, t, _ in pdf_utils.iter_inbox(str(tmp_path)))
+    assert pdf_utils.extract_failed(first["broken.pdf"])
+
+    cache = extract_cache.get_cache()
+    budget = (pdf_utils.EXTRACT_CHAR_BUDGET, pdf_utils.EXTRACT_PAGE_BUDGET)
+    keys = {f: extract_cache.cache_key(extract_cache.hash_file(str(tmp_path / f)), *budget) for f in first}
+    assert set(cache.get_many(keys.values())) == {keys["paper_00000.pdf"], keys["paper_00001.pdf"]}
+    # second scan: the good ones come from the cache (first), the broken one is tried again
+    assert [f for f, _, _ in pdf_utils.iter_inbox(str(tmp_path))] == \
+        ["paper_00000.pdf", "paper_00001.pdf", "broken.pdf"]
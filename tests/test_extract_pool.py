@@ -0,0 +1,51 @@
+import os, signal, sys, time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import pdf_utils
+from agent.synthetic import make_inbox
+
+_real_worker = pdf_utils._extract_worker
+
+
+def _nap(path, *args):
+    time.sleep(30)
+
+
+def _stuck(path, *args):
+    # like a call inside mupdf that never returns to python: the alarm can't land
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    time.sleep(30)
+
+
+def _flaky_worker(path, *args):
+    # runs in the spawned worker, where the test's monkeypatching doesn't reach
+    name = os.path.basename(path)
+    if name.startswith("crash"):
+        os._exit(1)
+    if name.startswith("slow"):
+        pdf_utils._extract = _nap
+    if name.startswith("stuck"):
+        pdf_utils._extract, pdf_utils.HARD_TIMEOUT_GRACE = _stuck, 0.5
+    return _real_worker(path, *args)
+
+
+@pytest.mark.parametrize("bad", ["corrupt.pdf", "slow.pdf", "stuck.pdf", "crash.pdf"])
+def test_one_bad_pdf_doesnt_stall_the_pool(tmp_path, monkeypatch, bad):
+    make_inbox(str(tmp_path), 6, max_pages=1)
+    if bad == "corrupt.pdf":
+        (tmp_path / bad).write_bytes(b"%PDF-1.4 this is not really a pdf")
+    else:
+        os.link(tmp_path / "paper_00000.pdf", tmp_path / bad)
+    monkeypatch.setattr(pdf_utils, "_extract_worker", _flaky_worker)
+
+    t0 = time.perf_counter()
+    out = {f: text for f, text, _ in pdf_utils.iter_inbox(str(tmp_path), workers=2, timeout=1, use_cache=False)}
+    assert time.perf_counter() - t0 < 20
+
+    assert sorted(out) == sorted([bad] + [f"paper_{i:05d}.pdf" for i in range(6)])
+    assert out[bad].startswith(f"[couldn't read {tmp_path / bad}")
+    assert all("Synthetic Paper" in out[f] for f in out if f != bad)
+    assert {"slow.pdf": "timed out after 1s", "stuck.pdf": "timed out after 1s", "crash.pdf": "crashed"}.get(bad, "") in out[bad]
@@ -0,0 +1,50 @@
+import os, sys, time
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import app as app_mod, jobs
+from agent.synthetic import make_inbox
+
+
+def _poll(client, job_id, timeout=20):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/triage/{job_id}").json()
+        if job["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_background_job(tmp_path, monkeypatch, stub_agents):
+    monkeypatch.setattr(app_mod, "TRIAGE_PREWARM", False)
+    make_inbox(str(tmp_path / "inbox"), 3, max_pages=1)
+    # the job loop lives in the client's portal, keep it up between requests
+    with TestClient(app_mod.app) as client:
+        resp = client.post("/triage", json={"papers_dir": str(tmp_path), "background": True})
+        assert resp.status_code == 202 and resp.json()["status"] in ("queued", "running")
+        job = _poll(client, resp.json()["job_id"])
+
+        assert job["status"] == "done" and job["error"] is None
+        assert job["result"]["n_papers"] == 3
+        assert job["progress"]["extracting"] == {"done": 3, "total": 3}
+        assert job["progress"]["materializing"] == {"done": 1, "total": 1}
+        assert os.path.exists(tmp_path / "triage_report.json")
+
+        assert client.get("/triage/nope").status_code == 404
+
+
+def test_failed_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_mod, "TRIAGE_PREWARM", False)
+    make_inbox(str(tmp_path / "inbox"), 1, max_pages=1)
+
+    async def boom(*args, **kwargs):
+        raise RuntimeError("model fell over")
+
+    monkeypatch.setattr(jobs, "run_triage", boom)
+    with TestClient(app_mod.app) as client:
+        job_id = client.post("/triage", json={"papers_dir": str(tmp_path), "background": True}).json()["job_id"]
+        job = _poll(client, job_id)
+    assert job["status"] == "failed" and job["result"] is None
+    assert job["error"] == "RuntimeError: model fell over"
@@ -0,0 +1,27 @@
+import os, sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import pdf_utils, triage
+from agent.synthetic import make_inbox
+
+
+def test_read_past_the_budget_pulls_more_pages(tmp_path):
+    make_inbox(str(tmp_path), 1, min_pages=4, max_pages=4)
+    path = str(tmp_path / "paper_00000.pdf")
+    full = pdf_utils.extract_text(path)
+    short = pdf_utils.extract_text(path, max_chars=2000)
+    assert pdf_utils.has_more(short) and full.startswith(pdf_utils.strip_more(short))
+
+    deps = triage.TriageDeps(paper_texts={"paper_00000.pdf": short}, inbox_dir=str(tmp_path))
+    ctx = SimpleNamespace(deps=deps)
+    # inside what we have: no re-extraction
+    assert triage.read_paper(ctx, "paper_00000.pdf", 0, 100).startswith(full[:100])
+    assert deps.paper_texts["paper_00000.pdf"] is short
+
+    offset = len(pdf_utils.strip_more(short)) + 3000
+    chunk = triage.read_paper(ctx, "paper_00000.pdf", offset, 500)
+    assert chunk == full[offset:offset + 500] + f"\n[truncated, continue at offset={offset + 500}]"
+    assert len(deps.paper_texts["paper_00000.pdf"]) > len(short)
+    assert triage.read_paper(ctx, "paper_00000.pdf", len(full) - 10, 500) == full[-10:]
@@ -0,0 +1,44 @@
+import asyncio, os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import dedup, triage
+from agent.stub_model import StubModel, _last_prompt, _sections
+from agent.synthetic import make_inbox
+
+
+class Counting(StubModel):
+    """notes which papers each map call saw and how many calls overlapped"""
+
+    def __init__(self):
+        super().__init__(latency=0.02)
+        self.seen, self.in_flight, self.peak = [], 0, 0
+
+    async def _respond(self, messages, info):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            if "reading_order" not in info.output_tools[0].parameters_json_schema.get("properties", {}) \
+                    and not info.output_tools[0].outer_typed_dict_key:
+                self.seen.append([f for f, _ in _sections(_last_prompt(messages))])
+            return await super()._respond(messages, info)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.mark.parametrize("stub_agents", [Counting], indirect=True)
+def test_one_call_per_paper_bounded(tmp_path, monkeypatch, stub_agents):
+    monkeypatch.setattr(triage, "TRIAGE_CONCURRENCY", 3)
+    monkeypatch.setattr(dedup, "TRIAGE_DEDUP", False)  # same-topic synthetic papers are near-copies
+    make_inbox(str(tmp_path), 9, max_pages=1)
+    res = asyncio.run(triage.run_triage(str(tmp_path), mode="mapreduce"))
+
+    names = [f"paper_{i:05d}.pdf" for i in range(9)]
+    assert sorted(stub_agents.seen) == [[f] for f in names]  # map: each paper alone
+    assert stub_agents.peak == 3
+    assert [p.filename for p in res.papers] == names
+    # reduce: one ranking call over the must-reads
+    assert len(stub_agents.request_times) == 10
+    assert [e.filename for e in res.reading_order] == ["paper_00000.pdf", "paper_00003.pdf", "paper_00006.pdf"]
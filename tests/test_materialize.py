@@ -0,0 +1,123 @@
+import errno, fcntl, json, os, sys, threading, time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import materialize, triage
+from agent.schemas import PaperAnalysis, ReadingOrderEntry, TriageResult
+
+CLASSES = ["must-read", "nice-to-read", "bullshit"]
+
+
+def _result(n):
+    papers = [PaperAnalysis(filename=f"p{i}.pdf", title=f"paper {i}", classification=CLASSES[i % 3],
+                            domain_tags=["x"], key_contribution="stuff", relevance_score=0.5)
+              for i in range(n)]
+    order = [ReadingOrderEntry(rank=1, filename="p0.pdf", justification="because")]
+    return TriageResult(papers=papers, reading_order=order)
+
+
+@pytest.fixture
+def papers_dir(tmp_path):
+    (tmp_path / "inbox").mkdir()
+    for i in range(12):
+        (tmp_path / "inbox" / f"p{i}.pdf").write_bytes(b"%PDF-" + bytes([i]) * 100)
+    (tmp_path / "reading_order.txt").write_text("old\n")
+    return tmp_path
+
+
+def _sorted_ok(d, n=12):
+    assert not list((d / "inbox").iterdir())
+    for i in range(n):
+        assert (d / CLASSES[i % 3] / f"p{i}.pdf").read_bytes() == b"%PDF-" + bytes([i]) * 100
+    assert (d / "reading_order.txt").read_text() == "1. p0.pdf | because\n"
+    assert len(json.loads((d / "triage_report.json").read_text())) == n
+    assert sorted(f.name for f in d.iterdir()) == sorted(CLASSES + ["inbox", "reading_order.txt",
+                                                                     "triage_report.json", materialize.LOCK])
+
+
+def test_commit(papers_dir):
+    triage.materialize_results(_result(12), str(papers_dir))
+    _sorted_ok(papers_dir)
+
+
+def _crash_halfway(monkeypatch):
+    real = materialize._run_moves
+
+    def half(moves, workers):
+        real(moves[: len(moves) // 2], workers)
+        raise KeyboardInterrupt  # stands in for the process dying
+
+    monkeypatch.setattr(materialize, "_run_moves", half)
+
+
+def test_roll_forward_after_crash(papers_dir, monkeypatch):
+    with monkeypatch.context() as m:
+        _crash_halfway(m)
+        with pytest.raises(KeyboardInterrupt):
+            materialize.commit(_result(12), str(papers_dir))
+    assert len(list((papers_dir / "inbox").iterdir())) == 6
+    assert (papers_dir / "reading_order.txt").read_text() == "old\n"  # outputs not swapped yet
+
+    assert materialize.recover(str(papers_dir)) == "forward"
+    _sorted_ok(papers_dir)
+    assert materialize.recover(str(papers_dir)) is None
+
+
+def test_roll_back_after_crash(papers_dir, monkeypatch):
+    (papers_dir / "bullshit").mkdir()
+    (papers_dir / "bullshit" / "p11.pdf").write_bytes(b"from an earlier run")
+    with monkeypatch.context() as m:
+        _crash_halfway(m)
+        with pytest.raises(KeyboardInterrupt):
+            materialize.commit(_result(12), str(papers_dir))
+
+    assert materialize.recover(str(papers_dir), mode="back") == "back"
+    assert len(list((papers_dir / "inbox").iterdir())) == 12
+    assert (papers_dir / "bullshit" / "p11.pdf").read_bytes() == b"from an earlier run"
+    assert (papers_dir / "reading_order.txt").read_text() == "old\n"
+    assert [f.name for f in papers_dir.glob(".*")] == [materialize.LOCK]
+
+
+def test_copies_across_filesystems(papers_dir, monkeypatch):
+    real = os.replace
+
+    def no_rename_out_of_inbox(src, dst):
+        if "inbox" in str(src):
+            raise OSError(errno.EXDEV, "cross-device link")
+        return real(src, dst)
+
+    monkeypatch.setattr(materialize.os, "replace", no_rename_out_of_inbox)
+    materialize.commit(_result(12), str(papers_dir), workers=4)
+    _sorted_ok(papers_dir)
+
+
+def test_waits_for_another_process(papers_dir):
+    # a second open file description conflicts just like another process would
+    fd = os.open(papers_dir / materialize.LOCK, os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    t = threading.Thread(target=materialize.commit, args=(_result(12), str(papers_dir)))
+    t.start()
+    time.sleep(0.2)
+    assert len(list((papers_dir / "inbox").iterdir())) == 12  # still waiting
+    os.close(fd)
+    t.join(5)
+    _sorted_ok(papers_dir)
+
+
+def test_merge_reads_the_outputs_under_the_lock(papers_dir):
+    # another run commits while this one waits for the lock, its outputs must survive the merge
+    fd = os.open(papers_dir / materialize.LOCK, os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    t = threading.Thread(target=triage.materialize_results, args=(_result(1), str(papers_dir), True))
+    t.start()
+    time.sleep(0.2)
+    other = _result(12).papers[5]
+    (papers_dir / other.classification).mkdir()
+    os.rename(papers_dir / "inbox" / other.filename, papers_dir / other.classification / other.filename)
+    (papers_dir / "triage_report.json").write_text(json.dumps([other.model_dump()]))
+    os.close(fd)
+    t.join(5)
+    report = json.loads((papers_dir / "triage_report.json").read_text())
+    assert sorted(p["filename"] for p in report) == ["p0.pdf", "p5.pdf"]
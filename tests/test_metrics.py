@@ -0,0 +1,55 @@
+import asyncio, json, os, sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import app as app_mod, dedup, metrics, triage
+from agent.synthetic import make_inbox
+
+
+def _count(text, series):
+    # -> value of one exposition line, 0 if it isn't there yet
+    for ln in text.splitlines():
+        if ln.startswith(series + " "):
+            return float(ln.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_span_times_and_counts_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "TRACE_LOG", str(tmp_path / "trace.jsonl"))
+    before = metrics.render()
+    with metrics.span("unit_test", file="x.pdf"):
+        pass
+    with pytest.raises(ValueError), metrics.span("unit_test", file="y.pdf"):
+        raise ValueError
+    after = metrics.render()
+
+    n = 'triage_stage_seconds_count{stage="unit_test"}'
+    assert _count(after, n) == _count(before, n) + 2
+    errs = 'triage_stage_errors_total{stage="unit_test"}'
+    assert _count(after, errs) == _count(before, errs) + 1
+    trace = [json.loads(ln) for ln in open(tmp_path / "trace.jsonl")]
+    assert [(t["span"], t["file"], t.get("error")) for t in trace] == \
+        [("unit_test", "x.pdf", None), ("unit_test", "y.pdf", "ValueError")]
+
+
+def test_run_shows_up_on_the_endpoint(tmp_path, monkeypatch, stub_agents):
+    monkeypatch.setattr(dedup, "TRIAGE_DEDUP", False)
+    make_inbox(str(tmp_path), 3, max_pages=1)
+    client = TestClient(app_mod.app)
+    before = client.get("/metrics").text
+    asyncio.run(triage.run_triage(str(tmp_path), mode="mapreduce"))
+    resp = client.get("/metrics")
+    assert resp.headers["content-type"].startswith("text/plain")
+
+    def delta(series):
+        return _count(resp.text, series) - _count(before, series)
+
+    assert delta('triage_model_requests_total{agent="paper"}') == 3
+    assert delta('triage_model_requests_total{agent="ranking"}') == 1
+    assert delta('triage_stage_seconds_count{stage="scan_inbox"}') == 1
+    assert delta('triage_stage_seconds_count{stage="extract"}') == 3
+    assert delta('triage_stage_seconds_count{stage="model_request"}') == 4
+    assert "# TYPE triage_stage_seconds histogram" in resp.text
@@ -0,0 +1,37 @@
+import os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import packing
+from agent.packing import build_message, estimate_tokens, pack_previews
+
+
+def _papers(n, seed=0):
+    rng = random.Random(seed)
+    return {f"p{i:03d}.pdf": f"Paper {i}\nSome Author, Some Lab\nAbstract " + "w" * rng.randint(50, 5000)
+            for i in range(n)}
+
+
+def test_batches_fit_the_budget():
+    papers, overhead = _papers(80), "system prompt " * 50
+    batches = pack_previews(papers, budget_tokens=4000, min_chars=300, overhead=overhead)
+    assert len(batches) > 1
+    assert [f for b in batches for f in b] == list(papers)  # every paper once, in order
+    for b in batches:
+        used = estimate_tokens(build_message(b)) + estimate_tokens(overhead)
+        assert used <= 4000
+        assert all(len(v) >= min(300, len(packing.preview_region(papers[f]))) for f, v in b.items())
+    # one big batch when it fits, and then it's not starved either
+    (only,) = pack_previews(papers, budget_tokens=200_000)
+    assert all(len(v) == min(len(packing.preview_region(papers[f])), packing.MAX_PREVIEW_CHARS)
+               for f, v in only.items())
+
+
+def test_truncation_is_fair():
+    papers = {"short.pdf": "Short\nAbstract tiny", **{f"long{i}.pdf": "Long\nAbstract " + "w" * 9000
+                                                      for i in range(5)}}
+    (batch,) = pack_previews(papers, budget_tokens=packing.RESERVED_TOKENS + 1500, min_chars=100)
+    assert batch["short.pdf"] == packing.preview_region(papers["short.pdf"])  # what it doesn't use goes to the rest
+    lens = [len(batch[f"long{i}.pdf"]) for i in range(5)]
+    assert max(lens) == min(lens) > 100
+    assert sum(len(v) for v in batch.values()) <= 1500 * packing.CHARS_PER_TOKEN
@@ -0,0 +1,39 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import prefilter, triage
+
+ON = ["direct preference optimization for rlhf alignment", "reward modeling from human feedback",
+      "kto and dpo preference tuning of language models", "mlops pipeline for model serving"]
+OFF = ["phonon dispersion in layered samples", "superconducting cuprates at low temperature",
+       "galaxy rotation curves and dark matter halos", "protein folding kinetics in solution"]
+
+
+def _filter(monkeypatch):
+    flt = prefilter.OffTopicFilter(ON + OFF, [False] * len(ON) + [True] * len(OFF))
+    monkeypatch.setattr(prefilter, "_filter", flt)
+    return flt
+
+
+def test_threshold(monkeypatch):
+    flt = _filter(monkeypatch)
+    papers = {"phonons.pdf": "Phonons\nWe measure phonon dispersion in layered cuprate samples.",
+              "dpo.pdf": "DPO\nWe study direct preference optimization for rlhf alignment."}
+    p_off, p_on = flt.off_topic_proba(list(papers.values()))
+    assert p_on < 0.5 < p_off
+
+    assert set(prefilter.prefilter(papers, threshold=p_off)) == {"phonons.pdf"}
+    assert prefilter.prefilter(papers, threshold=p_off + 1e-6) == {}
+    skipped = prefilter.prefilter(papers, threshold=0.5)["phonons.pdf"]
+    assert skipped.classification == "bullshit" and skipped.title == "Phonons"
+    assert skipped.relevance_score == round(1 - p_off, 3)
+
+
+def test_never_skips_everything(monkeypatch):
+    _filter(monkeypatch)
+    monkeypatch.setattr(prefilter, "PREFILTER_THRESHOLD", 0.5)
+    papers = {"a.pdf": "phonon dispersion in layered samples", "b.pdf": "galaxy rotation curves",
+              "c.pdf": "reward modeling for rlhf alignment"}
+    assert set(triage._prefilter(papers, list(papers))) == {"a.pdf", "b.pdf"}
+    assert triage._prefilter(papers, ["a.pdf", "b.pdf"]) == {}
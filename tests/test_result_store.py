@@ -0,0 +1,60 @@
+import asyncio, os, sqlite3, sys, time
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import app as app_mod, extract_cache, jobs, pdf_utils, result_store
+from agent.schemas import PaperAnalysis, ReadingOrderEntry, TriageResult
+from agent.synthetic import make_inbox
+
+
+def _result(cls_by_name):
+    papers = [PaperAnalysis(filename=f, title=f, classification=c, domain_tags=["x"],
+                            key_contribution="stuff", relevance_score=0.9 if c == "must-read" else 0.2)
+              for f, c in cls_by_name.items()]
+    order = [ReadingOrderEntry(rank=i, filename=p.filename, justification="j")
+             for i, p in enumerate((p for p in papers if p.classification == "must-read"), 1)]
+    return TriageResult(papers=papers, reading_order=order)
+
+
+def test_history_and_queries(tmp_path, monkeypatch):
+    store = result_store.ResultStore(str(tmp_path / "results.sqlite"))
+    store.record(_result({"a.pdf": "must-read", "b.pdf": "bullshit"}), str(tmp_path), digests={"a.pdf": "h1"})
+    later = time.time() + 5
+    monkeypatch.setattr(result_store.time, "time", lambda: later)
+    store.record(_result({"a.pdf": "nice-to-read", "c.pdf": "must-read"}), str(tmp_path), tenant="ml",
+                 digests={"a.pdf": "h2"})
+
+    assert store.latest("a.pdf")["classification"] == "nice-to-read"
+    assert [r["classification"] for r in store.history("a.pdf")] == ["nice-to-read", "must-read"]
+    assert store.latest("zz.pdf") is None
+    assert store.by_digest("h1")[0]["analysis"]["classification"] == "must-read"
+
+    # a.pdf was a must-read in the first run, but isn't any more
+    hits = store.search("must-read")
+    assert [(r["filename"], r["rank"], r["run"]["tenant"]) for r in hits] == [("c.pdf", 1, "ml")]
+    assert [r["filename"] for r in store.search("bullshit")] == ["b.pdf"]
+    assert store.search("bullshit", since=later) == []
+    assert store.search("must-read", papers_dir=str(tmp_path / "elsewhere")) == []
+
+    db = sqlite3.connect(store.path)
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute("UPDATE results SET classification = 'bullshit'")
+
+
+def test_triage_runs_are_recorded(tmp_path, monkeypatch, stub_agents):
+    make_inbox(str(tmp_path / "inbox"), 3, max_pages=1)
+    hashed = []
+    monkeypatch.setattr(pdf_utils, "hash_file", lambda p: hashed.append(p) or extract_cache.hash_file(p))
+    asyncio.run(jobs.triage_dir(str(tmp_path), tenant="ml"))
+    assert len(hashed) == 3  # once per pdf, for the extraction cache, the analysis cache and the store
+
+    client = TestClient(app_mod.app)
+    row = client.get("/results/papers/paper_00000.pdf").json()
+    assert row["classification"] == "must-read" and row["run"]["tenant"] == "ml"
+    assert row["digest"] == extract_cache.hash_file(str(tmp_path / "must-read" / "paper_00000.pdf"))
+    assert [r["filename"] for r in client.get("/results", params={"days": 1}).json()] == ["paper_00000.pdf"]
+    assert len(client.get("/results/papers/paper_00001.pdf/history").json()) == 1
+    assert client.get("/results/papers/nope.pdf").status_code == 404
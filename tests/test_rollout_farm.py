@@ -0,0 +1,68 @@
+import asyncio, gzip, json, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "environment"))
+
+import rollout_farm
+from agent import analysis_cache
+from agent.stub_model import StubModel
+from agent.synthetic import TOPICS, make_inbox
+
+
+def _gt(path, n):
+    labels = {f"paper_{i:05d}.pdf": {"classification": list(TOPICS)[i % 3], "title": f"Synthetic Paper {i}",
+                                     "domain_tags": ["x"], "key_contribution": TOPICS[list(TOPICS)[i % 3]],
+                                     "relevance_score": 0.5} for i in range(n)}
+    with open(path, "w") as f:
+        json.dump({"labels": labels, "reference_ranking": sorted(labels)}, f)
+
+
+def test_farm(tmp_path):
+    cache = analysis_cache.get_cache()
+    src = tmp_path / "inbox"
+    make_inbox(str(src), 5, max_pages=1)
+    _gt(tmp_path / "gt.json", 5)
+    before = sorted(os.listdir(src))
+
+    out = str(tmp_path / "rollouts.jsonl.gz")
+    writer = rollout_farm._Writer(out, "jsonl")
+    summary = asyncio.run(rollout_farm.run_farm(str(src), str(tmp_path / "gt.json"), 4, concurrency=2,
+                                                model=StubModel(), workdir=str(tmp_path / "work"),
+                                                on_episode=writer))
+    writer.close()
+
+    with gzip.open(out, "rt") as f:
+        recs = [json.loads(ln) for ln in f]
+    assert sorted(r["episode"] for r in recs) == [0, 1, 2, 3]
+    assert all("error" not in r for r in recs)
+    assert len({r["score"] for r in recs}) == 1  # stub model, same inbox, same score
+    # no cache replays: every episode made its own model calls, and the cache is back afterwards
+    assert len({r["model_calls"] for r in recs}) == 1
+    assert analysis_cache.get_cache() is cache
+    assert all(r["model_calls"] == len(r["trajectory"]) > 0 for r in recs)
+    assert summary["ok"] == 4 and summary["rollouts_per_hour"] > 0
+    assert sorted(os.listdir(src)) == before
+    assert not os.listdir(tmp_path / "work")
+
+
+def test_clone_falls_back_to_copy(tmp_path, monkeypatch):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "x.pdf").write_bytes(b"%PDF-x")
+
+    def no_links(*a):
+        raise OSError(18, "cross-device link")
+
+    monkeypatch.setattr(rollout_farm.os, "link", no_links)
+    monkeypatch.setattr(rollout_farm, "_reflink", no_links)
+    assert rollout_farm.clone_inbox(str(tmp_path / "a"), str(tmp_path / "b")) == "copy"
+    assert (tmp_path / "b" / "x.pdf").read_bytes() == b"%PDF-x"
+
+
+def test_farm_without_workdir(tmp_path):
+    src = tmp_path / "inbox"
+    make_inbox(str(src), 2, max_pages=1)
+    _gt(tmp_path / "gt.json", 2)
+    summary = asyncio.run(rollout_farm.run_farm(str(src), str(tmp_path / "gt.json"), 2, model=StubModel()))
+    assert summary["ok"] == 2
+    # the tmp workdir went next to the inbox, and is gone again
+    assert sorted(os.listdir(tmp_path)) == ["gt.json", "inbox"]
@@ -0,0 +1,134 @@
+import asyncio, json, os, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import packing, router, triage
+from agent.stub_model import _analysis, _sections
+
+
+class Backend(BaseHTTPRequestHandler):
+    """openai-compatible /chat/completions that answers like the stub model"""
+    protocol_version = "HTTP/1.1"
+    status = 200
+    delay = 0.0
+
+    def log_message(self, *a):
+        pass
+
+    def do_POST(self):
+        srv = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with srv.lock:
+            srv.hits += 1
+            srv.inflight += 1
+            srv.peak = max(srv.peak, srv.inflight)
+        try:
+            time.sleep(srv.delay)
+            if srv.status != 200:
+                return self._send(srv.status, {"error": {"message": "slow down"}})
+            prompt = body["messages"][-1]["content"]
+            (fname, text), = _sections(prompt)
+            tool = body["tools"][-1]["function"]["name"]
+            self._send(200, {
+                "id": "x", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "tool_calls", "message": {
+                    "role": "assistant", "content": None, "tool_calls": [{
+                        "id": "c1", "type": "function",
+                        "function": {"name": tool, "arguments": json.dumps(_analysis(fname, text))}}]}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            })
+        finally:
+            with srv.lock:
+                srv.inflight -= 1
+
+    def _send(self, status, obj):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(status=200, delay=0.0):
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), Backend)
+        srv.status, srv.delay, srv.hits, srv.inflight, srv.peak = status, delay, 0, 0, 0
+        srv.lock = threading.Lock()
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        srv.url = f"http://127.0.0.1:{srv.server_address[1]}/v1"
+        started.append(srv)
+        return srv
+
+    yield start
+    for srv in started:
+        srv.shutdown()
+        srv.server_close()
+
+
+def _run(model, n):
+    async def go():
+        with triage.paper_agent.override(model=model):
+            return await asyncio.gather(*(triage.analyse_paper(f"p{i}.pdf", "RLHF reward models") for i in range(n)))
+    return asyncio.run(go())
+
+
+def test_parse_backends():
+    a, b = router.parse_backends("qwen@http://gpu1:1234/v1*3; qwen@http://gpu2:1234/v1")
+    assert (a.name, a.limit, b.limit) == ("qwen@http://gpu1:1234/v1", 3, router.DEFAULT_LIMIT)
+
+
+def test_budget_follows_the_smallest_backend(monkeypatch):
+    monkeypatch.delenv("TRIAGE_CONTEXT_TOKENS", raising=False)
+    monkeypatch.setenv("TRIAGE_BACKENDS", "anthropic:claude-sonnet-4-20250514*8")
+    assert packing.context_budget() == packing.BACKEND_BUDGETS["anthropic"] and not packing.is_local()
+    monkeypatch.setenv("TRIAGE_BACKENDS", "anthropic:claude-sonnet-4-20250514*8, qwen@http://gpu1:1234/v1*2")
+    assert packing.context_budget() == packing.BACKEND_BUDGETS["lmstudio"] and packing.is_local()
+
+
+def test_spreads_by_load_within_limits(servers):
+    a, b = servers(delay=0.05), servers(delay=0.05)
+    model = router.RouterModel([router.openai_backend("m", a.url, 2), router.openai_backend("m", b.url, 3)])
+    out = _run(model, 20)
+    assert [p.filename for p in out] == [f"p{i}.pdf" for i in range(20)]
+    assert all(p.classification == "must-read" for p in out)
+    assert a.hits + b.hits == 20 and a.hits and b.hits
+    assert a.peak <= 2 and b.peak <= 3
+
+
+def test_fails_over_on_throttle_and_timeout(servers):
+    throttled, slow, ok = servers(status=429), servers(delay=2), servers()
+    model = router.RouterModel([router.openai_backend("m", throttled.url, 4),
+                                router.openai_backend("m", slow.url, 4),
+                                router.openai_backend("m", ok.url, 4)], timeout=0.3, cooldown=60)
+    assert len(_run(model, 8)) == 8
+    assert ok.hits == 8
+    # both broken ones sit out their cooldown after the first failures
+    assert throttled.hits <= 4 and slow.hits <= 4
+
+
+def test_gives_up_when_everything_fails(servers):
+    a = servers(status=503)
+    model = router.RouterModel([router.openai_backend("m", a.url, 1)], cooldown=0, retries=1)
+    with pytest.raises(Exception, match="every backend failed"):
+        _run(model, 1)
+    assert a.hits == 2
+
+
+def test_hedges_past_p95(servers):
+    primary, spare = servers(), servers()
+    model = router.RouterModel([router.openai_backend("m", primary.url, 4),
+                                router.openai_backend("m", spare.url, 4)], hedge=True)
+    first, _ = model.backends
+    first.latencies.extend([0.05] * router.HEDGE_MIN_SAMPLES)
+    primary.delay = 3  # stalls well past its p95
+    t0 = time.monotonic()
+    out, = _run(model, 1)
+    assert out.filename == "p0.pdf" and time.monotonic() - t0 < 2
+    assert spare.hits == 1
@@ -0,0 +1,82 @@
+import asyncio, os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import dedup, metrics, triage
+from agent.stub_model import StubModel, _last_prompt, _sections
+from agent.synthetic import make_inbox
+
+
+class Sloppy(StubModel):
+    """whole-inbox answers: first `bad` of them get one paper out of range and one missing"""
+
+    def __init__(self, bad=1):
+        super().__init__()
+        self.bad, self.asked = bad, []
+
+    async def _respond(self, messages, info):
+        res = await super()._respond(messages, info)
+        args = res.parts[0].args
+        if "papers" in args:
+            self.asked.append(sorted(f for f, _ in _sections(_last_prompt(messages))))
+            if self.bad > 0:
+                self.bad -= 1
+                args["papers"][0]["relevance_score"] = 1.7
+                del args["papers"][1]
+        return res
+
+
+def _counter(name, **labels):
+    return metrics._counters.get(metrics._key(name, labels), 0)
+
+
+def _run(tmp_path, monkeypatch):
+    make_inbox(str(tmp_path), 6, max_pages=1)
+    monkeypatch.setattr(dedup, "TRIAGE_DEDUP", False)  # same-topic synthetic papers are near-copies
+    return asyncio.run(triage.run_triage(str(tmp_path), mode="single"))
+
+
+@pytest.mark.parametrize("stub_agents", [Sloppy], indirect=True)
+def test_only_bad_papers_are_asked_again(tmp_path, monkeypatch, stub_agents):
+    retries = _counter("triage_output_retries_total")
+    wasted = _counter("triage_output_wasted_tokens_total")
+    res = _run(tmp_path, monkeypatch)
+
+    assert sorted(p.filename for p in res.papers) == [f"paper_{i:05d}.pdf" for i in range(6)]
+    assert len(stub_agents.asked[0]) == 6 and len(stub_agents.asked[1]) == 2  # the retry only carries the two bad ones
+    assert [e.rank for e in res.reading_order] == [1, 2]  # re-ranked together
+    assert _counter("triage_output_retries_total") == retries + 1
+    assert _counter("triage_output_wasted_tokens_total") > wasted
+
+
+@pytest.mark.parametrize("stub_agents", [lambda: Sloppy(bad=99)], indirect=True)
+def test_gives_up_after_the_budget(tmp_path, monkeypatch, stub_agents):
+    monkeypatch.setattr(triage, "TRIAGE_OUTPUT_RETRIES", 1)
+    res = _run(tmp_path, monkeypatch)
+    assert len(stub_agents.asked) == 2
+    # the first answer's good four stay, the retry salvages nothing (it has only two papers, both bad)
+    assert len(res.papers) == 4
+
+
+class Repeating(Sloppy):
+    """the retry answer also re-sends a paper the first one already got right, changed"""
+
+    async def _respond(self, messages, info):
+        res = await super()._respond(messages, info)
+        args = res.parts[0].args
+        if "papers" in args and len(self.asked) == 2:
+            args["papers"].append({**self.first, "key_contribution": "something else"})
+        elif "papers" in args:
+            self.first = dict(args["papers"][-1])
+        return res
+
+
+@pytest.mark.parametrize("stub_agents", [Repeating], indirect=True)
+def test_retry_cant_replace_accepted_papers(tmp_path, monkeypatch, stub_agents):
+    res = _run(tmp_path, monkeypatch)
+    assert len(stub_agents.asked) == 2
+    assert sorted(p.filename for p in res.papers) == [f"paper_{i:05d}.pdf" for i in range(6)]
+    again = next(p for p in res.papers if p.filename == stub_agents.first["filename"])
+    assert again.key_contribution == stub_agents.first["key_contribution"]
@@ -0,0 +1,78 @@
+import asyncio, os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import jobs, metrics, scheduler
+from agent.schemas import TriageResult
+
+
+def test_weighted_round_robin():
+    rr = scheduler.WeightedRR({"a": 3, "b": 1})
+    picks = [rr.pick(["a", "b"]) for _ in range(8)]
+    assert picks.count("a") == 6 and "bb" not in "".join(picks) and "aaaa" not in "".join(picks)
+
+
+def test_departed_tenants_are_forgotten():
+    rr = scheduler.WeightedRR({})
+    for i in range(100):
+        rr.pick([f"/papers/{i}", "steady"])
+    rr.pick(["steady"])
+    assert set(rr._current) == set(rr._last) == {"steady"}
+
+
+def test_label_values_are_escaped():
+    line = metrics.labeled("x", tenant='a "b"\\c\nd')
+    assert line == 'x{tenant="a \\"b\\"\\\\c\\nd"}'
+
+
+def test_small_tenant_not_starved():
+    done = []
+
+    async def run(sched, name):
+        async with sched.slot(name):
+            await asyncio.sleep(0.005)
+        done.append(name)
+
+    async def go():
+        sched = scheduler.FairScheduler(budget=2, weights={})
+        big = [asyncio.create_task(run(sched, "big")) for _ in range(40)]
+        await asyncio.sleep(0)  # big's backlog is queued first
+        small = [asyncio.create_task(run(sched, "small")) for _ in range(4)]
+        await asyncio.gather(*big, *small)
+        assert sched.busy() == 0 and not sched.waiting()
+
+    asyncio.run(go())
+    last_small = max(i for i, n in enumerate(done) if n == "small")
+    assert last_small < 12  # first come first served would make it 43
+
+
+def test_job_queue_is_fair_and_pushes_back(monkeypatch):
+    started = []
+
+    async def fake_triage_dir(papers_dir, on_event=None, files=None, tenant=None):
+        started.append(papers_dir)
+        await asyncio.sleep(0.01)
+        return TriageResult(papers=[], reading_order=[])
+
+    monkeypatch.setattr(jobs, "triage_dir", fake_triage_dir)
+    monkeypatch.setattr(scheduler, "TENANT_WEIGHTS", {"big": 1})
+
+    async def go():
+        q = jobs.JobQueue(workers=1, tenant_jobs=1, max_queued_per_tenant=2, weights={})
+        big = [q.submit(f"/big{i}", tenant="big") for i in range(3)]  # 1 running, 2 waiting
+        with pytest.raises(jobs.QueueFull):
+            q.submit("/big3", tenant="big")
+        small = q.submit("/small0", tenant="small")
+        assert q.queued() == {"big": 2, "small": 1} and q.running() == {"big": 1}
+        text = metrics.render(jobs.gauges(q))
+        assert 'triage_tenant_jobs_queued{tenant="big"} 2' in text and "triage_jobs_queued 3" in text
+        # small isn't in TRIAGE_TENANT_WEIGHTS, it doesn't get a series of its own
+        assert 'triage_tenant_jobs_queued{tenant="default"} 1' in text and '"small"' not in text
+        while any(j.finished is None for j in big + [small]):
+            await asyncio.sleep(0.01)
+        assert all(j.status == "done" for j in big + [small])
+
+    asyncio.run(go())
+    assert started == ["/big0", "/small0", "/big1", "/big2"]
@@ -0,0 +1,56 @@
+import os, sys
+
+import fitz
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import triage
+from agent.pdf_utils import extract_indexed, extract_text, scan_inbox
+
+BODY = "<p>" + "We train reward models on preference data and study overoptimization. " * 25 + "</p>"
+PAGES = [
+    "<h1>Scaling Laws for Reward Model Overoptimization</h1><h3>Abstract</h3>" + BODY,
+    "<h2>1 Introduction</h2>" + BODY + "<h2>2 Related Work</h2>" + BODY,
+    "<h2>3 Method</h2>" + BODY + "<h3>3.1 Reward model</h3>" + BODY,
+    "<h2>4 Conclusion</h2><p>Gold reward saturates.</p>" + BODY,
+    "<h2>References</h2><p>[1] Someone. A paper. 2020.</p>",
+]
+
+
+@pytest.fixture
+def inbox(tmp_path):
+    doc = fitz.open()
+    for html in PAGES:
+        doc.new_page().insert_htmlbox(fitz.Rect(50, 50, 550, 800), html)
+    doc.save(tmp_path / "rm.pdf")
+    return str(tmp_path)
+
+
+def test_outline_offsets(inbox):
+    text, index = extract_indexed(os.path.join(inbox, "rm.pdf"))
+    assert text == extract_text(os.path.join(inbox, "rm.pdf"))  # indexing doesn't change the text
+    assert index["title"] == "Scaling Laws for Reward Model Overoptimization"
+    names = [s["name"] for s in index["sections"]]
+    assert names == ["Abstract", "1 Introduction", "2 Related Work", "3 Method",
+                     "3.1 Reward model", "4 Conclusion", "References"]
+    for s in index["sections"]:
+        assert text[s["start"]:].startswith(s["name"])
+    assert text[index["references"]:].startswith("References")
+
+
+def test_read_section_pulls_more_pages(inbox):
+    idx = {}
+    texts = scan_inbox(inbox, use_cache=False, max_chars=3000, indexes=idx)
+    assert "References" not in [s["name"] for s in idx["rm.pdf"]["sections"]]
+
+    class Ctx:
+        deps = triage.TriageDeps(paper_texts=texts, inbox_dir=inbox, sections=idx)
+
+    assert "2 Related Work @" in triage.list_sections(Ctx, "rm.pdf")
+    intro = triage.read_section(Ctx, "rm.pdf", "introduction")
+    assert intro.startswith("1 Introduction") and "Related Work" not in intro
+    assert triage.read_section(Ctx, "rm.pdf", "conclusion").startswith("4 Conclusion\nGold reward saturates.")
+    assert triage.read_section(Ctx, "rm.pdf", "references").strip().endswith("A paper. 2020.")
+    assert triage.read_section(Ctx, "rm.pdf", "nope").startswith("no section like 'nope'")
+    assert triage.read_paper(Ctx, "rm.pdf", offset=0, length=7).startswith("Scaling\n[truncated")
@@ -0,0 +1,36 @@
+import os, subprocess, sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+# cumulative import time of agent.app, generous for a slow CI box.
+# the heavy stuff (pydantic-ai, provider sdks, pymupdf, scipy) is ~2s on its own
+IMPORT_BUDGET_S = float(os.environ.get("IMPORT_BUDGET_S", "1.5"))
+DEFERRED = ("pydantic_ai", "openai", "anthropic", "fitz", "numpy", "scipy", "tqdm")
+
+
+def _importtime(module):
+    """python -X importtime in a fresh interpreter -> ({module: cumulative s}, loaded heavy modules)"""
+    code = f"import sys, {module}; print(','.join(m for m in {DEFERRED!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line.split("|")
+        times[name.strip()] = int(cum) / 1e6
+    return times, [m for m in proc.stdout.strip().split(",") if m]
+
+
+def test_app_import_is_light():
+    times, loaded = _importtime("agent.app")
+    assert loaded == [], f"imported at startup: {loaded}"
+    slowest = sorted(times.items(), key=lambda kv: -kv[1])[:10]
+    assert times["agent.app"] < IMPORT_BUDGET_S, f"agent.app took {times['agent.app']:.2f}s: {slowest}"
+
+
+def test_agents_build_on_first_use():
+    code = ("import sys; from agent import triage; assert 'pydantic_ai' not in sys.modules; "
+            "a = triage.triage_agent; assert a is triage.get_triage_agent(); "
+            "print(sorted(a._function_toolset.tools))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "['get_paper_list', 'list_sections', 'read_paper', 'read_section']"
@@ -0,0 +1,47 @@
+import json, os, sys
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import app as app_mod, dedup, triage
+from agent.synthetic import make_inbox
+
+
+def _events(resp):
+    out = []
+    for block in resp.text.strip().split("\n\n"):
+        kind, data = block.split("\n")
+        out.append((kind.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return out
+
+
+def test_event_sequence(tmp_path, monkeypatch, stub_agents):
+    monkeypatch.setattr(app_mod, "TRIAGE_PREWARM", False)
+    monkeypatch.setattr(triage, "TRIAGE_MODE", "mapreduce")
+    monkeypatch.setattr(dedup, "TRIAGE_DEDUP", False)
+    make_inbox(str(tmp_path / "inbox"), 3, max_pages=1)
+    with TestClient(app_mod.app) as client:
+        resp = client.get("/triage/stream", params={"papers_dir": str(tmp_path)})
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _events(resp)
+
+    kinds = [k for k, _ in events]
+    assert kinds == ["extracted"] * 3 + ["analysis"] * 3 + ["ranked", "materializing", "done"]
+    assert [d["done"] for k, d in events if k == "extracted"] == [1, 2, 3]
+    assert sorted(d["paper"]["filename"] for k, d in events if k == "analysis") == \
+        [f"paper_{i:05d}.pdf" for i in range(3)]
+    assert events[-1][1]["n_papers"] == 3
+
+
+def test_error_event(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_mod, "TRIAGE_PREWARM", False)
+    make_inbox(str(tmp_path / "inbox"), 1, max_pages=1)
+
+    async def boom(*args, **kwargs):
+        raise RuntimeError("no backend")
+
+    monkeypatch.setattr(app_mod, "triage_dir", boom)
+    with TestClient(app_mod.app) as client:
+        events = _events(client.get("/triage/stream", params={"papers_dir": str(tmp_path)}))
+    assert events == [("error", {"detail": "RuntimeError: no backend"})]
@@ -0,0 +1,38 @@
+import asyncio, os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import triage
+from agent.text_store import TextStore, head, subset
+from agent.synthetic import make_inbox
+
+
+def test_store_is_a_mapping():
+    with TextStore() as st:
+        st["b.pdf"] = "héllo wörld"
+        st.put_many([("a.pdf", "x" * 10), ("c.pdf", "")])
+        assert list(st) == ["a.pdf", "b.pdf", "c.pdf"] and len(st) == 3
+        assert st["b.pdf"] == "héllo wörld" and "zz.pdf" not in st
+        assert st.slice("b.pdf", 1, 4) == "éll"  # chars, not bytes
+        assert head(st, "a.pdf", 3) == "xxx"
+        with pytest.raises(KeyError):
+            st["zz.pdf"]
+
+        view = subset(st, ["b.pdf", "c.pdf"])
+        assert dict(view) == {"b.pdf": "héllo wörld", "c.pdf": ""}
+        assert view.get("a.pdf") is None and head(view, "b.pdf", 2) == "hé"
+        view["b.pdf"] = "longer text"  # read_paper's lazy re-extract writes through
+        assert st["b.pdf"] == "longer text"
+        path = st.path
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize("mode", ["mapreduce", "single"])
+def test_spilled_run_matches_in_memory(tmp_path, monkeypatch, stub_agents, mode):
+    make_inbox(str(tmp_path), 5, max_pages=2)
+    in_memory = asyncio.run(triage.run_triage(str(tmp_path), mode=mode))
+    monkeypatch.setattr(triage, "SPILL_PAPERS", 0)
+    spilled = asyncio.run(triage.run_triage(str(tmp_path), mode=mode))
+    assert spilled == in_memory and len(spilled.papers) == 5
@@ -0,0 +1,53 @@
+import os, random, sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "environment"))
+
+from judge import _read_report, keyword_score, score_ranking
+from vector_scorer import VectorScorer
+from test_judge import GT, _full_report_entries, _write_report, ws  # noqa: F401
+
+REF = GT["reference_ranking"]
+ALL = list(GT["labels"])
+
+
+def _scorer():
+    return VectorScorer(GT["labels"], REF)
+
+
+def test_ranking_identical():
+    rng = random.Random(0)
+    # the TestRanking cases, plus a pile of random partial/duplicated/foreign orders
+    orders = [REF, list(reversed(REF)), [], REF[:3], REF[:1], ["nope.pdf"]]
+    for _ in range(300):
+        o = rng.sample(ALL + ["extra.pdf"], rng.randint(0, len(ALL)))
+        if o and rng.random() < 0.3:
+            o.append(rng.choice(o))
+        orders.append(o)
+    got = _scorer().ranking(orders)
+    assert got.tolist() == [score_ranking(o, REF) for o in orders]
+    assert VectorScorer(GT["labels"], []).ranking(orders).tolist() == [0.0] * len(orders)
+
+
+def test_keywords_identical(ws):  # noqa: F811
+    rng = random.Random(1)
+    # round-trip the test_judge fixtures through disk so reports look like the real thing
+    _write_report(ws, _full_report_entries())
+    reports = [
+        _read_report(ws),
+        [{"filename": fn, "key_contribution": "xyzzy plugh"} for fn in GT["labels"]],
+        None,
+        [],
+        ["junk", {"no": "filename"}],
+    ]
+    words = " ".join(m["key_contribution"] for m in GT["labels"].values()).split() + ["the", "zzz"]
+    for _ in range(200):
+        picked = rng.sample(ALL, rng.randint(0, len(ALL)))
+        entries = [{"filename": fn, "key_contribution": " ".join(rng.sample(words, rng.randint(0, 12)))}
+                   for fn in picked]
+        if entries and rng.random() < 0.3:
+            entries.append(dict(entries[0], key_contribution="overridden"))
+        reports.append(entries)
+    got = _scorer().keywords(reports)
+    assert got.tolist() == [keyword_score(r, GT["labels"]) for r in reports]
+    assert got[0] == 1.0 and got[1] < 0.15
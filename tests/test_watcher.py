@@ -0,0 +1,74 @@
+import asyncio, json, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent import dedup, triage, watcher
+from agent.schemas import PaperAnalysis, ReadingOrderEntry, TriageResult
+from agent.synthetic import make_inbox
+
+
+def _paper(f, cls, score):
+    return PaperAnalysis(filename=f, title=f, classification=cls, domain_tags=["x"],
+                         key_contribution=f"about {f}", relevance_score=score)
+
+
+def _report(base):
+    try:
+        with open(os.path.join(base, "triage_report.json")) as fh:
+            return {p["filename"]: p for p in json.load(fh)}
+    except (OSError, ValueError):
+        return {}
+
+
+def test_merge_keeps_old_analyses_and_drops_deleted(tmp_path):
+    (tmp_path / "inbox").mkdir()
+    for f in ("a.pdf", "b.pdf", "c.pdf", "d.pdf"):
+        (tmp_path / "inbox" / f).write_bytes(b"%PDF-")
+    first = TriageResult(papers=[_paper("a.pdf", "must-read", 0.9), _paper("b.pdf", "must-read", 0.5),
+                                 _paper("c.pdf", "bullshit", 0.1)],
+                         reading_order=[ReadingOrderEntry(rank=1, filename="a.pdf", justification="best"),
+                                        ReadingOrderEntry(rank=2, filename="b.pdf", justification="ok")])
+    triage.materialize_results(first, str(tmp_path))
+    os.remove(tmp_path / "must-read" / "b.pdf")
+
+    batch = TriageResult(papers=[_paper("d.pdf", "must-read", 0.7)],
+                         reading_order=[ReadingOrderEntry(rank=1, filename="d.pdf", justification="new")])
+    triage.materialize_results(batch, str(tmp_path), merge=True)
+
+    report = _report(tmp_path)
+    assert sorted(report) == ["a.pdf", "c.pdf", "d.pdf"]
+    assert report["a.pdf"]["key_contribution"] == "about a.pdf"
+    assert (tmp_path / "reading_order.txt").read_text() == "1. a.pdf | best\n2. d.pdf | new\n"
+
+
+def test_watcher_folds_in_new_arrivals(tmp_path, monkeypatch, stub_agents):
+    monkeypatch.setattr(dedup, "TRIAGE_DEDUP", False)
+    src, base = tmp_path / "src", tmp_path / "papers"
+    make_inbox(str(src), 4, max_pages=1)
+    names = [f"paper_{i:05d}.pdf" for i in range(4)]
+
+    async def until(want, timeout=20):
+        deadline = time.monotonic() + timeout
+        while sorted(_report(base)) != want:
+            assert time.monotonic() < deadline, sorted(_report(base))
+            await asyncio.sleep(0.05)
+
+    async def go():
+        (base / "inbox").mkdir(parents=True)
+        task = asyncio.create_task(watcher.watch_inbox(str(base), debounce=0.1))
+        try:
+            for f in names[:2]:
+                os.rename(src / f, base / "inbox" / f)
+            await until(names[:2])
+            first = _report(base)[names[0]]
+            os.rename(src / names[2], base / "inbox" / names[2])
+            await until(names[:3])
+            assert _report(base)[names[0]] == first
+            os.remove(base / "must-read" / names[0])
+            os.rename(src / names[3], base / "inbox" / names[3])
+            await until(names[1:])
+        finally:
+            task.cancel()
+
+    asyncio.run(go())
+    assert not os.listdir(base / "inbox")